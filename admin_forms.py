@@ -25,4 +25,11 @@ class GlobalTOTPForm(FlaskForm):
 class CredentialForm(FlaskForm):
     credential_name = StringField('Credential Name', validators=[DataRequired()])
     credential_value = StringField('Credential Value', validators=[DataRequired()])
-    submit = SubmitField('Add Credential')
\ No newline at end of file
+    submit = SubmitField('Add Credential')
+
+class InstrumentForm(FlaskForm):
+    symbol = StringField('Symbol', validators=[DataRequired(), Length(max=50)])
+    token = StringField('Stream Token (e.g. 22_NSE)', validators=[DataRequired(), Length(max=50)])
+    segment = SelectField('Segment', choices=[('EQT', 'Equity'), ('FUT', 'Futures'), ('OPT', 'Options')], default='EQT')
+    lot_size = StringField('Lot Size', default='1')
+    submit = SubmitField('Add Instrument')
@@ -1,26 +1,41 @@
 from functools import wraps
-from flask import Flask, flash, redirect, render_template, url_for, session, request, jsonify
-from flask_socketio import SocketIO
+from contextlib import nullcontext
+from datetime import datetime
+from flask import Flask, abort, flash, redirect, render_template, url_for, session, request, jsonify, Response, stream_with_context
+from flask_socketio import SocketIO, join_room
 from forms import LoginForm
-from admin_forms import CreateUserForm, EditUserForm, GlobalTOTPForm
-from models import db, User, Transaction, UserCredential
+from admin_forms import CreateUserForm, EditUserForm, GlobalTOTPForm, InstrumentForm
+from models import db, User, Transaction, Instrument
+from credentials import admin_credentials
 from flask_bcrypt import Bcrypt
-from tradejini_client import TradejiniClient
-from live_price_stream import LivePriceStreamer
-from config import TRADEJINI_CONFIG
+from tradejini_client import TradejiniClient, get_client, auth_breaker, quote_breaker
+import tradejini_http
+from token_provider import token_provider
+from live_price_stream import LivePriceStreamer, add_price_listener
+from portfolio_stream import PortfolioPnLTracker, user_room
+from trading import execute_orders, get_holdings
+from risk import RiskBook
+from leaderboard import Leaderboard
+from instruments import instrument_registry
+from migrations import migrate_schema
+from database import init_db
+from trade_journal import trade_journal, journal_executor
+from order_actors import order_actors
+from ledger import ledger_snapshotter, reconstruct, take_snapshot, audit as audit_ledger
+from instrument_search import instrument_search, DEFAULT_LIMIT, MAX_LIMIT
+from market_simulator import get_simulator
+from candles import CandleStore, INTERVALS, to_json as candles_to_json
+from price_snapshot import price_snapshotter, warm_start, stale_symbols
+from history import history_page, iter_history_csv, HISTORY_PAGE_SIZE, MAX_HISTORY_PAGE_SIZE
+from config import TRADEJINI_CONFIG, STOCK_TOKENS, SIMULATOR_ENABLED, EXECUTION_MODE
 
 def get_current_totp():
     """Get current TOTP from database or environment"""
     try:
-        # First try database (admin updated TOTP)
-        admin_user = User.query.filter_by(is_admin=True).first()
-        if admin_user:
-            credential = UserCredential.query.filter_by(
-                user_id=admin_user.id,
-                credential_name='GLOBAL_TOTP'
-            ).first()
-            if credential:
-                return credential.credential_value
+        # First try database (admin updated TOTP), served from the credential cache
+        totp = admin_credentials.get('GLOBAL_TOTP')
+        if totp:
+            return totp
     except:
         pass
     
@@ -29,14 +44,26 @@ def get_current_totp():
     return os.environ.get('TRADEJINI_TWO_FA', '')
 from sqlalchemy import func
 
+# Largest basket accepted by /api/orders/bulk
+MAX_BULK_ORDERS = 100
+# Most traders listed on /admin/risk
+MAX_RISK_TOP = 100
+# Most rows served by /leaderboard and /api/leaderboard
+MAX_LEADERBOARD_LIMIT = 100
+
+
+def clamped_int(value, default, maximum):
+    """Integer query argument clamped to [1, maximum]; ValueError if it is not an integer"""
+    if value is None:
+        return default
+    return min(max(int(value), 1), maximum)
+
 
 def create_app():
   app = Flask(__name__)
   from config import SECRET_KEY, DATABASE_URL
   import os
-  
-  # Use SQLite for Cloudflare deployment
-  database_url = 'sqlite:///app.db'
+
   
   # Update TRADEJINI_CONFIG with current TOTP
   def update_tradejini_config():
@@ -76,36 +103,58 @@ def create_app():
           return {
               'status': 'success',
               'streaming': status,
-              'live_prices_count': len(price_streamer.live_prices) if hasattr(price_streamer, 'live_prices') else 0
+              'live_prices_count': len(price_streamer.live_prices) if hasattr(price_streamer, 'live_prices') else 0,
+              'circuits': [auth_breaker.get_status(), quote_breaker.get_status()],
+              'http': tradejini_http.get_stats(),
+              'stale_prices': len(stale_symbols()),
+              'execution_mode': EXECUTION_MODE,
+              'journal': trade_journal.get_status() if journal_mode else None,
+              'order_actors': order_actors.get_status() if EXECUTION_MODE == 'actors' else None
           }
       except Exception as e:
           return {'status': 'error', 'message': str(e)}
   app.config['SECRET_KEY'] = SECRET_KEY
-  app.config['SQLALCHEMY_DATABASE_URI'] = database_url
-  app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-  app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
-      'pool_pre_ping': True,
-      'pool_recycle': 300,
-  }
   bcrypt = Bcrypt()
   socketio = SocketIO(app, cors_allowed_origins="*")
 
-  db.init_app(app)
+  init_db(app, DATABASE_URL)
   bcrypt.init_app(app)
   
+  # Last-known prices from before the restart, flagged stale until they tick
+  warm_start()
+  
   # Initialize live price streamer
   price_streamer = LivePriceStreamer(socketio)
   
   # Start live stream
+  live_stream_started = False
   try:
-      if not price_streamer.start_live_stream():
+      live_stream_started = price_streamer.start_live_stream()
+      if not live_stream_started:
           app.logger.warning("Failed to start live stream - check SDK installation")
   except Exception as e:
       app.logger.error(f"Live stream initialization error: {e}")
       # Continue without live stream for deployment
+  
+  # Per-user live P&L, pushed to each user's private room
+  pnl_tracker = PortfolioPnLTracker(socketio)
+  add_price_listener(pnl_tracker.on_price)
+  
+  # Whole-book positions for the admin risk view
+  risk_book = RiskBook()
+  
+  # Equity ranking, re-ranked only for holders of ticked symbols
+  leaderboard = Leaderboard()
+  add_price_listener(leaderboard.on_price)
+  
+  # 1-minute candles for charts, kept in memory with an on-disk tail
+  candle_store = CandleStore()
+  add_price_listener(candle_store.on_price)
 
   with app.app_context():
     db.create_all()
+    # Indexes added to models after a database was created
+    migrate_schema()
     # Create admin user if not exists
     admin = User.query.filter_by(username='admin').first()
     if not admin:
@@ -118,8 +167,58 @@ def create_app():
         admin.set_password('admin123')
         db.session.add(admin)
         db.session.commit()
+    
+    # Instrument universe: seeded from config on first run, then DB-managed
+    instrument_registry.seed(STOCK_TOKENS)
+    instrument_registry.load()
+  
+  # Order execution engine, see config.EXECUTION_MODE
+  journal_mode = EXECUTION_MODE in ('journal', 'actors')
+  if EXECUTION_MODE == 'actors':
+      place_orders = order_actors.execute_orders
+      exclusive_user = order_actors.exclusive
+  elif journal_mode:
+      place_orders = journal_executor.execute_orders
+      exclusive_user = journal_executor.exclusive
+  else:
+      place_orders = execute_orders
+      def exclusive_user(user_id):
+          return nullcontext()
+
+  # Background loops start with the first request so they run inside the
+  # serving worker (gunicorn preloads the app and forks afterwards)
+  @app.before_request
+  def start_background_tasks():
+    price_snapshotter.start(socketio)
+    ledger_snapshotter.start(app, socketio)
+    if journal_mode:
+        # Replays any orders a crashed worker acknowledged but never committed
+        trade_journal.start(app)
+        if EXECUTION_MODE == 'actors':
+            order_actors.start(app)
+    # No live feed: drive the price board from the synthetic market. One
+    # worker ticks it and the others follow its board file, so every page
+    # and every fill sees one coherent price path
+    if not live_stream_started and SIMULATOR_ENABLED:
+        get_simulator().start(socketio)
 
 
+  @socketio.on('connect')
+  def socket_connect():
+    user_id = session.get('user_id')
+    if user_id:
+        # Push loop starts lazily so it runs inside the serving worker
+        pnl_tracker.start()
+        instrument_registry.start(app, socketio)
+        join_room(user_room(user_id))
+        pnl_tracker.connect(user_id, request.sid)
+
+  @socketio.on('disconnect')
+  def socket_disconnect():
+    user_id = session.get('user_id')
+    if user_id:
+        pnl_tracker.disconnect(user_id, request.sid)
+
   def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -178,66 +277,88 @@ def create_app():
         flash('Admin users cannot access client dashboard', 'danger')
         return redirect(url_for('admin_login'))
     
-    # Get stock data from TradJini API or fallback to mock data
-    try:
-        client = TradejiniClient()
-        stocks = client.get_stock_list()
-    except Exception as e:
-        app.logger.warning(f"TradJini API failed: {e}, using mock data")
-        # Fallback to mock stock data with live-like prices
-        from config import STOCK_TOKENS
-        import random
-        import time
-        
-        stocks = []
-        base_time = int(time.time())
-        for i, (symbol, token) in enumerate(STOCK_TOKENS.items()):
-            # Generate realistic fluctuating prices
-            base_price = 500 + (i * 100)  # Different base prices
-            fluctuation = random.uniform(-0.05, 0.05)  # ±5% fluctuation
-            current_price = base_price * (1 + fluctuation)
-            
-            stocks.append({
-                'symbol': symbol,
-                'name': symbol.replace('_', ' ').title(),
-                'price': round(current_price, 2),
-                'change': round(fluctuation * 100, 2)
-            })
+    # Cached, price-board-backed list: no network I/O on this path
+    stocks = get_client().get_stock_list()
     
     return render_template("dashboard.html", stocks=stocks, balance=user.balance)
 
+  def get_execution_price(symbol):
+    """Board price for an active symbol; ValueError if it is unknown or unpriced.
+
+    The client's price is never trusted: orders fill at the board price or not at all.
+    """
+    if not isinstance(symbol, str) or not symbol:
+        raise ValueError('Symbol must be a non-empty string')
+    if instrument_registry.token_for(symbol) is None:
+        raise ValueError(f'Unknown or inactive symbol: {symbol}')
+    price = price_streamer.get_current_price(symbol)
+    if not price or price <= 0:
+        raise ValueError(f'No market price for {symbol}')
+    return price
+
+  def parse_quantity(value):
+    """Whole number of shares; ValueError for 1.9 rather than truncating it"""
+    # bool is an int subclass: a JSON true would otherwise fill as 1 share
+    if isinstance(value, bool):
+        raise ValueError('Quantity must be a number')
+    try:
+        quantity = float(value)
+    except (TypeError, ValueError):
+        raise ValueError('Quantity must be a number')
+    if not quantity.is_integer():
+        raise ValueError('Quantity must be a whole number of shares')
+    return int(quantity)
+
+  def api_login_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if 'user_id' not in session:
+            return jsonify({'error': 'Login required'}), 401
+        return f(*args, **kwargs)
+    return decorated_function
+
+  def parse_order(data):
+    """Normalize a JSON order and price it at the board price (ValueError if it cannot trade)"""
+    if not isinstance(data, dict):
+        raise ValueError('Expected a JSON order object')
+    symbol = data.get('symbol')
+    return {
+        'side': data.get('side', ''),
+        'symbol': symbol,
+        'quantity': parse_quantity(data.get('quantity', 1)),
+        'price': get_execution_price(symbol)
+    }
+
+  def refresh_views(user_id):
+    """Update in-memory views that depend on a user's positions"""
+    pnl_tracker.refresh_user(user_id)
+    leaderboard.refresh_user(user_id)
+
+  def after_fill(user_id):
+    # Journaled fills reach the DB a few ms later and refresh on flush
+    if not journal_mode:
+        refresh_views(user_id)
+
+  if journal_mode:
+      trade_journal.add_flush_listener(lambda user_ids: [refresh_views(user_id) for user_id in user_ids])
+
+  def place_order(user_id, side, symbol, quantity, price):
+    return place_orders(user_id, [{'side': side, 'symbol': symbol, 'quantity': quantity, 'price': price}])[0]
+
   @app.route("/buy", methods=['POST'])
   @login_required
   def buy_stock():
     symbol = request.form.get('symbol')
-    # Get current live price or fallback to form price
     try:
-        price = price_streamer.get_current_price(symbol)
-        if price == 0.0:
-            price = float(request.form.get('price'))
-    except:
-        price = float(request.form.get('price'))
-    quantity = int(request.form.get('quantity', 1))
+        price = get_execution_price(symbol)
+        quantity = parse_quantity(request.form.get('quantity', 1))
+    except (TypeError, ValueError) as e:
+        flash(f'Order rejected: {e}', 'danger')
+        return redirect(url_for('dashboard'))
     
-    user = User.query.get(session['user_id'])
-    total_cost = price * quantity
-    
-    if user.balance >= total_cost:
-        user.balance -= total_cost
-        
-        transaction = Transaction(
-            user_id=user.id,
-            symbol=symbol,
-            type='BUY',
-            quantity=quantity,
-            price=price
-        )
-        
-        db.session.add(transaction)
-        db.session.commit()
-        pass
-    else:
-        pass
+    result = place_order(session['user_id'], 'BUY', symbol, quantity, price)
+    if result['status'] == 'FILLED':
+        after_fill(session['user_id'])
     
     return redirect(url_for('dashboard'))
 
@@ -245,96 +366,101 @@ def create_app():
   @login_required
   def sell_stock():
     symbol = request.form.get('symbol')
-    # Get current live price or fallback to form price
     try:
-        price = price_streamer.get_current_price(symbol)
-        if price == 0.0:
-            price = float(request.form.get('price'))
-    except:
-        price = float(request.form.get('price'))
-    quantity = int(request.form.get('quantity', 1))
+        price = get_execution_price(symbol)
+        quantity = parse_quantity(request.form.get('quantity', 1))
+    except (TypeError, ValueError) as e:
+        flash(f'Order rejected: {e}', 'danger')
+        return redirect(url_for('dashboard'))
     
-    user = User.query.get(session['user_id'])
+    result = place_order(session['user_id'], 'SELL', symbol, quantity, price)
+    if result['status'] == 'FILLED':
+        after_fill(session['user_id'])
     
-    # Check available shares
-    buy_qty = db.session.query(db.func.sum(Transaction.quantity)).filter_by(
-        user_id=user.id, symbol=symbol, type='BUY').scalar() or 0
-    sell_qty = db.session.query(db.func.sum(Transaction.quantity)).filter_by(
-        user_id=user.id, symbol=symbol, type='SELL').scalar() or 0
-    available = buy_qty - sell_qty
+    return redirect(url_for('dashboard'))
+
+  @app.route("/api/orders", methods=['POST'])
+  @api_login_required
+  def api_place_order():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected a JSON order object'}), 400
+    try:
+        order = parse_order(data)
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'Invalid order: {e}'}), 400
     
-    if available >= quantity:
-        total_value = price * quantity
-        user.balance += total_value
-        
-        transaction = Transaction(
-            user_id=user.id,
-            symbol=symbol,
-            type='SELL',
-            quantity=quantity,
-            price=price
-        )
-        
-        db.session.add(transaction)
-        db.session.commit()
-        pass
-    else:
-        pass
+    result = place_orders(session['user_id'], [order])[0]
+    if result['status'] == 'FILLED':
+        after_fill(session['user_id'])
+    return jsonify(result)
+
+  @app.route("/api/orders/bulk", methods=['POST'])
+  @api_login_required
+  def api_place_orders():
+    data = request.get_json(silent=True)
+    orders = data.get('orders') if isinstance(data, dict) else data
+    if not isinstance(orders, list) or not orders:
+        return jsonify({'error': 'Expected a non-empty list of orders'}), 400
+    if len(orders) > MAX_BULK_ORDERS:
+        return jsonify({'error': f'At most {MAX_BULK_ORDERS} orders per request'}), 400
+    try:
+        orders = [parse_order(order) for order in orders]
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'Invalid order in batch: {e}'}), 400
     
-    return redirect(url_for('dashboard'))
+    results = place_orders(session['user_id'], orders)
+    filled = sum(1 for result in results if result['status'] == 'FILLED')
+    if filled:
+        after_fill(session['user_id'])
+    balances = [result['balance'] for result in results if result['balance'] is not None]
+    return jsonify({
+        'results': results,
+        'filled': filled,
+        'rejected': len(results) - filled,
+        'balance': balances[-1] if balances else User.query.get(session['user_id']).balance
+    })
 
   @app.route("/portfolio")
   @login_required
   def portfolio():
     user_id = session['user_id']
-    transactions = Transaction.query.filter_by(user_id=user_id).order_by(Transaction.timestamp.desc()).all()
-    
-    # Calculate holdings with P&L
-    holdings = {}
-    for t in Transaction.query.filter_by(user_id=user_id).all():
-        if t.symbol not in holdings:
-            holdings[t.symbol] = {'buy_qty': 0, 'sell_qty': 0, 'buy_value': 0, 'sell_value': 0}
-        if t.type == 'BUY':
-            holdings[t.symbol]['buy_qty'] += t.quantity
-            holdings[t.symbol]['buy_value'] += t.quantity * t.price
-        else:
-            holdings[t.symbol]['sell_qty'] += t.quantity
-            holdings[t.symbol]['sell_value'] += t.quantity * t.price
+    # First page only; the rest is fetched from /api/transactions as the user scrolls
+    transactions, next_cursor = history_page(user_id)
     
     current_holdings = {}
     total_invested = 0
     total_current_value = 0
     
-    for symbol, data in holdings.items():
-        net_qty = data['buy_qty'] - data['sell_qty']
-        if net_qty > 0:
-            avg_buy_price = data['buy_value'] / data['buy_qty'] if data['buy_qty'] > 0 else 0
-            invested_amount = net_qty * avg_buy_price
-            
-            # Get current live price or use average price
-            try:
-                current_price = price_streamer.get_current_price(symbol)
-                if current_price == 0.0:
-                    current_price = avg_buy_price
-            except:
+    for symbol, data in get_holdings(user_id).items():
+        net_qty = data['quantity']
+        avg_buy_price = data['avg_price']
+        invested_amount = net_qty * avg_buy_price
+        
+        # Get current live price or use average price
+        try:
+            current_price = price_streamer.get_current_price(symbol)
+            if current_price == 0.0:
                 current_price = avg_buy_price
-            current_value = net_qty * current_price
-            pnl = current_value - invested_amount
-            pnl_percent = (pnl / invested_amount * 100) if invested_amount > 0 else 0
-            
-            current_holdings[symbol] = {
-                'quantity': net_qty,
-                'avg_price': avg_buy_price,
-                'current_price': current_price,
-                'invested': invested_amount,
-                'current_value': current_value,
-                'pnl': pnl,
-                'pnl_percent': pnl_percent
-            }
-            
-            total_invested += invested_amount
-            total_current_value += current_value
-    
+        except:
+            current_price = avg_buy_price
+        current_value = net_qty * current_price
+        pnl = current_value - invested_amount
+        pnl_percent = (pnl / invested_amount * 100) if invested_amount > 0 else 0
+        
+        current_holdings[symbol] = {
+            'quantity': net_qty,
+            'avg_price': avg_buy_price,
+            'current_price': current_price,
+            'invested': invested_amount,
+            'current_value': current_value,
+            'pnl': pnl,
+            'pnl_percent': pnl_percent
+        }
+        
+        total_invested += invested_amount
+        total_current_value += current_value
+
     total_pnl = total_current_value - total_invested
     total_pnl_percent = (total_pnl / total_invested * 100) if total_invested > 0 else 0
     
@@ -345,8 +471,106 @@ def create_app():
         'total_pnl_percent': total_pnl_percent
     }
     
-    from datetime import timedelta
-    return render_template("portfolio.html", transactions=transactions, holdings=current_holdings, summary=portfolio_summary, current_user=User.query.get(user_id), timedelta=timedelta)
+    return render_template("portfolio.html", transactions=transactions, next_cursor=next_cursor, holdings=current_holdings, summary=portfolio_summary, current_user=User.query.get(user_id))
+
+  @app.route("/api/transactions")
+  @api_login_required
+  def api_transactions():
+    try:
+        limit = min(max(int(request.args.get('limit', HISTORY_PAGE_SIZE)), 1), MAX_HISTORY_PAGE_SIZE)
+        transactions, next_cursor = history_page(session['user_id'], request.args.get('cursor'), limit)
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor or limit'}), 400
+    return jsonify({'transactions': transactions, 'next_cursor': next_cursor})
+
+  @app.route("/api/portfolio/as-of")
+  @api_login_required
+  def api_portfolio_as_of():
+    try:
+        as_of = datetime.fromisoformat(request.args['t'])
+    except (KeyError, ValueError):
+        return jsonify({'error': 'Expected t as an ISO 8601 timestamp'}), 400
+    return jsonify(reconstruct(session['user_id'], as_of).to_dict())
+
+  @app.route("/portfolio/transactions.csv")
+  @login_required
+  def export_transactions():
+    filename = f"transactions_{datetime.now().strftime('%Y%m%d')}.csv"
+    return Response(
+        stream_with_context(iter_history_csv(session['user_id'])),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+  @app.route("/leaderboard")
+  def leaderboard_page():
+    if 'user_id' not in session and 'admin_id' not in session:
+        return redirect(url_for('login'))
+    try:
+        limit = clamped_int(request.args.get('limit'), 25, MAX_LEADERBOARD_LIMIT)
+    except ValueError:
+        abort(400, 'limit must be an integer')
+    leaderboard.ensure_loaded()
+    me = leaderboard.rank_of(session['user_id']) if 'user_id' in session else None
+    return render_template("leaderboard.html", top=leaderboard.top(limit), me=me, total=len(leaderboard))
+
+  @app.route("/api/leaderboard")
+  def leaderboard_api():
+    if 'user_id' not in session and 'admin_id' not in session:
+        return jsonify({'error': 'Login required'}), 401
+    try:
+        limit = clamped_int(request.args.get('limit'), 10, MAX_LEADERBOARD_LIMIT)
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    leaderboard.ensure_loaded()
+    return jsonify({
+        'top': leaderboard.top(limit),
+        'me': leaderboard.rank_of(session['user_id']) if 'user_id' in session else None,
+        'total': len(leaderboard)
+    })
+
+  @app.route("/api/candles/<symbol>")
+  def candles_api(symbol):
+    if 'user_id' not in session and 'admin_id' not in session:
+        return jsonify({'error': 'Login required'}), 401
+    interval_name = request.args.get('interval', '1m')
+    if interval_name not in INTERVALS:
+        return jsonify({'error': f"interval must be one of {', '.join(INTERVALS)}"}), 400
+    start = request.args.get('from', type=int)
+    end = request.args.get('to', type=int)
+    # Clamped to [1, MAX_CANDLES] by the store
+    limit = request.args.get('limit', 500, type=int)
+    
+    # Unchanged since the client's copy: answer before building anything
+    etag = candle_store.etag(symbol, INTERVALS[interval_name], start, end, limit)
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+        response.set_etag(etag)
+        return response
+    
+    candles = candle_store.get(symbol, INTERVALS[interval_name], start, end, limit)
+    response = jsonify(candles_to_json(symbol, interval_name, candles))
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+  @app.route("/api/instruments/search")
+  def instrument_search_api():
+    if 'user_id' not in session and 'admin_id' not in session:
+        return jsonify({'error': 'Login required'}), 401
+    query = request.args.get('q', '')
+    try:
+        limit = clamped_int(request.args.get('limit'), DEFAULT_LIMIT, MAX_LIMIT)
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    exchange = request.args.get('exchange', '').upper() or None
+    segment = request.args.get('segment', '').upper() or None
+    index = instrument_search.get()
+    return jsonify({
+        'query': query,
+        'results': index.search(query, limit=limit, exchange=exchange, segment=segment),
+        'universe': len(index)
+    })
 
   # Admin Login Route
   @app.route("/admin", methods=['GET', 'POST'])
@@ -383,6 +607,54 @@ def create_app():
                          total_volume=f"{total_volume:,.0f}",
                          recent_users=recent_users)
 
+  @app.route("/admin/risk")
+  @admin_required
+  def admin_risk():
+    try:
+        top_n = clamped_int(request.args.get('top'), 10, MAX_RISK_TOP)
+    except ValueError:
+        abort(400, 'top must be an integer')
+    risk = risk_book.summary(top_n=top_n)
+    return render_template("admin_risk.html", risk=risk)
+
+  @app.route("/admin/instruments", methods=['GET', 'POST'])
+  @admin_required
+  def admin_instruments():
+    form = InstrumentForm()
+    if form.validate_on_submit():
+        try:
+            lot_size = int(form.lot_size.data or 1)
+            token = form.token.data.strip()
+            instrument = instrument_registry.add(
+                form.symbol.data, token,
+                exchange=token.rsplit('_', 1)[-1].upper(),
+                segment=form.segment.data,
+                lot_size=lot_size
+            )
+            flash(f'Instrument {instrument.symbol} added and subscribed', 'success')
+            return redirect(url_for('admin_instruments'))
+        except ValueError as e:
+            flash(str(e), 'danger')
+    
+    instruments = Instrument.query.order_by(Instrument.symbol).all()
+    return render_template("admin_instruments.html", form=form, instruments=instruments,
+                           active_count=len(instrument_registry))
+
+  @app.route("/admin/toggle-instrument/<int:instrument_id>")
+  @admin_required
+  def admin_toggle_instrument(instrument_id):
+    instrument = Instrument.query.get_or_404(instrument_id)
+    instrument = instrument_registry.set_active(instrument.id, not instrument.is_active)
+    status = 'activated' if instrument.is_active else 'deactivated'
+    flash(f'Instrument {instrument.symbol} {status}', 'success')
+    return redirect(url_for('admin_instruments'))
+
+  @app.route("/admin/ledger-audit/<int:user_id>")
+  @admin_required
+  def admin_ledger_audit(user_id):
+    User.query.get_or_404(user_id)
+    return jsonify(audit_ledger(user_id))
+
   @app.route("/admin/logout")
   @admin_required
   def admin_logout():
@@ -423,6 +695,8 @@ def create_app():
             user.set_password(form.password.data)
             db.session.add(user)
             db.session.commit()
+            risk_book.invalidate()
+            leaderboard.refresh_user(user.id)
             flash(f'User {user.username} created successfully', 'success')
             return redirect(url_for('admin_users'))
     
@@ -435,12 +709,20 @@ def create_app():
     form = EditUserForm()
     
     if form.validate_on_submit():
-        user.username = form.username.data
-        user.email = form.email.data
-        user.balance = float(form.balance.data)
-        user.is_active = form.is_active.data
-        user.is_admin = form.is_admin.data
-        db.session.commit()
+        # The execution engine may hold this user's balance in memory
+        with exclusive_user(user.id):
+            user.username = form.username.data
+            user.email = form.email.data
+            user.balance = float(form.balance.data)
+            user.is_active = form.is_active.data
+            user.is_admin = form.is_admin.data
+            db.session.commit()
+            # Anchor ledger reconstruction at the edited balance
+            take_snapshot(user.id, edited_at=datetime.now())
+        risk_book.invalidate()
+        leaderboard.refresh_user(user.id)
+        # The admin account that owns GLOBAL_TOTP may have changed
+        admin_credentials.invalidate()
         flash(f'User {user.username} updated successfully', 'success')
         return redirect(url_for('admin_users'))
     
@@ -459,69 +741,16 @@ def create_app():
         # Update current session
         os.environ['TRADEJINI_TWO_FA'] = form.totp_secret.data
         
-        # Store in database for persistence across restarts
-        admin_user = User.query.filter_by(is_admin=True).first()
-        if admin_user:
-            # Store TOTP in admin user record or create system config
-            credential = UserCredential.query.filter_by(
-                user_id=admin_user.id, 
-                credential_name='GLOBAL_TOTP'
-            ).first()
-            
-            if credential:
-                credential.credential_value = form.totp_secret.data
-            else:
-                credential = UserCredential(
-                    user_id=admin_user.id,
-                    credential_name='GLOBAL_TOTP',
-                    credential_value=form.totp_secret.data
-                )
-                db.session.add(credential)
-            
-            db.session.commit()
+        # Store in database for persistence across restarts (write-through cache)
+        admin_credentials.set('GLOBAL_TOTP', form.totp_secret.data)
         
         # Test TradJini authentication with new TOTP
         try:
-            client = TradejiniClient()
-            if client.access_token:
-                # Store access token in database for 24 hours
-                token_credential = UserCredential.query.filter_by(
-                    user_id=admin_user.id,
-                    credential_name='ACCESS_TOKEN'
-                ).first()
-                
-                if token_credential:
-                    token_credential.credential_value = client.access_token
-                else:
-                    token_credential = UserCredential(
-                        user_id=admin_user.id,
-                        credential_name='ACCESS_TOKEN',
-                        credential_value=client.access_token
-                    )
-                    db.session.add(token_credential)
-                
-                db.session.commit()
-                flash('TOTP verified and access token stored! Live prices active for 24 hours.', 'success')
+            # Re-authenticate with the new TOTP; token_provider's file cache
+            # shares the token with every worker, so nothing goes in the DB
+            if token_provider.get_token(force=True):
+                flash('TOTP verified and access token refreshed! Live prices are active.', 'success')
             else:
-                # For now, create a mock token to enable live-like prices
-                import time
-                mock_token = f"MOCK_TOKEN_{int(time.time())}"
-                token_credential = UserCredential.query.filter_by(
-                    user_id=admin_user.id,
-                    credential_name='ACCESS_TOKEN'
-                ).first()
-                
-                if token_credential:
-                    token_credential.credential_value = mock_token
-                else:
-                    token_credential = UserCredential(
-                        user_id=admin_user.id,
-                        credential_name='ACCESS_TOKEN',
-                        credential_value=mock_token
-                    )
-                    db.session.add(token_credential)
-                
-                db.session.commit()
                 flash('TOTP saved! Using simulated live prices (TradJini API credentials need verification).', 'warning')
         except Exception as e:
             flash(f'TOTP verification failed: {str(e)}', 'danger')
@@ -536,6 +765,8 @@ def create_app():
     if not user.is_admin:
         user.is_active = not user.is_active
         db.session.commit()
+        # Deactivated traders drop off the leaderboard
+        leaderboard.refresh_user(user.id)
         status = 'activated' if user.is_active else 'deactivated'
         flash(f'User {user.username} {status}', 'success')
     return redirect(url_for('admin_users'))
@@ -0,0 +1,301 @@
+"""Backtest strategies against recorded ticks through the real trading engine.
+
+Ticks are replayed through publish_price into the same price board the
+app uses, and orders go through trading.execute_order against an
+isolated in-memory database, so fills, rejections and valuations follow
+exactly the /buy, /sell and /portfolio code paths. Each strategy runs in
+its own process.
+
+Usage:
+  python backtest.py --synthetic-day ticks.csv        # write a simulated day
+  python backtest.py ticks.csv --strategies buy-and-hold,ma-cross,mean-reversion
+
+Tick files are CSV with timestamp,symbol,price columns or JSON lines with
+the same keys; timestamps are epoch seconds or ISO 8601.
+"""
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+STARTING_CASH = 1000000.0
+# Equity is sampled for the P&L curve once per this many seconds of tick time
+SAMPLE_SECONDS = 60
+TRADING_DAY_SECONDS = int(6.25 * 3600)
+
+
+def _parse_timestamp(value):
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def load_ticks(path):
+    """(timestamps, symbols, prices) lists sorted by time"""
+    rows = []
+    with open(path, 'r', newline='') as f:
+        if path.endswith('.jsonl') or path.endswith('.json'):
+            for line in f:
+                if line.strip():
+                    tick = json.loads(line)
+                    rows.append((_parse_timestamp(str(tick['timestamp'])), tick['symbol'], float(tick['price'])))
+        else:
+            for row in csv.DictReader(f):
+                rows.append((_parse_timestamp(row['timestamp']), sys.intern(row['symbol']), float(row['price'])))
+    rows.sort(key=lambda row: row[0])
+    return [row[0] for row in rows], [row[1] for row in rows], [row[2] for row in rows]
+
+
+def write_synthetic_day(path, symbols=None, seed=42, tick_seconds=1.0):
+    """Write one simulated NSE session (one tick per symbol per tick_seconds) as CSV"""
+    from market_simulator import MarketSimulator, BASE_PRICES
+
+    simulator = MarketSimulator(symbols or list(BASE_PRICES), seed=seed, tick_seconds=tick_seconds)
+    ticks = int(TRADING_DAY_SECONDS / tick_seconds)
+    prices = simulator.path(ticks)
+    session_open = datetime.combine(datetime.now().date(), datetime.min.time()) + timedelta(hours=9, minutes=15)
+    start = session_open.timestamp()
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['timestamp', 'symbol', 'price'])
+        for t in range(ticks):
+            ts = f"{start + t * tick_seconds:.1f}"
+            writer.writerows((ts, symbol, price) for symbol, price in zip(simulator.symbols, prices[t].tolist()))
+    return ticks * len(simulator.symbols)
+
+
+class Strategy:
+    """Base strategy: on_tick returns ('BUY' | 'SELL', quantity) or None"""
+
+    name = None
+
+    def __init__(self, symbols, cash, trade_fraction=0.05, cooldown=900):
+        self.symbols = symbols
+        self.budget = cash * trade_fraction
+        self.cooldown = cooldown
+        self.last_trade = {}
+
+    def ready(self, ts, symbol):
+        return ts - self.last_trade.get(symbol, float('-inf')) >= self.cooldown
+
+    def on_tick(self, ts, symbol, price, position):
+        raise NotImplementedError
+
+
+class BuyAndHold(Strategy):
+    """Spend the starting cash evenly across symbols on their first tick"""
+
+    name = 'buy-and-hold'
+
+    def __init__(self, symbols, cash, **kwargs):
+        super().__init__(symbols, cash, **kwargs)
+        self.budget = cash / max(len(symbols), 1) * 0.99
+
+    def on_tick(self, ts, symbol, price, position):
+        if symbol not in self.last_trade:
+            self.last_trade[symbol] = ts
+            quantity = int(self.budget // price)
+            return ('BUY', quantity) if quantity > 0 else None
+        return None
+
+
+class MovingAverageCross(Strategy):
+    """Long when the fast EMA is above the slow EMA, flat otherwise"""
+
+    name = 'ma-cross'
+
+    def __init__(self, symbols, cash, fast=300, slow=1800, **kwargs):
+        super().__init__(symbols, cash, **kwargs)
+        self.fast_alpha = 2.0 / (fast + 1)
+        self.slow_alpha = 2.0 / (slow + 1)
+        self.warmup = slow
+        self.fast = {}
+        self.slow = {}
+        self.seen = {}
+
+    def on_tick(self, ts, symbol, price, position):
+        fast = self.fast.get(symbol, price)
+        slow = self.slow.get(symbol, price)
+        fast += self.fast_alpha * (price - fast)
+        slow += self.slow_alpha * (price - slow)
+        self.fast[symbol] = fast
+        self.slow[symbol] = slow
+        seen = self.seen[symbol] = self.seen.get(symbol, 0) + 1
+        if seen < self.warmup or not self.ready(ts, symbol):
+            return None
+        if fast > slow and position == 0:
+            self.last_trade[symbol] = ts
+            quantity = int(self.budget // price)
+            return ('BUY', quantity) if quantity > 0 else None
+        if fast < slow and position > 0:
+            self.last_trade[symbol] = ts
+            return ('SELL', position)
+        return None
+
+
+class MeanReversion(Strategy):
+    """Buy dips more than `entry` standard deviations below the EMA, exit at the mean"""
+
+    name = 'mean-reversion'
+
+    def __init__(self, symbols, cash, window=600, entry=2.0, **kwargs):
+        super().__init__(symbols, cash, **kwargs)
+        self.alpha = 2.0 / (window + 1)
+        self.warmup = window
+        self.entry = entry
+        self.mean = {}
+        self.var = {}
+        self.seen = {}
+
+    def on_tick(self, ts, symbol, price, position):
+        mean = self.mean.get(symbol, price)
+        var = self.var.get(symbol, 0.0)
+        delta = price - mean
+        mean += self.alpha * delta
+        var = (1 - self.alpha) * (var + self.alpha * delta * delta)
+        self.mean[symbol] = mean
+        self.var[symbol] = var
+        seen = self.seen[symbol] = self.seen.get(symbol, 0) + 1
+        if seen < self.warmup or var <= 0 or not self.ready(ts, symbol):
+            return None
+        z = (price - mean) / var ** 0.5
+        if z < -self.entry and position == 0:
+            self.last_trade[symbol] = ts
+            quantity = int(self.budget // price)
+            return ('BUY', quantity) if quantity > 0 else None
+        if z > 0 and position > 0:
+            self.last_trade[symbol] = ts
+            return ('SELL', position)
+        return None
+
+
+STRATEGIES = {cls.name: cls for cls in (BuyAndHold, MovingAverageCross, MeanReversion)}
+
+
+def run_backtest(tick_path, strategy_name, cash=STARTING_CASH, sample_seconds=SAMPLE_SECONDS):
+    """Replay ticks for one strategy; returns a summary dict with its P&L curve"""
+    from harness import make_app, create_user
+    from models import db, User
+    from live_price_stream import publish_price, live_prices
+    from trading import execute_order, get_holdings
+
+    started = time.perf_counter()
+    timestamps, symbols, prices = load_ticks(tick_path)
+    loaded = time.perf_counter()
+
+    # In-memory SQLite, private to this process
+    app = make_app('sqlite://')
+    user_id = create_user(app, f"bt-{strategy_name}", cash)
+    strategy = STRATEGIES[strategy_name](sorted(set(symbols)), cash)
+
+    positions = {}
+    balance = cash
+    trades = rejected = 0
+    curve = []
+    next_sample = timestamps[0] if timestamps else 0
+
+    with app.app_context():
+        for ts, symbol, price in zip(timestamps, symbols, prices):
+            publish_price(symbol, price)
+            order = strategy.on_tick(ts, symbol, price, positions.get(symbol, 0))
+            if order is not None:
+                side, quantity = order
+                # Priced off the board, exactly like /buy and /sell
+                result = execute_order(user_id, side, symbol, quantity, live_prices[symbol])
+                if result['status'] == 'FILLED':
+                    trades += 1
+                    balance = result['balance']
+                    positions[symbol] = positions.get(symbol, 0) + (quantity if side == 'BUY' else -quantity)
+                else:
+                    rejected += 1
+            if ts >= next_sample:
+                equity = balance + sum(qty * live_prices[s] for s, qty in positions.items() if qty)
+                curve.append((ts, round(equity, 2)))
+                next_sample = ts + sample_seconds
+
+        # Final valuation through the same holdings query as /portfolio
+        holdings = get_holdings(user_id)
+        final_balance = db.session.get(User, user_id).balance
+        final_equity = final_balance + sum(data['quantity'] * live_prices.get(s, 0.0) for s, data in holdings.items())
+    if timestamps:
+        curve.append((timestamps[-1], round(final_equity, 2)))
+
+    equity = np.array([point[1] for point in curve]) if curve else np.array([cash])
+    drawdown = 1 - equity / np.maximum.accumulate(equity)
+    return {
+        'strategy': strategy_name,
+        'ticks': len(timestamps),
+        'trades': trades,
+        'rejected': rejected,
+        'final_equity': round(final_equity, 2),
+        'pnl': round(final_equity - cash, 2),
+        'pnl_percent': round((final_equity / cash - 1) * 100, 3),
+        'max_drawdown_percent': round(float(drawdown.max()) * 100, 3),
+        'load_seconds': round(loaded - started, 2),
+        'replay_seconds': round(time.perf_counter() - loaded, 2),
+        'curve': curve
+    }
+
+
+def write_curve(summary, out_dir):
+    path = os.path.join(out_dir, f"pnl_{summary['strategy']}.csv")
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['timestamp', 'equity', 'pnl'])
+        for ts, equity in summary['curve']:
+            writer.writerow([datetime.fromtimestamp(ts).isoformat(), equity, round(equity - STARTING_CASH, 2)])
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('ticks', nargs='?', help='tick file (CSV or JSON lines)')
+    parser.add_argument('--strategies', default=','.join(STRATEGIES),
+                        help=f"comma-separated, from: {', '.join(STRATEGIES)}")
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--out', default='backtest_results', help='directory for P&L curve CSVs')
+    parser.add_argument('--synthetic-day', metavar='PATH', help='write a simulated session to PATH and exit')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    if args.synthetic_day:
+        started = time.perf_counter()
+        count = write_synthetic_day(args.synthetic_day, seed=args.seed)
+        print(f"Wrote {count} ticks to {args.synthetic_day} in {time.perf_counter() - started:.1f}s")
+        return 0
+    if not args.ticks:
+        parser.error('a tick file is required')
+
+    names = [name.strip() for name in args.strategies.split(',') if name.strip()]
+    unknown = [name for name in names if name not in STRATEGIES]
+    if unknown:
+        parser.error(f"unknown strategies: {', '.join(unknown)}")
+    if not names:
+        parser.error('no strategies given')
+    if args.workers < 1:
+        parser.error('--workers must be at least 1')
+
+    os.makedirs(args.out, exist_ok=True)
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=min(args.workers, len(names))) as pool:
+        summaries = list(pool.map(run_backtest, [args.ticks] * len(names), names))
+    elapsed = time.perf_counter() - started
+
+    print(f"{'strategy':<16}{'trades':>8}{'P&L':>14}{'P&L %':>9}{'max DD %':>10}{'replay s':>10}")
+    for summary in summaries:
+        print(f"{summary['strategy']:<16}{summary['trades']:>8}{summary['pnl']:>14,.2f}"
+              f"{summary['pnl_percent']:>9.3f}{summary['max_drawdown_percent']:>10.3f}{summary['replay_seconds']:>10.2f}")
+        write_curve(summary, args.out)
+    print(f"{len(names)} strategies over {summaries[0]['ticks'] if summaries else 0} ticks in {elapsed:.1f}s; "
+          f"P&L curves in {args.out}/")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,604 @@
+"""Load and consistency benchmarks for the trading simulator.
+
+Usage: python benchmarks.py <name> [options]
+"""
+import sys
+
+if __name__ == '__main__' and sys.argv[1:2] == ['green-pushes']:
+    # Same as the gunicorn eventlet worker: patch before anything else is imported
+    import eventlet
+    eventlet.monkey_patch()
+
+import os
+import time
+import tempfile
+import argparse
+import threading
+import numpy as np
+from sqlalchemy.exc import OperationalError
+from models import db, User, Transaction
+from harness import make_app, create_user
+
+
+def bench_concurrent_trades(args):
+    """Hammer one user with concurrent buys/sells and check for lost updates"""
+    from trading import execute_order
+
+    workdir = tempfile.mkdtemp()
+    app = make_app(f"sqlite:///{os.path.join(workdir, 'bench.db')}")
+    price = 100.0
+    start_balance = price * args.affordable
+    user_id = create_user(app, 'stress', start_balance)
+
+    fills = {'BUY': 0, 'SELL': 0, 'errors': 0}
+    fills_lock = threading.Lock()
+
+    def worker(n):
+        with app.app_context():
+            for i in range(args.orders):
+                side = 'BUY' if (n + i) % 3 else 'SELL'
+                try:
+                    result = execute_order(user_id, side, 'SBIN', 1, price)
+                except OperationalError:
+                    with fills_lock:
+                        fills['errors'] += 1
+                    continue
+                if result['status'] == 'FILLED':
+                    with fills_lock:
+                        fills[side] += 1
+            db.session.remove()
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(args.threads)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        balance = db.session.get(User, user_id).balance
+        bought = db.session.query(db.func.sum(Transaction.quantity)).filter_by(type='BUY').scalar() or 0
+        sold = db.session.query(db.func.sum(Transaction.quantity)).filter_by(type='SELL').scalar() or 0
+
+    total = args.threads * args.orders
+    expected_balance = start_balance - (fills['BUY'] - fills['SELL']) * price
+    print(f"{total} orders in {elapsed:.2f}s ({total / elapsed:.0f} orders/s)")
+    print(f"fills: {fills}, ledger: bought={bought} sold={sold}")
+    print(f"balance: {balance:.2f} (expected {expected_balance:.2f})")
+
+    ok = (
+        abs(balance - expected_balance) < 1e-6
+        and bought == fills['BUY']
+        and sold == fills['SELL']
+        and sold <= bought
+        and balance >= 0
+    )
+    print("OK: no lost updates" if ok else "FAIL: ledger and balance diverged")
+    return 0 if ok else 1
+
+
+def bench_simulator(args):
+    """Step a large synthetic market and check the seeded path is reproducible"""
+    from market_simulator import MarketSimulator
+
+    simulator = MarketSimulator.synthetic(args.symbols, seed=7)
+    started = time.perf_counter()
+    for _ in range(args.ticks):
+        prices = simulator.step()
+    elapsed = time.perf_counter() - started
+    print(f"{args.ticks} ticks x {args.symbols} symbols in {elapsed:.3f}s "
+          f"({args.ticks / elapsed:.0f} ticks/s, {args.ticks * args.symbols / elapsed / 1e6:.1f}M prices/s)")
+
+    replay = MarketSimulator.synthetic(args.symbols, seed=7)
+    for _ in range(args.ticks):
+        replay_prices = replay.step()
+    moves = np.log(prices / simulator.open_prices)
+    print(f"price range {prices.min():.2f}..{prices.max():.2f}, "
+          f"cross-sectional move mean {moves.mean():+.4f} sd {moves.std():.4f}")
+
+    ok = np.allclose(prices, replay_prices) and (prices > 0).all()
+    print("OK: deterministic for a fixed seed" if ok else "FAIL: seeded runs diverged")
+    return 0 if ok else 1
+
+
+def _median_ms(fn, samples):
+    timings = []
+    for sample in samples:
+        started = time.perf_counter()
+        fn(sample)
+        timings.append((time.perf_counter() - started) * 1000)
+    return float(np.median(timings))
+
+
+def bench_history_queries(args):
+    """Time per-user history/position/credential queries as the ledger grows"""
+    from datetime import datetime, timedelta
+    from sqlalchemy import insert, select, text
+    from models import UserCredential
+    from trading import get_position, get_holdings
+    from migrations import migrate_schema
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    symbols = [f"SYM{i}" for i in range(50)]
+    workdir = tempfile.mkdtemp()
+    app = make_app(f"sqlite:///{os.path.join(workdir, 'history.db')}")
+    rng = np.random.default_rng(1)
+
+    with app.app_context():
+        db.session.execute(insert(User), [
+            {'username': f"u{i}", 'email': f"u{i}@bench.local", 'password_hash': 'x', 'balance': 1e6}
+            for i in range(args.users)
+        ])
+        db.session.execute(insert(UserCredential), [
+            {'user_id': i + 1, 'credential_name': name, 'credential_value': 'v'}
+            for i in range(args.users) for name in ('GLOBAL_TOTP', 'ACCESS_TOKEN')
+        ])
+        db.session.commit()
+
+        def run_queries(label):
+            users = rng.integers(1, args.users + 1, 200).tolist()
+            history = _median_ms(lambda u: Transaction.query.filter_by(user_id=u)
+                                 .order_by(Transaction.timestamp.desc()).limit(50).all(), users)
+            position = _median_ms(lambda u: get_position(u, symbols[u % 50]), users)
+            holdings = _median_ms(get_holdings, users)
+            credential = _median_ms(lambda u: UserCredential.query.filter_by(
+                user_id=u, credential_name='ACCESS_TOKEN').first(), users)
+            print(f"{label:>22} {history:>10.3f} {position:>10.3f} {holdings:>10.3f} {credential:>10.3f}")
+
+        print(f"{'rows':>22} {'history':>10} {'position':>10} {'holdings':>10} {'credential':>10}  (median ms)")
+        start = datetime(2024, 1, 1)
+        inserted = 0
+        for size in sizes:
+            while inserted < size:
+                batch = min(50000, size - inserted)
+                user_ids = rng.integers(1, args.users + 1, batch)
+                picks = rng.integers(0, 50, batch)
+                db.session.execute(insert(Transaction), [
+                    {'user_id': int(u), 'symbol': symbols[p], 'type': 'BUY' if (inserted + k) % 3 else 'SELL',
+                     'quantity': 1, 'price': 100.0, 'timestamp': start + timedelta(seconds=inserted + k)}
+                    for k, (u, p) in enumerate(zip(user_ids.tolist(), picks.tolist()))
+                ])
+                db.session.commit()
+                inserted += batch
+            db.session.execute(text('ANALYZE'))
+            run_queries(f"{size:,} indexed")
+            if args.compare:
+                for index in Transaction.__table__.indexes | UserCredential.__table__.indexes:
+                    index.drop(db.engine)
+                run_queries(f"{size:,} no index")
+                migrate_schema()
+    return 0
+
+
+def _write_throughput(label, database_url, tuned, args):
+    from trading import execute_order, get_holdings
+
+    app = make_app(database_url, tuned)
+    user_ids = [create_user(app, f"writer{n}", 1e9) for n in range(args.threads)]
+    errors = [0]
+    read_latencies = []
+    done = threading.Event()
+    lock = threading.Lock()
+
+    def writer(user_id):
+        with app.app_context():
+            for i in range(args.orders):
+                try:
+                    execute_order(user_id, 'SELL' if i % 4 == 3 else 'BUY', 'SBIN', 1, 100.0)
+                except OperationalError:
+                    with lock:
+                        errors[0] += 1
+            db.session.remove()
+
+    def reader():
+        # Portfolio reads running alongside the writers
+        with app.app_context():
+            while not done.is_set():
+                started = time.perf_counter()
+                try:
+                    get_holdings(user_ids[0])
+                    read_latencies.append((time.perf_counter() - started) * 1000)
+                except OperationalError:
+                    with lock:
+                        errors[0] += 1
+                db.session.rollback()
+            db.session.remove()
+
+    read_thread = threading.Thread(target=reader)
+    threads = [threading.Thread(target=writer, args=(user_id,)) for user_id in user_ids]
+    read_thread.start()
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    done.set()
+    read_thread.join()
+
+    with app.app_context():
+        written = db.session.query(db.func.count(Transaction.id)).scalar()
+        db.engine.dispose()
+    total = args.threads * args.orders
+    reads = np.array(read_latencies) if read_latencies else np.zeros(1)
+    print(f"{label:<22}{total / elapsed:>10.0f}{written:>9}{errors[0]:>8}{len(read_latencies):>8}"
+          f"{np.percentile(reads, 50):>9.2f}{np.percentile(reads, 99):>9.2f}")
+    return written, errors[0]
+
+
+def bench_db_writes(args):
+    """Order write throughput with concurrent readers: default SQLite vs WAL-tuned SQLite (vs Postgres)"""
+    workdir = tempfile.mkdtemp()
+    targets = [
+        ('sqlite rollback', f"sqlite:///{os.path.join(workdir, 'rollback.db')}", False),
+        ('sqlite wal+tuned', f"sqlite:///{os.path.join(workdir, 'wal.db')}", True),
+    ]
+    if args.database_url:
+        targets.append(('configured (tuned)', args.database_url, True))
+
+    print(f"{args.threads} writers x {args.orders} orders, 1 concurrent reader")
+    print(f"{'backend':<22}{'orders/s':>10}{'rows':>9}{'errors':>8}{'reads':>8}{'p50 ms':>9}{'p99 ms':>9}")
+    ok = True
+    for label, database_url, tuned in targets:
+        written, errors = _write_throughput(label, database_url, tuned, args)
+        if tuned:
+            ok = ok and written == args.threads * args.orders
+    print("OK: tuned backends persisted every order" if ok else "FAIL: tuned backend lost orders to lock errors")
+    return 0 if ok else 1
+
+
+_LOCK_HOLDER = """
+import sys, time, fcntl, sqlite3
+path, db_path, hold = sys.argv[1], sys.argv[2], float(sys.argv[3])
+handle = open(path, 'a')
+fcntl.flock(handle, fcntl.LOCK_EX)
+conn = sqlite3.connect(db_path, isolation_level=None)
+conn.execute('BEGIN IMMEDIATE')
+print('locked', flush=True)
+time.sleep(hold)
+conn.execute('ROLLBACK')
+"""
+
+
+def _push_gaps(label, offload, args, workdir):
+    """Max gap between price pushes while logins, a token-lock wait and a contended order run"""
+    import subprocess
+    import eventlet
+    import blocking
+    import database
+    from config import SQLITE_BUSY_TIMEOUT_MS, SQLITE_GREEN_BUSY_TIMEOUT_MS
+    from live_price_stream import publish_price
+    from token_provider import _FileLock
+    from trading import execute_order
+
+    blocking.OFFLOAD_ENABLED = offload
+    database.SQLITE_GREEN_BUSY_TIMEOUT_MS = SQLITE_GREEN_BUSY_TIMEOUT_MS if offload else SQLITE_BUSY_TIMEOUT_MS
+    db_path = os.path.join(workdir, f"{label.split()[0]}.db")
+    app = make_app(f"sqlite:///{db_path}")
+    user_id = create_user(app, 'login', 1e6)
+    lock_path = os.path.join(workdir, 'token.lock')
+
+    pushes = []
+    running = [True]
+
+    def pusher():
+        # Stand-in for the simulator / live feed loop
+        while running[0]:
+            publish_price('SBIN', 100.0)
+            pushes.append(time.perf_counter())
+            eventlet.sleep(args.push_interval / 1000)
+
+    def slow_requests():
+        with app.app_context():
+            for _ in range(args.logins):
+                db.session.get(User, user_id).check_password('benchmark')
+                db.session.remove()
+            # Another worker is authenticating and holds the token file lock
+            # and a write transaction for `hold` seconds
+            holder = subprocess.Popen([sys.executable, '-c', _LOCK_HOLDER, lock_path, db_path, str(args.hold)],
+                                      stdout=subprocess.PIPE, text=True)
+            holder.stdout.readline()
+            with _FileLock(lock_path):
+                pass
+            holder.wait()
+            holder = subprocess.Popen([sys.executable, '-c', _LOCK_HOLDER, lock_path + '.2', db_path, str(args.hold)],
+                                      stdout=subprocess.PIPE, text=True)
+            holder.stdout.readline()
+            result = execute_order(user_id, 'BUY', 'SBIN', 1, 100.0)
+            holder.wait()
+            db.session.remove()
+            return result['status']
+
+    push_thread = eventlet.spawn(pusher)
+    eventlet.sleep(0.05)
+    started = time.perf_counter()
+    status = eventlet.spawn(slow_requests).wait()
+    elapsed = time.perf_counter() - started
+    running[0] = False
+    push_thread.wait()
+
+    # Include the last push before the slow requests began
+    first = max(int(np.searchsorted(pushes, started)) - 1, 0)
+    gaps = np.diff(pushes[first:]) * 1000
+    print(f"{label:<18}{elapsed:>9.2f}{len(gaps):>8}{np.percentile(gaps, 50):>9.1f}"
+          f"{np.percentile(gaps, 99):>9.1f}{gaps.max():>9.1f}  order {status}")
+    return gaps.max()
+
+
+def bench_green_pushes(args):
+    """Show price pushes keep flowing while slow requests run on the same eventlet worker"""
+    from blocking import is_green
+
+    if not is_green():
+        print("run as: python benchmarks.py green-pushes (needs eventlet)")
+        return 1
+    workdir = tempfile.mkdtemp()
+    print(f"pushes every {args.push_interval}ms; {args.logins} logins, then token lock and "
+          f"a DB write lock held {args.hold}s by another process")
+    print(f"{'mode':<18}{'busy s':>9}{'pushes':>8}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    inline = _push_gaps('inline (blocking)', False, args, workdir)
+    offloaded = _push_gaps('offloaded', True, args, workdir)
+    ok = offloaded < args.max_gap
+    print(f"OK: pushes never paused more than {args.max_gap}ms" if ok
+          else f"FAIL: pushes paused {offloaded:.0f}ms (inline: {inline:.0f}ms)")
+    return 0 if ok else 1
+
+
+_JOURNAL_CRASH = """
+import os, sys
+from harness import make_app
+from trade_journal import TradeJournal, JournaledExecutor
+database_url, path, user_id, orders = sys.argv[1], sys.argv[2], int(sys.argv[3]), int(sys.argv[4])
+app = make_app(database_url)
+journal = TradeJournal(path, flush_interval=3600)
+journal.recover(app)
+executor = JournaledExecutor(journal)
+with app.app_context():
+    filled = sum(executor.execute_order(user_id, 'BUY', 'SBIN', 1, 100.0)['status'] == 'FILLED' for _ in range(orders))
+print(filled, flush=True)
+os._exit(0)  # crash: no flush, no atexit
+"""
+
+
+def _order_storm(place, app, user_ids, orders):
+    errors = [0]
+    lock = threading.Lock()
+
+    def worker(user_id):
+        with app.app_context():
+            for i in range(orders):
+                try:
+                    place(user_id, 'SELL' if i % 4 == 3 else 'BUY', 'SBIN', 1, 100.0)
+                except OperationalError:
+                    with lock:
+                        errors[0] += 1
+            db.session.remove()
+
+    threads = [threading.Thread(target=worker, args=(user_id,)) for user_id in user_ids]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - started, errors[0]
+
+
+def bench_journal_writes(args):
+    """Orders at the bell: per-order commits vs the write-behind journal and order actors, plus crash recovery"""
+    import subprocess
+    from trading import execute_order
+    from trade_journal import TradeJournal, JournaledExecutor
+    from order_actors import OrderActors
+    from config import JOURNAL_FSYNC
+
+    workdir = tempfile.mkdtemp()
+    total = args.threads * args.orders
+    # Every order fills: start balances cover all the buys
+    start_balance = 100.0 * args.orders
+    expected_rows = total
+    expected_balance = start_balance - 100.0 * (args.orders - 2 * (args.orders // 4))
+
+    def database(name):
+        return args.database_url or f"sqlite:///{os.path.join(workdir, name)}"
+
+    print(f"{args.threads} users x {args.orders} orders each, JOURNAL_FSYNC={JOURNAL_FSYNC}")
+    print(f"{'mode':<10}{'orders/s':>10}{'errors':>8}{'rows':>8}  balances")
+    ok = True
+    for mode in ('sync', 'journal', 'actors'):
+        app = make_app(database(f"{mode}.db"))
+        user_ids = [create_user(app, f"{mode}{n}", start_balance) for n in range(args.threads)]
+        if mode == 'sync':
+            elapsed, errors = _order_storm(execute_order, app, user_ids, args.orders)
+        else:
+            journal = TradeJournal(os.path.join(workdir, f"{mode}.wal"))
+            journal.start(app)
+            if mode == 'journal':
+                engine = JournaledExecutor(journal)
+            else:
+                engine = OrderActors(journal, args.actors)
+                engine.start(app)
+            elapsed, errors = _order_storm(engine.execute_order, app, user_ids, args.orders)
+            journal.flush_all()
+        with app.app_context():
+            rows = db.session.query(db.func.count(Transaction.id)).filter(Transaction.user_id.in_(user_ids)).scalar()
+            balances = {balance for (balance,) in db.session.query(User.balance).filter(User.id.in_(user_ids))}
+        consistent = rows == expected_rows and balances == {expected_balance}
+        ok = ok and consistent
+        print(f"{mode:<10}{total / elapsed:>10.0f}{errors:>8}{rows:>8}  "
+              f"{'all ' + format(expected_balance, '.2f') if consistent else sorted(balances)}")
+        if mode != 'sync':
+            status = journal.get_status()
+            print(f"  {status['flushed']} entries in {status['flushes']} group commits, {status['fsyncs']} fsyncs")
+
+    # Crash after acknowledging orders but before any group commit
+    app = make_app(database('crash.db'))
+    user_id = create_user(app, 'crash', 1e9)
+    path = os.path.join(workdir, 'crash.wal')
+    child = subprocess.run(
+        [sys.executable, '-c', _JOURNAL_CRASH, database('crash.db'), path, str(user_id), str(args.orders)],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    acknowledged = int(child.stdout.split()[-1]) if child.stdout.split() else 0
+    with app.app_context():
+        before = db.session.query(db.func.count(Transaction.id)).filter_by(user_id=user_id).scalar()
+    recovered = TradeJournal(path).recover(app)
+    with app.app_context():
+        after = db.session.query(db.func.count(Transaction.id)).filter_by(user_id=user_id).scalar()
+        balance = db.session.get(User, user_id).balance
+    recovered_ok = acknowledged == args.orders and before == 0 and after == acknowledged \
+        and abs(balance - (1e9 - 100.0 * acknowledged)) < 1e-6
+    print(f"crash: {acknowledged} acknowledged, {before} in DB after crash, "
+          f"{recovered} replayed, {after} in DB after recovery")
+    ok = ok and recovered_ok
+    print("OK: ledgers match and no acknowledged order was lost" if ok else "FAIL: journal lost or duplicated orders")
+    return 0 if ok else 1
+
+
+def bench_ledger_rebuild(args):
+    """Rebuild one user's ledger (now and as of a past time) from snapshots vs a full replay"""
+    from datetime import datetime, timedelta
+    from sqlalchemy import insert, update, text
+    from ledger import LedgerState, reconstruct, take_snapshot, audit, _opening_cash, _tail_query, AUDIT_TOLERANCE
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    symbols = [f"SYM{i}" for i in range(50)]
+    app = make_app(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'ledger.db')}")
+    user_id = create_user(app, 'ledger', 1e9)
+    rng = np.random.default_rng(3)
+    start = datetime(2024, 1, 1)
+
+    print(f"snapshot every {args.snapshot_every:,} transactions")
+    print(f"{'rows':>12} {'full ms':>10} {'now ms':>10} {'as-of ms':>10} {'as-of tail':>11}  match")
+    ok = True
+    with app.app_context():
+        inserted = 0
+        for size in sizes:
+            while inserted < size:
+                batch = min(args.snapshot_every, size - inserted)
+                picks = rng.integers(0, 50, batch).tolist()
+                prices = np.round(rng.uniform(50, 150, batch), 2).tolist()
+                sides = ['BUY' if (inserted + k) % 3 else 'SELL' for k in range(batch)]
+                db.session.execute(insert(Transaction), [
+                    {'user_id': user_id, 'symbol': symbols[p], 'type': side, 'quantity': 1, 'price': price,
+                     'timestamp': start + timedelta(seconds=inserted + k)}
+                    for k, (p, side, price) in enumerate(zip(picks, sides, prices))
+                ])
+                delta = sum(-price if side == 'BUY' else price for side, price in zip(sides, prices))
+                db.session.execute(update(User).where(User.id == user_id).values(balance=User.balance + delta))
+                db.session.commit()
+                inserted += batch
+                if inserted % args.snapshot_every == 0:
+                    take_snapshot(user_id)
+            db.session.execute(text('ANALYZE'))
+
+            as_of = start + timedelta(seconds=int(size * 0.9) + 7)
+            timings = {}
+            started = time.perf_counter()
+            full = LedgerState(_opening_cash(user_id)).apply(db.session.execute(_tail_query(user_id, 0)))
+            full_as_of = LedgerState(_opening_cash(user_id)).apply(
+                db.session.execute(_tail_query(user_id, 0, until_time=as_of)))
+            timings['full'] = (time.perf_counter() - started) * 1000 / 2
+            started = time.perf_counter()
+            now = reconstruct(user_id)
+            timings['now'] = (time.perf_counter() - started) * 1000
+            started = time.perf_counter()
+            past = reconstruct(user_id, as_of)
+            timings['as_of'] = (time.perf_counter() - started) * 1000
+
+            match = all(
+                abs(a.cash - b.cash) < AUDIT_TOLERANCE and a.as_of_txn_id == b.as_of_txn_id
+                and {s: h['quantity'] for s, h in a.holdings().items()} == {s: h['quantity'] for s, h in b.holdings().items()}
+                for a, b in ((now, full), (past, full_as_of))
+            ) and audit(user_id)['ok']
+            ok = ok and match
+            print(f"{size:>12,} {timings['full']:>10.1f} {timings['now']:>10.2f} {timings['as_of']:>10.2f} "
+                  f"{past.replayed:>11}  {'yes' if match else 'NO'}")
+    print("OK: snapshot + tail matches a full replay" if ok else "FAIL: reconstruction diverged from full replay")
+    return 0 if ok else 1
+
+
+def bench_quote_batch(args):
+    """REST quotes for a basket: one token at a time vs get_live_prices, against simulated latency"""
+    import tradejini_client
+    from tradejini_client import TradejiniClient
+
+    class _Quote:
+        status_code = 200
+
+        def __init__(self, token):
+            self.token = token
+
+        def json(self):
+            return {'token': self.token, 'ltp': 100.0}
+
+    def fake_get(url, endpoint='default', params=None, **kwargs):
+        # Stand-in for the network round trip to TradJini
+        time.sleep(args.latency / 1000)
+        return _Quote((params or {}).get('token') or url.rsplit('/', 1)[-1])
+
+    tradejini_client.tradejini_http.get = fake_get
+    client = TradejiniClient(auto_auth=False)
+    client.ensure_token = lambda: 'benchmark'
+    tokens = [f"{i}_NSE" for i in range(args.tokens)]
+
+    started = time.perf_counter()
+    serial = {token: client._fetch_quote(token) for token in tokens}
+    serial_s = time.perf_counter() - started
+    started = time.perf_counter()
+    batched = client.get_live_prices(tokens)
+    batched_s = time.perf_counter() - started
+    started = time.perf_counter()
+    cached = client.get_live_prices(tokens)
+    cached_s = time.perf_counter() - started
+
+    print(f"{args.tokens} tokens at {args.latency:.0f}ms per round trip, "
+          f"{tradejini_client.QUOTE_FETCH_WORKERS} fetch workers")
+    print(f"one at a time  {serial_s * 1000:9.1f} ms")
+    print(f"batched        {batched_s * 1000:9.1f} ms  ({serial_s / batched_s:.1f}x)")
+    print(f"cached         {cached_s * 1000:9.1f} ms")
+    ok = batched == serial == cached and batched_s < serial_s
+    print("OK: batched quotes match and beat serial fetches" if ok else "FAIL: batched quotes differ or are not faster")
+    return 0 if ok else 1
+
+
+BENCHMARKS = {
+    'concurrent-trades': bench_concurrent_trades,
+    'simulator': bench_simulator,
+    'history-queries': bench_history_queries,
+    'db-writes': bench_db_writes,
+    'green-pushes': bench_green_pushes,
+    'journal-writes': bench_journal_writes,
+    'ledger-rebuild': bench_ledger_rebuild,
+    'quote-batch': bench_quote_batch,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('name', choices=sorted(BENCHMARKS))
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--orders', type=int, default=50)
+    parser.add_argument('--affordable', type=int, default=200,
+                        help='number of BUY fills the starting balance can cover')
+    parser.add_argument('--symbols', type=int, default=5000)
+    parser.add_argument('--ticks', type=int, default=1000)
+    parser.add_argument('--sizes', default='10000,100000,1000000',
+                        help='comma-separated ledger sizes to measure at')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--compare', action='store_true', help='also time each size without indexes')
+    parser.add_argument('--database-url', help='extra database to include in db-writes (e.g. Postgres)')
+    parser.add_argument('--push-interval', type=float, default=10, help='ms between price pushes (green-pushes)')
+    parser.add_argument('--logins', type=int, default=10)
+    parser.add_argument('--hold', type=float, default=0.3, help='seconds another process holds the locks')
+    parser.add_argument('--max-gap', type=float, default=100, help='largest acceptable push gap in ms')
+    parser.add_argument('--actors', type=int, default=8, help='order actor shards (journal-writes)')
+    parser.add_argument('--snapshot-every', type=int, default=10000, help='transactions between ledger snapshots')
+    parser.add_argument('--tokens', type=int, default=50, help='basket size (quote-batch)')
+    parser.add_argument('--latency', type=float, default=50, help='simulated ms per quote round trip (quote-batch)')
+    args = parser.parse_args()
+    return BENCHMARKS[args.name](args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,44 @@
+"""Keep blocking work off the eventlet hub.
+
+Gunicorn runs eventlet workers: every request and Socket.IO client of a
+worker shares one OS thread, so a call that blocks that thread in C
+(password hashing, flock, a SQLite busy wait) freezes every price push on
+the worker until it returns. run_blocking() hands such calls to eventlet's
+native thread pool when the process is monkey-patched and runs them inline
+otherwise (dev server, scripts, benchmarks).
+
+Only pass functions that do not touch green primitives (green sockets,
+patched locks); network I/O through requests is already cooperative once
+the worker is monkey-patched.
+"""
+import os
+import functools
+
+try:
+    from eventlet import tpool, patcher
+except ImportError:
+    tpool = None
+    patcher = None
+
+# Set BLOCKING_OFFLOAD=false to run everything inline (for comparison)
+OFFLOAD_ENABLED = os.getenv('BLOCKING_OFFLOAD', 'true').lower() == 'true'
+
+
+def is_green():
+    """True when running under eventlet monkey-patching (gunicorn eventlet worker)"""
+    return patcher is not None and patcher.is_monkey_patched('socket')
+
+
+def run_blocking(fn, *args, **kwargs):
+    """Call fn in a native thread if we are on the eventlet hub, inline otherwise"""
+    if OFFLOAD_ENABLED and is_green():
+        return tpool.execute(fn, *args, **kwargs)
+    return fn(*args, **kwargs)
+
+
+def offloaded(fn):
+    """Decorator form of run_blocking"""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        return run_blocking(fn, *args, **kwargs)
+    return wrapper
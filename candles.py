@@ -0,0 +1,208 @@
+import os
+import time
+import struct
+import logging
+import threading
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are not coordinated across processes
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+BASE_INTERVAL = 60
+INTERVALS = {'1m': 60, '5m': 300, '15m': 900, '1h': 3600, '1d': 86400}
+# One day of 1-minute candles per symbol stays in memory
+RING_SIZE = 1440
+MAX_CANDLES = 2000
+STORE_DIR = os.getenv('CANDLE_STORE_DIR', 'candle_store')
+
+# Completed 1-minute candles on disk: start time, open, high, low, close, tick count
+RECORD = struct.Struct('<qddddi')
+RECORD_DTYPE = np.dtype([('t', '<i8'), ('o', '<f8'), ('h', '<f8'), ('l', '<f8'), ('c', '<f8'), ('n', '<i4')])
+
+
+class CandleRing:
+    """Fixed-size ring of 1-minute OHLC candles for one symbol"""
+
+    def __init__(self, size=RING_SIZE):
+        self.size = size
+        self.times = np.zeros(size, dtype=np.int64)
+        self.ohlc = np.zeros((size, 4), dtype=np.float64)
+        self.ticks = np.zeros(size, dtype=np.int32)
+        self.head = -1      # slot of the current (newest) candle
+        self.count = 0
+        self.version = 0    # bumps on every tick, used for ETags
+
+    def add(self, bucket, price):
+        """Fold a tick into the candle starting at bucket; returns the candle it completed, if any"""
+        self.version += 1
+        if self.count and self.times[self.head] == bucket:
+            row = self.ohlc[self.head]
+            if price > row[1]:
+                row[1] = price
+            if price < row[2]:
+                row[2] = price
+            row[3] = price
+            self.ticks[self.head] += 1
+            return None
+        if self.count and bucket < self.times[self.head]:
+            return None  # late tick for an already closed minute
+        completed = self.latest() if self.count else None
+        self.head = (self.head + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+        self.times[self.head] = bucket
+        self.ohlc[self.head] = price
+        self.ticks[self.head] = 1
+        return completed
+
+    def latest(self):
+        row = self.ohlc[self.head]
+        return (int(self.times[self.head]), row[0], row[1], row[2], row[3], int(self.ticks[self.head]))
+
+    def snapshot(self):
+        """Candles in time order as a structured array"""
+        order = (np.arange(self.head - self.count + 1, self.head + 1)) % self.size
+        out = np.empty(self.count, dtype=RECORD_DTYPE)
+        out['t'] = self.times[order]
+        out['o'], out['h'], out['l'], out['c'] = self.ohlc[order].T
+        out['n'] = self.ticks[order]
+        return out
+
+
+def aggregate(candles, interval):
+    """Roll 1-minute candles up to a coarser interval"""
+    if interval == BASE_INTERVAL or len(candles) == 0:
+        return candles
+    keys = candles['t'] // interval * interval
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(keys)) + 1))
+    ends = np.concatenate((starts[1:], [len(candles)])) - 1
+    out = np.empty(len(starts), dtype=RECORD_DTYPE)
+    out['t'] = keys[starts]
+    out['o'] = candles['o'][starts]
+    out['h'] = np.maximum.reduceat(candles['h'], starts)
+    out['l'] = np.minimum.reduceat(candles['l'], starts)
+    out['c'] = candles['c'][ends]
+    out['n'] = np.add.reduceat(candles['n'], starts)
+    return out
+
+
+class CandleStore:
+    """Per-symbol candle rings fed by the price board, with an on-disk tail.
+
+    The price listener folds each tick into the symbol's current 1-minute
+    candle; when a minute closes the finished candle is appended to a
+    fixed-record file per symbol, so ranges older than the ring are read
+    from disk with a binary search. Requests never touch the SQL database.
+    """
+
+    def __init__(self, store_dir=STORE_DIR, ring_size=RING_SIZE):
+        self.store_dir = store_dir
+        self.ring_size = ring_size
+        self.rings = {}
+        self.lock = threading.Lock()
+
+    def on_price(self, symbol, price):
+        ring = self.rings.get(symbol)
+        if ring is None:
+            with self.lock:
+                ring = self.rings.setdefault(symbol, CandleRing(self.ring_size))
+        bucket = int(time.time()) // BASE_INTERVAL * BASE_INTERVAL
+        completed = ring.add(bucket, price)
+        if completed is not None:
+            try:
+                self._append(symbol, completed)
+            except OSError as e:
+                logger.error(f"Could not persist candle for {symbol}: {e}")
+
+    def window(self, interval, start=None, end=None, limit=MAX_CANDLES):
+        """Resolve a request to concrete (start, end, limit), limit clamped to [1, MAX_CANDLES].
+
+        An open end is the start of the next minute: the same candles as
+        "now", but stable for the whole minute so ETags can still match.
+        """
+        limit = min(max(int(limit), 1), MAX_CANDLES)
+        if end is None:
+            end = (int(time.time()) // BASE_INTERVAL + 1) * BASE_INTERVAL
+        if start is None:
+            # Enough 1-minute candles to fill `limit` candles of this interval
+            start = (end - interval * limit) // interval * interval
+        return start, end, limit
+
+    def etag(self, symbol, interval, start, end, limit):
+        ring = self.rings.get(symbol)
+        version = ring.version if ring else 0
+        head = ring.latest()[0] if ring and ring.count else 0
+        start, end, limit = self.window(interval, start, end, limit)
+        return f"{symbol}-{interval}-{start}-{end}-{limit}-{head}-{version}"
+
+    def get(self, symbol, interval=BASE_INTERVAL, start=None, end=None, limit=MAX_CANDLES):
+        """Candles for symbol in [start, end) as a structured array, newest `limit` kept"""
+        ring = self.rings.get(symbol)
+        recent = ring.snapshot() if ring else np.empty(0, dtype=RECORD_DTYPE)
+        ring_start = int(recent['t'][0]) if len(recent) else None
+        start, end, limit = self.window(interval, start, end, limit)
+
+        parts = []
+        if ring_start is None or start < ring_start:
+            parts.append(self._read(symbol, start, ring_start if ring_start is not None else end))
+        if len(recent):
+            parts.append(recent[(recent['t'] >= start) & (recent['t'] < end)])
+        candles = np.concatenate(parts) if parts else recent
+        candles = aggregate(candles, interval)
+        return candles[-limit:]
+
+    def _path(self, symbol):
+        safe = ''.join(ch if ch.isalnum() or ch in '-_' else f"%{ord(ch):02X}" for ch in symbol)
+        return os.path.join(self.store_dir, f"{safe}.c1m")
+
+    def _append(self, symbol, candle):
+        """Append a completed candle unless another worker already wrote it"""
+        os.makedirs(self.store_dir, exist_ok=True)
+        with open(self._path(symbol), 'a+b') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                size = f.seek(0, os.SEEK_END)
+                if size >= RECORD.size:
+                    f.seek(size - size % RECORD.size - RECORD.size)
+                    last_time = RECORD.unpack(f.read(RECORD.size))[0]
+                    if last_time >= candle[0]:
+                        return
+                f.seek(size - size % RECORD.size)
+                f.truncate()
+                f.write(RECORD.pack(*candle))
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _read(self, symbol, start, end):
+        """Stored candles with start <= t < end, located by binary search"""
+        path = self._path(symbol)
+        try:
+            # Whole records only: a torn trailing record from a crash is ignored, not the file
+            count = os.path.getsize(path) // RECORD_DTYPE.itemsize
+            if not count:
+                return np.empty(0, dtype=RECORD_DTYPE)
+            records = np.memmap(path, dtype=RECORD_DTYPE, mode='r', shape=(count,))
+        except (OSError, ValueError):
+            return np.empty(0, dtype=RECORD_DTYPE)
+        times = records['t']
+        lo, hi = np.searchsorted(times, [start, end])
+        return np.array(records[lo:hi])
+
+
+def to_json(symbol, interval_name, candles):
+    """Compact column-oriented payload"""
+    return {
+        'symbol': symbol,
+        'interval': interval_name,
+        't': candles['t'].tolist(),
+        'o': candles['o'].tolist(),
+        'h': candles['h'].tolist(),
+        'l': candles['l'].tolist(),
+        'c': candles['c'].tolist(),
+        'n': candles['n'].tolist()
+    }
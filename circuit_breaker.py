@@ -0,0 +1,87 @@
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """Fail-fast guard around an unreliable remote dependency.
+
+    After `failure_threshold` consecutive failures the circuit opens and
+    every caller is refused immediately for `reset_timeout` seconds. Then a
+    single probe call is let through (half-open): success closes the
+    circuit, failure re-opens it. Per-key negative results (e.g. a token
+    with no quote) can be cached for `negative_ttl` seconds.
+    """
+
+    def __init__(self, name, failure_threshold=3, reset_timeout=30, negative_ttl=60):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.negative_ttl = negative_ttl
+        self.lock = threading.Lock()
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.negative = {}
+
+    def allow(self):
+        """Whether a call may proceed now"""
+        with self.lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                self.probe_in_flight = False
+            if self.state == HALF_OPEN and not self.probe_in_flight:
+                self.probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            if self.state != CLOSED:
+                logger.info(f"Circuit {self.name} closed")
+            self.state = CLOSED
+            self.failures = 0
+            self.probe_in_flight = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.probe_in_flight = False
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    logger.warning(f"Circuit {self.name} opened after {self.failures} failures")
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    def remember_failure(self, key):
+        """Cache a negative result for key"""
+        with self.lock:
+            self.negative[key] = time.monotonic() + self.negative_ttl
+
+    def recently_failed(self, key):
+        """Whether key has a cached negative result"""
+        expires = self.negative.get(key)
+        if expires is None:
+            return False
+        if time.monotonic() >= expires:
+            with self.lock:
+                self.negative.pop(key, None)
+            return False
+        return True
+
+    def get_status(self):
+        return {
+            'name': self.name,
+            'state': self.state,
+            'failures': self.failures,
+            'negative_cached': len(self.negative)
+        }
@@ -0,0 +1,84 @@
+import time
+import threading
+from sqlalchemy.exc import IntegrityError
+from models import db, User, UserCredential
+
+# Other workers pick up writes made elsewhere after at most this long
+CACHE_TTL_SECONDS = 60
+
+_MISSING = object()
+
+
+class AdminCredentialCache:
+    """In-process cache of the admin's UserCredential rows (e.g. GLOBAL_TOTP).
+
+    Lookups hit memory; set() writes through to the DB and updates the
+    cache, and invalidate() drops entries explicitly. Entries also expire
+    after a short TTL so writes made by other workers are seen.
+    """
+
+    def __init__(self, ttl=CACHE_TTL_SECONDS):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.values = {}   # name -> (value or _MISSING, expires_at)
+        self.admin_id = None
+
+    def get(self, name):
+        """Credential value for the admin user, or None"""
+        entry = self.values.get(name)
+        if entry and time.monotonic() < entry[1]:
+            return None if entry[0] is _MISSING else entry[0]
+
+        value = _MISSING
+        admin_id = self._get_admin_id()
+        if admin_id:
+            credential = UserCredential.query.filter_by(user_id=admin_id, credential_name=name).first()
+            if credential:
+                value = credential.credential_value
+
+        with self.lock:
+            self.values[name] = (value, time.monotonic() + self.ttl)
+        return None if value is _MISSING else value
+
+    def set(self, name, value):
+        """Create or update an admin credential and refresh the cache"""
+        admin_id = self._get_admin_id()
+        if not admin_id:
+            return False
+
+        credential = UserCredential.query.filter_by(user_id=admin_id, credential_name=name).first()
+        if credential:
+            credential.credential_value = value
+        else:
+            db.session.add(UserCredential(user_id=admin_id, credential_name=name, credential_value=value))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Another worker inserted the same credential first; update that row
+            db.session.rollback()
+            credential = UserCredential.query.filter_by(user_id=admin_id, credential_name=name).first()
+            credential.credential_value = value
+            db.session.commit()
+
+        with self.lock:
+            self.values[name] = (value, time.monotonic() + self.ttl)
+        return True
+
+    def invalidate(self, name=None):
+        """Drop one cached credential, or everything"""
+        with self.lock:
+            if name is None:
+                self.values.clear()
+                self.admin_id = None
+            else:
+                self.values.pop(name, None)
+
+    def _get_admin_id(self):
+        if self.admin_id is None:
+            admin_user = User.query.filter_by(is_admin=True).first()
+            if admin_user:
+                self.admin_id = admin_user.id
+        return self.admin_id
+
+
+admin_credentials = AdminCredentialCache()
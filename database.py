@@ -0,0 +1,97 @@
+import logging
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from models import db
+from blocking import is_green
+from config import (DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_STATEMENT_TIMEOUT_MS,
+                    SQLITE_BUSY_TIMEOUT_MS, SQLITE_GREEN_BUSY_TIMEOUT_MS, SQLITE_MMAP_SIZE)
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_url(database_url):
+    """Accept the legacy postgres:// scheme some hosts still hand out"""
+    if database_url.startswith('postgres://'):
+        return 'postgresql://' + database_url[len('postgres://'):]
+    return database_url
+
+
+def is_sqlite(database_url):
+    return make_url(database_url).get_backend_name() == 'sqlite'
+
+
+def sqlite_busy_timeout_ms():
+    """How long a SQLite call may wait on a lock inside the C driver.
+
+    That wait cannot yield to the eventlet hub, so green workers keep it
+    short and rely on trading's retries, whose backoff sleeps do yield.
+    """
+    return SQLITE_GREEN_BUSY_TIMEOUT_MS if is_green() else SQLITE_BUSY_TIMEOUT_MS
+
+
+def engine_options(database_url, tuned=True):
+    """SQLALCHEMY_ENGINE_OPTIONS for the backend behind database_url"""
+    if is_sqlite(database_url):
+        if not tuned:
+            return {}
+        # busy_timeout is also set per connection; this covers the connect itself
+        return {'connect_args': {'timeout': sqlite_busy_timeout_ms() / 1000}}
+
+    options = {
+        'pool_pre_ping': True,
+        'pool_recycle': 300,
+    }
+    if tuned:
+        options.update({
+            'pool_size': DB_POOL_SIZE,
+            'max_overflow': DB_MAX_OVERFLOW,
+            'pool_timeout': DB_POOL_TIMEOUT,
+        })
+        if make_url(database_url).get_backend_name() == 'postgresql':
+            # Runaway queries are cancelled server-side instead of pinning a pooled connection
+            options['connect_args'] = {'options': f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"}
+    return options
+
+
+def _configure_sqlite_connection(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        # WAL lets readers run alongside the single writer; NORMAL only
+        # fsyncs at checkpoints, which is durable against app crashes
+        mode = cursor.execute("PRAGMA journal_mode=WAL").fetchone()[0]
+        if mode.lower() != 'wal':
+            logger.debug(f"SQLite journal mode is {mode} (in-memory or read-only database)")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={int(sqlite_busy_timeout_ms())}")
+        cursor.execute(f"PRAGMA mmap_size={int(SQLITE_MMAP_SIZE)}")
+    finally:
+        cursor.close()
+
+
+def make_driver_green(database_url):
+    """Let psycopg2 wait on the eventlet hub instead of blocking the worker"""
+    if not is_green() or make_url(database_url).get_backend_name() != 'postgresql':
+        return False
+    try:
+        from psycogreen.eventlet import patch_psycopg
+    except ImportError:
+        logger.warning("psycogreen is not installed; Postgres queries will block the eventlet hub")
+        return False
+    patch_psycopg()
+    return True
+
+
+def init_db(app, database_url, tuned=True):
+    """Bind db to app with backend-specific pooling (Postgres) or pragmas (SQLite)"""
+    database_url = normalize_url(database_url)
+    make_driver_green(database_url)
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(database_url, tuned)
+    db.init_app(app)
+
+    if tuned and is_sqlite(database_url):
+        # Registered before the pool hands out its first connection
+        with app.app_context():
+            event.listen(db.engine, 'connect', _configure_sqlite_connection)
+    return database_url
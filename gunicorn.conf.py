@@ -1,11 +1,19 @@
 import os
+from config import EXECUTION_MODE
 
 bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
-workers = 2
+# The trade journal keeps balances in memory, so it needs a single process
+workers = 1 if EXECUTION_MODE in ('journal', 'actors') else 2
 worker_class = "eventlet"
 worker_connections = 1000
 timeout = 30
 keepalive = 2
 max_requests = 1000
 max_requests_jitter = 100
-preload_app = True
\ No newline at end of file
+preload_app = True
+
+if worker_class == "eventlet":
+    # Patch before preload_app imports the app, so module-level locks,
+    # the HTTP session and the DB pool are green in every forked worker
+    import eventlet
+    eventlet.monkey_patch()
@@ -0,0 +1,22 @@
+"""Standalone app and user helpers shared by the offline scripts (benchmarks.py, backtest.py, fetch_stock_tokens.py)"""
+from flask import Flask
+from models import db, User
+from database import init_db
+
+
+def make_app(database_url, tuned=True):
+    """Minimal app bound to an isolated database (no streamer, no routes)"""
+    app = Flask(__name__)
+    init_db(app, database_url, tuned)
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def create_user(app, username, balance):
+    with app.app_context():
+        user = User(username=username, email=f'{username}@bench.local', balance=balance)
+        user.set_password('benchmark')
+        db.session.add(user)
+        db.session.commit()
+        return user.id
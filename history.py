@@ -0,0 +1,83 @@
+import io
+import csv
+import base64
+from datetime import datetime, timedelta
+from sqlalchemy import select, tuple_
+from models import db, Transaction
+
+HISTORY_PAGE_SIZE = 50
+MAX_HISTORY_PAGE_SIZE = 200
+CSV_FETCH_SIZE = 1000
+# Timestamps are stored in server time (UTC on the deployment); shown in IST
+DISPLAY_OFFSET = timedelta(hours=5, minutes=30)
+
+
+def encode_cursor(timestamp, txn_id):
+    raw = f"{timestamp.isoformat()}|{txn_id}".encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """(timestamp, id) from an opaque cursor; raises ValueError if malformed"""
+    try:
+        timestamp, txn_id = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split('|')
+        return datetime.fromisoformat(timestamp), int(txn_id)
+    except (UnicodeError, TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+
+def _history_query(user_id):
+    return select(
+        Transaction.id, Transaction.timestamp, Transaction.symbol,
+        Transaction.type, Transaction.quantity, Transaction.price
+    ).where(Transaction.user_id == user_id).order_by(Transaction.timestamp.desc(), Transaction.id.desc())
+
+
+def history_page(user_id, cursor=None, limit=HISTORY_PAGE_SIZE):
+    """One page of a user's transactions, newest first, and the cursor for the next page.
+
+    Keyset pagination on (timestamp, id) walks ix_transaction_user_time,
+    so every page costs the same however deep the user scrolls.
+    """
+    query = _history_query(user_id)
+    if cursor:
+        query = query.where(tuple_(Transaction.timestamp, Transaction.id) < decode_cursor(cursor))
+    rows = db.session.execute(query.limit(limit + 1)).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].timestamp, rows[-1].id)
+    return [_row_to_dict(row) for row in rows], next_cursor
+
+
+def _row_to_dict(row):
+    return {
+        'id': row.id,
+        'timestamp': row.timestamp.isoformat(),
+        'display_time': (row.timestamp + DISPLAY_OFFSET).strftime('%d %b %Y, %I:%M %p'),
+        'symbol': row.symbol,
+        'type': row.type,
+        'quantity': row.quantity,
+        'price': row.price,
+        'total': round(row.price * row.quantity, 2)
+    }
+
+
+def iter_history_csv(user_id):
+    """Yield a user's full history as CSV chunks, streaming rows from a server-side cursor"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(['timestamp', 'symbol', 'type', 'quantity', 'price', 'total'])
+
+    # yield_per streams in fixed-size batches (a named cursor on Postgres)
+    result = db.session.execute(_history_query(user_id).execution_options(yield_per=CSV_FETCH_SIZE))
+    for partition in result.partitions():
+        for row in partition:
+            writer.writerow([row.timestamp.isoformat(), row.symbol, row.type, row.quantity,
+                             f"{row.price:.2f}", f"{row.price * row.quantity:.2f}"])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
@@ -0,0 +1,162 @@
+import os
+import bisect
+import logging
+import threading
+from array import array
+import numpy as np
+import symbol_master
+from instruments import instrument_registry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+# Best-ranked prefix matches considered per query when filtering by exchange
+MAX_PREFIX_SCAN = 2000
+# Fuzzy candidates must share at least this fraction of the query's trigrams
+MIN_FUZZY_SCORE = 0.3
+
+
+def normalize_query(query):
+    return ''.join(query.split()).upper()
+
+
+def trigrams(text):
+    """Trigrams of text padded with ^/$ so prefixes and suffixes weigh in"""
+    padded = f"^{text}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class InstrumentSearchIndex:
+    """Immutable prefix + fuzzy search over instrument records.
+
+    Symbols are kept in a sorted array so a prefix query is two bisects
+    and a slice; a trigram -> record-id posting map ranks typo'd or
+    infix queries by shared trigrams. Nothing touches the DB at query time.
+    """
+
+    def __init__(self, records):
+        self.records = records
+        keyed = sorted((record['symbol'], i) for i, record in enumerate(records))
+        self.sorted_symbols = [symbol for symbol, _ in keyed]
+        self.sorted_ids = array('I', (i for _, i in keyed))
+        # Prefix rank per sorted position: tradable, then shorter, then symbol
+        # order ("SBIN" before "SBINEQWARR"); unique so the cap is deterministic
+        longest = max((len(symbol) for symbol in self.sorted_symbols), default=0) + 1
+        self.prefix_rank = np.array([
+            ((not records[i]['tradable']) * longest + len(symbol)) * len(keyed) + pos
+            for pos, (symbol, i) in enumerate(keyed)
+        ], dtype=np.int64)
+        postings = {}
+        for i, record in enumerate(records):
+            for gram in trigrams(record['symbol']):
+                postings.setdefault(gram, []).append(i)
+        self.postings = {gram: np.array(ids, dtype=np.int32) for gram, ids in postings.items()}
+
+    def __len__(self):
+        return len(self.records)
+
+    def _matches(self, record, exchange, segment):
+        return (exchange is None or record['exchange'] == exchange) and (segment is None or record['segment'] == segment)
+
+    def search(self, query, limit=DEFAULT_LIMIT, exchange=None, segment=None):
+        """Top matches: exact and prefix hits first (shortest first), then fuzzy"""
+        query = normalize_query(query)
+        if not query:
+            return []
+
+        results = []
+        seen = set()
+        lo = bisect.bisect_left(self.sorted_symbols, query)
+        hi = bisect.bisect_left(self.sorted_symbols, query + '\uffff', lo)
+        ranks = self.prefix_rank[lo:hi]
+        # Cap after ranking, so a broad prefix still yields its best matches
+        window = np.arange(hi - lo) if hi - lo <= MAX_PREFIX_SCAN else np.argpartition(ranks, MAX_PREFIX_SCAN)[:MAX_PREFIX_SCAN]
+        window = window[np.argsort(ranks[window])]
+        for pos in window.tolist():
+            i = self.sorted_ids[lo + pos]
+            record = self.records[i]
+            if self._matches(record, exchange, segment):
+                results.append(dict(record, match='prefix'))
+                seen.add(i)
+                if len(results) >= limit:
+                    return results
+
+        query_grams = trigrams(query)
+        lists = [self.postings[gram] for gram in query_grams if gram in self.postings]
+        if not lists:
+            return results
+        # Shared-trigram count per record in one vectorized pass
+        counts = np.bincount(np.concatenate(lists), minlength=len(self.records))
+        if seen:
+            counts[list(seen)] = 0
+        candidates = np.flatnonzero(counts >= MIN_FUZZY_SCORE * len(query_grams))
+        if len(candidates) > MAX_PREFIX_SCAN:
+            candidates = candidates[np.argpartition(-counts[candidates], MAX_PREFIX_SCAN)[:MAX_PREFIX_SCAN]]
+        candidates = candidates[np.argsort(-counts[candidates], kind='stable')]
+        for i in candidates.tolist():
+            score = counts[i] / len(query_grams)
+            record = self.records[i]
+            if self._matches(record, exchange, segment):
+                results.append(dict(record, match='fuzzy', score=round(float(score), 2)))
+                if len(results) >= limit:
+                    break
+        return results
+
+
+class InstrumentSearch:
+    """Lazily (re)built search index over the symbol master and the active universe.
+
+    Rebuilt only when the instrument registry changes or a new symbol
+    master index lands on disk; reads the cached master, never the network.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.index = None
+        self.built_for = None
+
+    def _master_stamp(self):
+        try:
+            return os.path.getmtime(os.path.join(symbol_master.CACHE_DIR, symbol_master.INDEX_FILE))
+        except OSError:
+            return None
+
+    def get(self):
+        stamp = (instrument_registry.version, len(instrument_registry), self._master_stamp())
+        if self.index is not None and self.built_for == stamp:
+            return self.index
+        with self.lock:
+            if self.index is None or self.built_for != stamp:
+                self.index = self._build()
+                self.built_for = stamp
+        return self.index
+
+    def _build(self):
+        tradable = {token: symbol for symbol, token in instrument_registry.items()}
+        records = []
+        covered = set()
+        master = symbol_master.load_index()
+        if master is not None:
+            for i in range(len(master)):
+                record = master.record(i)
+                record['tradable'] = record['stream_symbol'] in tradable
+                covered.add(record['stream_symbol'])
+                records.append(record)
+        # Universe entries not in the master (or no master cached yet)
+        for token, symbol in tradable.items():
+            if token not in covered:
+                records.append({
+                    'symbol': symbol,
+                    'token': token.rsplit('_', 1)[0],
+                    'exchange': token.rsplit('_', 1)[-1],
+                    'segment': 'EQT',
+                    'lot_size': 1,
+                    'stream_symbol': token,
+                    'tradable': True
+                })
+        logger.info(f"Built instrument search index over {len(records)} instruments")
+        return InstrumentSearchIndex(records)
+
+
+instrument_search = InstrumentSearch()
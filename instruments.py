@@ -0,0 +1,183 @@
+import logging
+import threading
+from sqlalchemy import func
+from models import db, Instrument
+
+logger = logging.getLogger(__name__)
+
+# Other workers pick up universe changes after at most this long
+INSTRUMENT_POLL_SECONDS = 30
+
+
+def find_duplicate_tokens(mapping):
+    """{token: [symbols]} for tokens claimed by more than one symbol"""
+    owners = {}
+    for symbol, token in mapping.items():
+        owners.setdefault(token, []).append(symbol)
+    return {token: symbols for token, symbols in owners.items() if len(symbols) > 1}
+
+
+class InstrumentRegistry:
+    """In-memory symbol <-> stream token maps over the active Instrument rows.
+
+    Both directions are plain dicts rebuilt on load(), so lookups on the
+    streaming path never touch the DB. Listeners are called with
+    (added_tokens, removed_tokens) whenever the active universe changes,
+    which lets the live stream re-subscribe without a restart. Changes
+    made by other workers are picked up by refresh(), which only reloads
+    when the table's row count or last update time moved.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.by_symbol = {}
+        self.by_token = {}
+        self.listeners = []
+        self.signature = None
+        self.version = 0
+        self.started = False
+
+    def add_listener(self, listener):
+        """Register listener(added_tokens, removed_tokens)"""
+        self.listeners.append(listener)
+
+    def __len__(self):
+        return len(self.by_symbol)
+
+    def items(self):
+        return list(self.by_symbol.items())
+
+    def symbols(self):
+        return list(self.by_symbol)
+
+    def tokens(self):
+        return list(self.by_token)
+
+    def token_for(self, symbol):
+        return self.by_symbol.get(symbol)
+
+    def symbol_for(self, token):
+        return self.by_token.get(token)
+
+    def _signature(self):
+        return db.session.query(func.count(Instrument.id), func.max(Instrument.updated_at)).one()
+
+    def seed(self, defaults):
+        """Populate an empty table from a {symbol: token} dict, skipping duplicate tokens"""
+        if Instrument.query.first() is not None:
+            return []
+        skipped = []
+        for token, symbols in find_duplicate_tokens(defaults).items():
+            logger.warning(f"Duplicate instrument token {token} for {', '.join(symbols)}; keeping {symbols[0]}")
+            skipped.extend(symbols[1:])
+        for symbol, token in defaults.items():
+            if symbol not in skipped:
+                db.session.add(Instrument(symbol=symbol, token=token, exchange=token.rsplit('_', 1)[-1]))
+        db.session.commit()
+        return skipped
+
+    def load(self):
+        """Rebuild both maps from the DB and notify listeners of the difference"""
+        rows = Instrument.query.filter_by(is_active=True).order_by(Instrument.symbol).all()
+        by_symbol = {}
+        by_token = {}
+        for row in rows:
+            if row.token in by_token:
+                # Unique constraint makes this unreachable unless the table was edited by hand
+                logger.warning(f"Instrument token {row.token} already mapped to {by_token[row.token]}, ignoring {row.symbol}")
+                continue
+            by_symbol[row.symbol] = row.token
+            by_token[row.token] = row.symbol
+
+        with self.lock:
+            added = [token for token in by_token if token not in self.by_token]
+            removed = [token for token in self.by_token if token not in by_token]
+            self.by_symbol = by_symbol
+            self.by_token = by_token
+            self.signature = tuple(self._signature())
+            if added or removed:
+                self.version += 1
+
+        if added or removed:
+            logger.info(f"Instrument universe: {len(by_symbol)} active (+{len(added)} / -{len(removed)})")
+            for listener in self.listeners:
+                try:
+                    listener(added, removed)
+                except Exception as e:
+                    logger.error(f"Instrument listener error: {e}")
+
+    def refresh(self):
+        """Reload if another worker changed the table"""
+        if tuple(self._signature()) != self.signature:
+            self.load()
+
+    def start(self, app, socketio):
+        """Poll for universe changes made by other workers (idempotent)"""
+        if self.started:
+            return
+        self.started = True
+
+        def watch():
+            while True:
+                socketio.sleep(INSTRUMENT_POLL_SECONDS)
+                try:
+                    with app.app_context():
+                        self.refresh()
+                except Exception as e:
+                    logger.error(f"Instrument refresh failed: {e}")
+
+        socketio.start_background_task(watch)
+
+    def add(self, symbol, token, exchange='NSE', segment='EQT', lot_size=1):
+        """Add an instrument; raises ValueError if the symbol or token is taken"""
+        symbol = symbol.strip().upper()
+        token = token.strip()
+        existing = Instrument.query.filter((Instrument.symbol == symbol) | (Instrument.token == token)).first()
+        if existing:
+            raise ValueError(f"{existing.symbol} already uses symbol or token ({existing.token})")
+        instrument = Instrument(symbol=symbol, token=token, exchange=exchange, segment=segment, lot_size=lot_size)
+        db.session.add(instrument)
+        db.session.commit()
+        self.load()
+        return instrument
+
+    def set_active(self, instrument_id, active):
+        instrument = db.session.get(Instrument, instrument_id)
+        if instrument is None:
+            return None
+        instrument.is_active = active
+        db.session.commit()
+        self.load()
+        return instrument
+
+    def sync(self, mapping):
+        """Upsert {symbol: token} (e.g. from the symbol master); returns (changed, duplicates)"""
+        duplicates = find_duplicate_tokens(mapping)
+        skipped = {symbol for symbols in duplicates.values() for symbol in symbols[1:]}
+        existing = {row.symbol: row for row in Instrument.query.all()}
+        owners = {row.token: row.symbol for row in existing.values()}
+        changed = 0
+        for symbol, token in mapping.items():
+            if symbol in skipped:
+                continue
+            owner = owners.get(token)
+            if owner is not None and owner != symbol:
+                logger.warning(f"Token {token} for {symbol} already belongs to {owner}; skipping")
+                duplicates.setdefault(token, [owner]).append(symbol)
+                continue
+            row = existing.get(symbol)
+            if row is None:
+                db.session.add(Instrument(symbol=symbol, token=token, exchange=token.rsplit('_', 1)[-1]))
+            elif row.token != token:
+                owners.pop(row.token, None)
+                row.token = token
+            else:
+                continue
+            owners[token] = symbol
+            changed += 1
+        db.session.commit()
+        self.load()
+        return changed, duplicates
+
+
+instrument_registry = InstrumentRegistry()
@@ -0,0 +1,156 @@
+import time
+import threading
+from sortedcontainers import SortedList
+from sqlalchemy import select, func
+from models import db, User, Transaction
+from live_price_stream import live_prices
+from trading import get_holdings, get_all_holdings
+
+# Full rebuild interval: picks up admin edits and new users from other workers
+RELOAD_SECONDS = 60
+
+
+class Leaderboard:
+    """Traders ranked by total equity (cash + holdings at market).
+
+    Ranks live in a SortedList of (-equity, user_id), so top-N and a
+    user's rank are O(log n). A tick only re-ranks the users holding the
+    ticked symbol; a trade only reloads the trading user. Trades committed
+    by other workers are picked up from a transaction id watermark.
+    """
+
+    def __init__(self, reload_seconds=RELOAD_SECONDS):
+        self.lock = threading.Lock()
+        self.reload_seconds = reload_seconds
+        self.loaded = False
+        self.loaded_at = 0.0
+        self.last_txn_id = 0
+        self.ranking = SortedList()
+        self.users = {}      # user_id -> {'username', 'cash', 'invested', 'equity', 'positions'}
+        self.holders = {}    # symbol -> set of user_ids
+
+    def ensure_loaded(self):
+        """Build the index from the DB on first use and bring it up to date (needs an app context)"""
+        if self.loaded and time.monotonic() - self.loaded_at < self.reload_seconds:
+            self._catch_up()
+            return
+        # Read the watermark first: trades committed during the load are replayed next time
+        last_txn_id = db.session.execute(select(func.max(Transaction.id))).scalar() or 0
+        users = db.session.execute(
+            select(User.id, User.username, User.balance)
+            .where(User.is_admin.is_not(True), User.is_active.is_not(False))
+        ).all()
+        holdings = get_all_holdings()
+        entries = {user.id: self._build_entry(user.username, user.balance, holdings.get(user.id, {})) for user in users}
+
+        with self.lock:
+            self.ranking = SortedList()
+            self.users = {}
+            self.holders = {}
+            for user_id, entry in entries.items():
+                self._insert(user_id, entry)
+            self.last_txn_id = last_txn_id
+            self.loaded_at = time.monotonic()
+            self.loaded = True
+
+    def _catch_up(self):
+        """Reload the users with transactions past the watermark (e.g. filled by another worker)"""
+        rows = db.session.execute(
+            select(Transaction.user_id, func.max(Transaction.id))
+            .where(Transaction.id > self.last_txn_id)
+            .group_by(Transaction.user_id)
+        ).all()
+        for user_id, _ in rows:
+            self.refresh_user(user_id)
+        if rows:
+            self.last_txn_id = max(self.last_txn_id, max(txn_id for _, txn_id in rows))
+
+    def refresh_user(self, user_id):
+        """Reload one user after a trade or an admin edit"""
+        if not self.loaded:
+            return
+        user = db.session.get(User, user_id)
+        entry = None
+        if user and not user.is_admin and user.is_active is not False:
+            entry = self._build_entry(user.username, user.balance, get_holdings(user_id))
+
+        with self.lock:
+            self._remove(user_id)
+            if entry:
+                self._insert(user_id, entry)
+
+    def on_price(self, symbol, price):
+        """Price listener: re-rank only the holders of this symbol"""
+        if not self.holders.get(symbol):
+            return
+        with self.lock:
+            for user_id in self.holders.get(symbol, ()):
+                entry = self.users[user_id]
+                position = entry['positions'][symbol]
+                delta = position['quantity'] * (price - position['mark'])
+                if delta:
+                    self.ranking.remove((-entry['equity'], user_id))
+                    entry['equity'] += delta
+                    self.ranking.add((-entry['equity'], user_id))
+                position['mark'] = price
+
+    def top(self, n=10):
+        """Top n traders, best first"""
+        with self.lock:
+            return [self._row(rank, user_id) for rank, (_, user_id) in enumerate(self.ranking.islice(0, n), start=1)]
+
+    def rank_of(self, user_id):
+        """Leaderboard row for one user, or None if not ranked"""
+        with self.lock:
+            entry = self.users.get(user_id)
+            if entry is None:
+                return None
+            rank = self.ranking.bisect_left((-entry['equity'], user_id)) + 1
+            return self._row(rank, user_id)
+
+    def __len__(self):
+        return len(self.ranking)
+
+    def _build_entry(self, username, cash, holdings):
+        positions = {}
+        invested = 0
+        equity = cash or 0.0
+        for symbol, data in holdings.items():
+            mark = live_prices.get(symbol, 0.0) or data['avg_price']
+            positions[symbol] = {'quantity': data['quantity'], 'mark': mark}
+            invested += data['quantity'] * data['avg_price']
+            equity += data['quantity'] * mark
+        return {'username': username, 'cash': cash or 0.0, 'invested': invested, 'equity': equity, 'positions': positions}
+
+    def _insert(self, user_id, entry):
+        self.users[user_id] = entry
+        self.ranking.add((-entry['equity'], user_id))
+        for symbol in entry['positions']:
+            self.holders.setdefault(symbol, set()).add(user_id)
+
+    def _remove(self, user_id):
+        entry = self.users.pop(user_id, None)
+        if entry is None:
+            return
+        self.ranking.remove((-entry['equity'], user_id))
+        for symbol in entry['positions']:
+            holders = self.holders.get(symbol)
+            if holders:
+                holders.discard(user_id)
+                if not holders:
+                    del self.holders[symbol]
+
+    def _row(self, rank, user_id):
+        entry = self.users[user_id]
+        holdings = entry['equity'] - entry['cash']
+        pnl = holdings - entry['invested']
+        return {
+            'rank': rank,
+            'user_id': user_id,
+            'username': entry['username'],
+            'equity': entry['equity'],
+            'cash': entry['cash'],
+            'holdings': holdings,
+            'pnl': pnl,
+            'pnl_percent': (pnl / entry['invested'] * 100) if entry['invested'] > 0 else 0
+        }
@@ -0,0 +1,220 @@
+import logging
+from datetime import datetime
+from sqlalchemy import select, func, case
+from models import db, User, Transaction, LedgerSnapshot
+from trading import get_holdings
+from config import LEDGER_SNAPSHOT_INTERVAL, LEDGER_SNAPSHOT_MIN_TAIL
+
+logger = logging.getLogger(__name__)
+
+# Cash differences below this are float noise, not audit failures
+AUDIT_TOLERANCE = 0.01
+
+
+class LedgerState:
+    """A user's cash and per-symbol [buy_qty, sell_qty, buy_value], folded from transactions"""
+
+    def __init__(self, cash=0.0, positions=None, as_of_txn_id=0, as_of_time=None):
+        self.cash = cash
+        self.totals = {symbol: list(totals) for symbol, totals in (positions or {}).items()}
+        self.as_of_txn_id = as_of_txn_id
+        self.as_of_time = as_of_time
+        self.replayed = 0
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        return cls(snapshot.cash, snapshot.positions, snapshot.as_of_txn_id, snapshot.as_of_time)
+
+    def apply(self, rows):
+        """Fold (id, timestamp, symbol, type, quantity, price) rows in id order"""
+        for txn_id, timestamp, symbol, side, quantity, price in rows:
+            totals = self.totals.setdefault(symbol, [0, 0, 0.0])
+            value = quantity * price
+            if side == 'BUY':
+                self.cash -= value
+                totals[0] += quantity
+                totals[2] += value
+            else:
+                self.cash += value
+                totals[1] += quantity
+            self.as_of_txn_id = txn_id
+            self.as_of_time = timestamp
+            self.replayed += 1
+        return self
+
+    def holdings(self):
+        """Open positions as {symbol: {'quantity', 'avg_price'}}, same rules as trading.get_holdings"""
+        holdings = {}
+        for symbol, (buy_qty, sell_qty, buy_value) in self.totals.items():
+            net_qty = buy_qty - sell_qty
+            if net_qty > 0:
+                holdings[symbol] = {'quantity': net_qty, 'avg_price': buy_value / buy_qty if buy_qty > 0 else 0}
+        return holdings
+
+    def to_dict(self):
+        return {
+            'cash': round(self.cash, 2),
+            'holdings': self.holdings(),
+            'as_of_txn_id': self.as_of_txn_id,
+            'as_of_time': self.as_of_time.isoformat() if self.as_of_time else None,
+            'replayed': self.replayed
+        }
+
+
+def _tail_query(user_id, after_txn_id, until_txn_id=None, until_time=None):
+    """A user's transactions after after_txn_id, seeked on ix_transaction_user_id"""
+    query = select(
+        Transaction.id, Transaction.timestamp, Transaction.symbol,
+        Transaction.type, Transaction.quantity, Transaction.price
+    ).where(Transaction.user_id == user_id, Transaction.id > after_txn_id)
+    if until_txn_id is not None:
+        query = query.where(Transaction.id <= until_txn_id)
+    if until_time is not None:
+        query = query.where(Transaction.timestamp <= until_time)
+    return query.order_by(Transaction.id)
+
+
+def latest_snapshot(user_id, as_of=None):
+    """Newest snapshot for the user, or the newest one taken at or before as_of"""
+    query = select(LedgerSnapshot).where(LedgerSnapshot.user_id == user_id)
+    if as_of is not None:
+        query = query.where((LedgerSnapshot.as_of_time <= as_of) | LedgerSnapshot.as_of_time.is_(None))
+    # Several snapshots can share a transaction (admin edits); the newest row wins
+    query = query.order_by(LedgerSnapshot.as_of_txn_id.desc(), LedgerSnapshot.id.desc())
+    return db.session.execute(query.limit(1)).scalar()
+
+
+def _opening_cash(user_id):
+    """Cash before the user's first trade: the balance minus every trade's effect (one full pass)"""
+    signed_value = case(
+        (Transaction.type == 'BUY', -Transaction.quantity * Transaction.price),
+        else_=Transaction.quantity * Transaction.price
+    )
+    net = select(func.coalesce(func.sum(signed_value), 0.0)).where(Transaction.user_id == user_id).scalar_subquery()
+    row = db.session.execute(select(User.balance, net).where(User.id == user_id)).first()
+    return (row[0] or 0.0) - row[1] if row else 0.0
+
+
+def reconstruct(user_id, as_of=None):
+    """The user's ledger now, or as of a datetime, replaying only the tail after the latest snapshot"""
+    snapshot = latest_snapshot(user_id, as_of)
+    if snapshot is not None:
+        state = LedgerState.from_snapshot(snapshot)
+    else:
+        # No snapshot yet: fall back to a full replay from the opening balance
+        state = LedgerState(_opening_cash(user_id))
+    return state.apply(db.session.execute(_tail_query(user_id, state.as_of_txn_id, until_time=as_of)))
+
+
+def take_snapshot(user_id, edited_at=None):
+    """Snapshot the user's ledger at their latest committed transaction.
+
+    Cash comes from User.balance, read in the same statement as the latest
+    transaction id. Positions fold only the transactions since the previous
+    snapshot. Pass edited_at after an admin balance edit: the snapshot is
+    then always a new row stamped with the edit time, so as-of queries
+    before the edit still see the old balance.
+    """
+    row = db.session.execute(
+        select(
+            User.balance,
+            select(func.max(Transaction.id)).where(Transaction.user_id == user_id).scalar_subquery()
+        ).where(User.id == user_id)
+    ).first()
+    if row is None:
+        return None
+    balance, last_txn_id = row[0] or 0.0, row[1] or 0
+
+    previous = latest_snapshot(user_id)
+    if edited_at is None and previous is not None and previous.as_of_txn_id == last_txn_id:
+        # Nothing traded since (or another worker got here first)
+        return previous
+
+    state = LedgerState.from_snapshot(previous) if previous is not None else LedgerState()
+    state.apply(db.session.execute(_tail_query(user_id, state.as_of_txn_id, until_txn_id=last_txn_id)))
+    positions = {symbol: totals for symbol, totals in state.totals.items() if totals[0] or totals[1]}
+
+    snapshot = LedgerSnapshot(user_id=user_id, as_of_txn_id=last_txn_id, as_of_time=edited_at or state.as_of_time,
+                              cash=balance, positions=positions)
+    db.session.add(snapshot)
+    db.session.commit()
+    return snapshot
+
+
+def users_due_for_snapshot(min_tail=LEDGER_SNAPSHOT_MIN_TAIL):
+    """User ids with at least min_tail transactions since their latest snapshot"""
+    last = select(
+        LedgerSnapshot.user_id, func.max(LedgerSnapshot.as_of_txn_id).label('txn_id')
+    ).group_by(LedgerSnapshot.user_id).subquery()
+    query = (
+        select(Transaction.user_id)
+        .outerjoin(last, last.c.user_id == Transaction.user_id)
+        .where(Transaction.id > func.coalesce(last.c.txn_id, 0))
+        .group_by(Transaction.user_id)
+        .having(func.count(Transaction.id) >= min_tail)
+    )
+    return list(db.session.execute(query).scalars())
+
+
+def audit(user_id):
+    """Compare the reconstructed ledger with User.balance and the live holdings query"""
+    state = reconstruct(user_id)
+    balance = db.session.execute(select(User.balance).where(User.id == user_id)).scalar() or 0.0
+    rebuilt = state.holdings()
+    live = get_holdings(user_id)
+    mismatched = sorted(
+        symbol for symbol in set(rebuilt) | set(live)
+        if symbol not in rebuilt or symbol not in live
+        or rebuilt[symbol]['quantity'] != live[symbol]['quantity']
+        or abs(rebuilt[symbol]['avg_price'] - live[symbol]['avg_price']) > AUDIT_TOLERANCE
+    )
+    cash_difference = round(balance - state.cash, 2)
+    return {
+        'user_id': user_id,
+        'ok': abs(cash_difference) <= AUDIT_TOLERANCE and not mismatched,
+        'balance': balance,
+        'reconstructed_cash': round(state.cash, 2),
+        'cash_difference': cash_difference,
+        'mismatched_symbols': mismatched,
+        'as_of_txn_id': state.as_of_txn_id,
+        'replayed': state.replayed
+    }
+
+
+class LedgerSnapshotter:
+    """Periodically snapshots users whose transaction tail has grown"""
+
+    def __init__(self, interval=LEDGER_SNAPSHOT_INTERVAL, min_tail=LEDGER_SNAPSHOT_MIN_TAIL):
+        self.interval = interval
+        self.min_tail = min_tail
+        self.started = False
+
+    def run_once(self):
+        taken = 0
+        for user_id in users_due_for_snapshot(self.min_tail):
+            take_snapshot(user_id)
+            taken += 1
+        return taken
+
+    def start(self, app, socketio):
+        """Start the snapshot loop in this worker (idempotent)"""
+        if self.started:
+            return
+        self.started = True
+
+        def run():
+            while True:
+                socketio.sleep(self.interval)
+                with app.app_context():
+                    try:
+                        taken = self.run_once()
+                        if taken:
+                            logger.info(f"Took {taken} ledger snapshots")
+                    except Exception as e:
+                        db.session.rollback()
+                        logger.error(f"Ledger snapshot failed: {e}")
+
+        socketio.start_background_task(run)
+
+
+ledger_snapshotter = LedgerSnapshotter()
@@ -17,14 +17,56 @@ except ImportError as e:
     NxtradStream = None  # type: ignore
     print(f"TradJini SDK not available: {e}")
 
-from config import TRADEJINI_CONFIG, STOCK_TOKENS
-# Remove token_cache dependency - using database tokens now
-# from token_cache import token_cache
+from config import TRADEJINI_CONFIG
+from token_provider import token_provider
+from instruments import instrument_registry
 
 # Global price storage
 live_prices = {}
+# Wall-clock time of each symbol's last price, for staleness checks
+price_updated_at = {}
 price_update_count = 0
 
+# Callables invoked as listener(symbol, price) after every price change
+price_listeners = []
+
+def add_price_listener(listener):
+    """Register a callback for every published price"""
+    price_listeners.append(listener)
+
+def publish_price(symbol, price):
+    """Store a new price and notify listeners"""
+    global price_update_count
+    live_prices[symbol] = price
+    price_updated_at[symbol] = time.time()
+    price_update_count += 1
+    for listener in price_listeners:
+        try:
+            listener(symbol, price)
+        except Exception as e:
+            print(f"Price listener error: {e}")
+
+def restore_prices(prices):
+    """Seed the board with {symbol: (price, updated_at)} without notifying listeners.
+
+    Symbols that already have a live price are left alone.
+    """
+    global price_update_count
+    restored = 0
+    for symbol, (price, updated_at) in prices.items():
+        if symbol not in live_prices and price > 0:
+            live_prices[symbol] = price
+            price_updated_at[symbol] = updated_at
+            restored += 1
+    if restored:
+        price_update_count += 1
+    return restored
+
+def price_age(symbol):
+    """Seconds since symbol's last price, or None if it has none"""
+    updated_at = price_updated_at.get(symbol)
+    return None if updated_at is None else time.time() - updated_at
+
 class LivePriceStreamer:
     def __init__(self, socketio):
         self.socketio = socketio
@@ -32,24 +74,17 @@ class LivePriceStreamer:
         self.is_connected = False
         self.access_token = None
         
-        # Create token to symbol mapping
-        self.token_to_symbol = {}
-        for symbol, token in STOCK_TOKENS.items():
-            self.token_to_symbol[token] = symbol
+        # Token -> symbol lookups go through the instrument registry, and
+        # subscriptions follow it when admins change the universe
+        instrument_registry.add_listener(self.on_universe_change)
         
     def get_access_token(self):
-        """Get access token from database (stored by admin)"""
+        """Get access token from the shared token provider"""
         try:
-            from models import User, UserCredential
-            admin_user = User.query.filter_by(is_admin=True).first()
-            if admin_user:
-                credential = UserCredential.query.filter_by(
-                    user_id=admin_user.id,
-                    credential_name='ACCESS_TOKEN'
-                ).first()
-                if credential and not credential.credential_value.startswith('MOCK_'):
-                    self.access_token = credential.credential_value
-                    return True
+            token = token_provider.get_token()
+            if token:
+                self.access_token = token
+                return True
         except Exception as e:
             print(f"Error getting access token: {e}")
         return False
@@ -61,20 +96,16 @@ class LivePriceStreamer:
             print("TradJini WebSocket connected")
             
             # Subscribe to live data for all stocks (TradJini format)
-            stock_token_list = list(STOCK_TOKENS.values())
-            try:
-                # Subscribe to L1 data (live prices) - order matters
-                nx_stream.subscribeL1SnapShot(stock_token_list)  # Get snapshot first
-                nx_stream.subscribeL1(stock_token_list)          # Then live updates
-                print(f"Subscribed to {len(stock_token_list)} stocks for live prices")
-            except Exception as e:
-                print(f"Subscription error: {e}")
+            self.subscribe(instrument_registry.tokens())
                 
         elif event['s'] == "closed":
             self.is_connected = False
             reason = event.get("reason", "Unknown")
             print(f"WebSocket closed: {reason}")
             
+            if reason == "Unauthorized Access":
+                token_provider.invalidate(self.access_token)
+            
             if reason != "Unauthorized Access":
                 # Try to reconnect after 30 seconds
                 time.sleep(30)
@@ -88,24 +119,47 @@ class LivePriceStreamer:
         elif event['s'] == "error":
             self.is_connected = False
     
+    def subscribe(self, tokens):
+        """Subscribe to L1 snapshot and live updates for tokens"""
+        if not tokens or not self.nx_stream:
+            return
+        try:
+            # Subscribe to L1 data (live prices) - order matters
+            self.nx_stream.subscribeL1SnapShot(tokens)  # Get snapshot first
+            self.nx_stream.subscribeL1(tokens)          # Then live updates
+            print(f"Subscribed to {len(tokens)} stocks for live prices")
+        except Exception as e:
+            print(f"Subscription error: {e}")
+    
+    def on_universe_change(self, added, removed):
+        """Apply instrument universe changes to the open stream"""
+        if not self.is_connected:
+            return
+        if removed:
+            # The SDK only unsubscribes L1 as a whole, so resubscribe the remaining set
+            try:
+                self.nx_stream.unsubscribeL1()
+            except Exception as e:
+                print(f"Unsubscribe error: {e}")
+            self.subscribe(instrument_registry.tokens())
+        else:
+            self.subscribe(added)
+    
     def stream_callback(self, nx_stream, data):
         """Handle incoming live price data from TradJini"""
         try:
             if isinstance(data, dict) and data.get('msgType') == 'L1' and 'symbol' in data:
                 symbol_token = data['symbol']
-                symbol = self.token_to_symbol.get(symbol_token)
+                symbol = instrument_registry.symbol_for(symbol_token)
                 if symbol:
                     price = data.get('ltp', 0.0)
                     if price > 0:
-                        live_prices[symbol] = float(price)
+                        publish_price(symbol, float(price))
                         
                         self.socketio.emit('price_update', {
                             'symbol': symbol,
                             'price': float(price)
                         })
-                        
-                        global price_update_count
-                        price_update_count += 1
         except:
             pass
     
@@ -157,7 +211,7 @@ class LivePriceStreamer:
         return {
             'connected': self.is_connected,
             'stocks_with_prices': len(live_prices),
-            'total_stocks': len(STOCK_TOKENS),
+            'total_stocks': len(instrument_registry),
             'sdk_available': SDK_AVAILABLE
         }
     
@@ -0,0 +1,257 @@
+import os
+import time
+import logging
+import threading
+import numpy as np
+from live_price_stream import publish_price, live_prices
+from price_snapshot import save_snapshot, load_snapshot, load_snapshot_meta
+from config import SIMULATOR_SEED, SIMULATOR_TICK_SECONDS, SIMULATOR_BOARD_FILE
+
+try:
+    import fcntl
+except ImportError:  # Windows: every process drives its own simulator
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Reference prices for the default universe; unknown symbols start at DEFAULT_BASE_PRICE
+BASE_PRICES = {
+    "RELIANCE": 2500, "TCS": 3200, "HDFCBANK": 1600, "INFY": 1400,
+    "HINDUNILVR": 2400, "ICICIBANK": 900, "KOTAKBANK": 1800,
+    "BHARTIARTL": 800, "ITC": 450, "SBIN": 550, "LT": 2200,
+    "ASIANPAINT": 3000, "AXISBANK": 750, "MARUTI": 9000, "SUNPHARMA": 1100,
+    "TITAN": 2800, "ULTRACEMCO": 7500, "NESTLEIND": 18000, "WIPRO": 400,
+    "NTPC": 180, "TECHM": 1200, "HCLTECH": 1150, "POWERGRID": 220,
+    "BAJFINANCE": 6500, "M&M": 1400, "TATASTEEL": 120, "ADANIPORTS": 750,
+    "COALINDIA": 200, "BAJAJFINSV": 1600, "DRREDDY": 5200, "EICHERMOT": 3500,
+    "GRASIM": 1800, "HEROMOTOCO": 2800, "HINDALCO": 400, "INDUSINDBK": 1000,
+    "JSWSTEEL": 700, "ONGC": 150, "SHREECEM": 24000, "TATAMOTORS": 450,
+    "UPL": 550, "BRITANNIA": 4500, "CIPLA": 1000, "DIVISLAB": 3500,
+    "GODREJCP": 900, "HDFC": 2600, "HINDPETRO": 250, "IOC": 85,
+    "SBILIFE": 1300, "TATACONSUM": 800, "VEDL": 250
+}
+DEFAULT_BASE_PRICE = 1000
+
+# NSE cash session: 252 days x 6h15m, used to scale annual parameters per tick
+TRADING_SECONDS_PER_YEAR = 252 * 6.25 * 3600
+
+
+class MarketSimulator:
+    """Vectorized synthetic market: every symbol steps at once with NumPy.
+
+    Log prices follow a one-factor correlated GBM with Merton jumps: each
+    tick draws one market shock shared by all symbols (weight
+    sqrt(correlation)) plus an idiosyncratic shock per symbol, and a
+    Poisson number of normally distributed log jumps. A one-factor model
+    keeps a step O(n), so thousands of symbols cost a few vector ops.
+    The same seed always produces the same path.
+    """
+
+    def __init__(self, symbols, base_prices=None, seed=SIMULATOR_SEED, tick_seconds=SIMULATOR_TICK_SECONDS,
+                 volatility=0.25, drift=0.08, correlation=0.35,
+                 jump_intensity=4.0, jump_mean=-0.01, jump_std=0.03):
+        base_prices = base_prices or BASE_PRICES
+        self.lock = threading.Lock()
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+        self.tick_seconds = tick_seconds
+        self.dt = tick_seconds / TRADING_SECONDS_PER_YEAR
+        self.volatility = volatility
+        self.drift = drift
+        self.correlation = correlation
+        self.jump_intensity = jump_intensity
+        self.jump_mean = jump_mean
+        self.jump_std = jump_std
+        self.symbols = list(symbols)
+        self.positions = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.open_prices = np.array([base_prices.get(s, DEFAULT_BASE_PRICE) for s in self.symbols], dtype=np.float64)
+        self.log_prices = np.log(self.open_prices)
+        self.ticks = 0
+        self.started = False
+        self.leading = False
+        self.lock_fd = None
+        self.board_mtime = None
+
+    @classmethod
+    def synthetic(cls, count, seed=SIMULATOR_SEED, **kwargs):
+        """Simulator over `count` generated symbols with spread-out base prices, for load tests"""
+        rng = np.random.default_rng(seed)
+        symbols = [f"SYN{i:05d}" for i in range(count)]
+        prices = np.round(np.exp(rng.uniform(np.log(50), np.log(20000), count)), 2)
+        return cls(symbols, dict(zip(symbols, prices.tolist())), seed=seed, **kwargs)
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def step(self, ticks=1):
+        """Advance every symbol by `ticks` ticks; returns the new price vector"""
+        with self.lock:
+            return self._advance(ticks)
+
+    def path(self, ticks):
+        """Advance `ticks` ticks and return every intermediate price, shape (ticks, symbols)"""
+        with self.lock:
+            if not self.symbols:
+                return np.empty((ticks, 0))
+            log_path = self.log_prices + np.cumsum(self._increments(ticks), axis=0)
+            self.log_prices = log_path[-1].copy()
+            self.ticks += ticks
+            return np.round(np.exp(log_path), 2)
+
+    def _advance(self, ticks):
+        if not self.symbols:
+            return np.empty(0)
+        self.log_prices += self._increments(ticks).sum(axis=0)
+        self.ticks += ticks
+        return np.round(np.exp(self.log_prices), 2)
+
+    def _increments(self, ticks):
+        """Log-price increments, shape (ticks, symbols)"""
+        n = len(self.symbols)
+        sigma_sqrt_dt = self.volatility * np.sqrt(self.dt)
+        # Compensate jumps so they do not bias the drift
+        jump_comp = self.jump_intensity * (np.exp(self.jump_mean + 0.5 * self.jump_std ** 2) - 1)
+        mu = (self.drift - 0.5 * self.volatility ** 2 - jump_comp) * self.dt
+        market = self.rng.standard_normal((ticks, 1))
+        idio = self.rng.standard_normal((ticks, n))
+        shocks = np.sqrt(self.correlation) * market + np.sqrt(1 - self.correlation) * idio
+        jumps = self.rng.poisson(self.jump_intensity * self.dt, (ticks, n))
+        jump_sizes = np.where(
+            jumps > 0,
+            self.rng.normal(self.jump_mean * jumps, self.jump_std * np.sqrt(np.maximum(jumps, 1))),
+            0.0
+        )
+        return mu + sigma_sqrt_dt * shocks + jump_sizes
+
+    def prices(self):
+        """Current {symbol: price}"""
+        with self.lock:
+            return dict(zip(self.symbols, np.round(np.exp(self.log_prices), 2).tolist()))
+
+    def quote(self, symbol):
+        """(price, % change from the open) for one symbol, or None"""
+        i = self.positions.get(symbol)
+        if i is None:
+            return None
+        price = round(float(np.exp(self.log_prices[i])), 2)
+        return price, round(float(price / self.open_prices[i] - 1) * 100, 2)
+
+    def sync_symbols(self, symbols):
+        """Follow a changed universe: new symbols start at their base price, removed ones are dropped"""
+        with self.lock:
+            keep = [s for s in symbols if s in self.positions]
+            added = [s for s in symbols if s not in self.positions]
+            if not added and len(keep) == len(self.symbols):
+                return
+            idx = np.array([self.positions[s] for s in keep], dtype=np.int64)
+            open_new = np.array([live_prices.get(s) or BASE_PRICES.get(s, DEFAULT_BASE_PRICE) for s in added], dtype=np.float64)
+            self.open_prices = np.concatenate([self.open_prices[idx], open_new])
+            self.log_prices = np.concatenate([self.log_prices[idx], np.log(open_new)])
+            self.symbols = keep + added
+            self.positions = {symbol: i for i, symbol in enumerate(self.symbols)}
+
+    def tick(self, socketio=None):
+        """Advance one tick and feed it through the same path as the live stream"""
+        with self.lock:
+            symbols = self.symbols
+            prices = self._advance(1)
+        for symbol, price in zip(symbols, prices.tolist()):
+            publish_price(symbol, price)
+            if socketio is not None:
+                socketio.emit('price_update', {'symbol': symbol, 'price': price})
+        return dict(zip(symbols, prices.tolist()))
+
+    def adopt(self, board):
+        """Move known symbols to {symbol: price}; returns the ones that changed"""
+        changed = {}
+        with self.lock:
+            for symbol, price in board.items():
+                i = self.positions.get(symbol)
+                if i is None or price <= 0:
+                    continue
+                if round(float(np.exp(self.log_prices[i])), 2) != price:
+                    self.log_prices[i] = np.log(price)
+                    changed[symbol] = price
+        return changed
+
+    def _try_lead(self, board_path):
+        """Take the board lock if no other process holds it"""
+        if fcntl is not None:
+            if self.lock_fd is None:
+                self.lock_fd = os.open(f"{board_path}.lock", os.O_WRONLY | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(self.lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return False
+        # Continue the path the previous leader wrote, from its tick count: the
+        # draws depend only on SIMULATOR_SEED and that count, never replay earlier ticks
+        ticks = load_snapshot_meta(board_path).get('ticks', 0)
+        self.adopt({symbol: price for symbol, (price, _) in load_snapshot(board_path).items()})
+        if ticks:
+            self.ticks = ticks
+            self.rng = np.random.default_rng([self.seed, ticks])
+        self.leading = True
+        logger.info(f"Market simulator leading in pid {os.getpid()}")
+        return True
+
+    def _follow(self, board_path, socketio):
+        """Publish the prices the leading process wrote since the last call"""
+        try:
+            mtime = os.stat(board_path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime == self.board_mtime:
+            return
+        self.board_mtime = mtime
+        changed = self.adopt({symbol: price for symbol, (price, _) in load_snapshot(board_path).items()})
+        for symbol, price in changed.items():
+            publish_price(symbol, price)
+            if socketio is not None:
+                socketio.emit('price_update', {'symbol': symbol, 'price': price})
+
+    def start(self, socketio, board_path=SIMULATOR_BOARD_FILE):
+        """Tick forever in a background task, publishing every step (idempotent).
+
+        Only the process holding the board lock ticks; it writes each step
+        to board_path and every other worker publishes what it wrote, so all
+        workers serve one price path. A follower takes over from the last
+        written prices when the leader exits.
+        """
+        if self.started:
+            return
+        self.started = True
+        logger.info(f"Starting market simulator: {len(self.symbols)} symbols every {self.tick_seconds}s")
+
+        def run():
+            while True:
+                started = time.perf_counter()
+                try:
+                    if self.leading or self._try_lead(board_path):
+                        save_snapshot(board_path, self.tick(socketio), meta={'ticks': self.ticks})
+                    else:
+                        self._follow(board_path, socketio)
+                except Exception as e:
+                    logger.error(f"Simulator step failed: {e}")
+                socketio.sleep(max(0.0, self.tick_seconds - (time.perf_counter() - started)))
+
+        socketio.start_background_task(run)
+
+
+_simulator = None
+_simulator_lock = threading.Lock()
+
+
+def get_simulator():
+    """Process-wide simulator over the active instrument universe"""
+    global _simulator
+    from instruments import instrument_registry
+    if _simulator is None:
+        with _simulator_lock:
+            if _simulator is None:
+                # Continue from warm-started prices rather than the reference table
+                _simulator = MarketSimulator(instrument_registry.symbols() or list(BASE_PRICES),
+                                             base_prices=dict(BASE_PRICES, **live_prices))
+                instrument_registry.add_listener(
+                    lambda added, removed: _simulator.sync_symbols(instrument_registry.symbols())
+                )
+    return _simulator
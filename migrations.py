@@ -0,0 +1,83 @@
+import logging
+from sqlalchemy import select, delete, func, inspect, text
+from sqlalchemy.schema import CreateColumn
+from models import db, Transaction, UserCredential
+
+logger = logging.getLogger(__name__)
+
+
+def dedupe_user_credentials():
+    """Keep only the newest row per (user_id, credential_name); returns rows removed"""
+    duplicates = db.session.execute(
+        select(UserCredential.user_id, UserCredential.credential_name, func.max(UserCredential.id))
+        .group_by(UserCredential.user_id, UserCredential.credential_name)
+        .having(func.count(UserCredential.id) > 1)
+    ).all()
+    removed = 0
+    for user_id, name, keep_id in duplicates:
+        result = db.session.execute(
+            delete(UserCredential).where(
+                UserCredential.user_id == user_id,
+                UserCredential.credential_name == name,
+                UserCredential.id != keep_id
+            )
+        )
+        removed += result.rowcount
+    db.session.commit()
+    return removed
+
+
+def add_missing_columns(models):
+    """ALTER TABLE ADD COLUMN for nullable model columns the database lacks"""
+    inspector = inspect(db.engine)
+    added = []
+    with db.engine.begin() as conn:
+        for model in models:
+            table = model.__table__
+            present = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in present or not column.nullable:
+                    continue
+                # "transaction" is a reserved word, so let the dialect quote it
+                table_name = db.engine.dialect.identifier_preparer.format_table(table)
+                ddl = CreateColumn(column).compile(dialect=db.engine.dialect)
+                conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {ddl}"))
+                added.append(f"{table.name}.{column.name}")
+    return added
+
+
+def migrate_schema():
+    """Bring an existing SQLite/Postgres database up to the current columns and indexes.
+
+    db.create_all() only creates missing tables, so databases created
+    before a column or index was declared on a model never get it. New
+    nullable columns are added and every index declared in __table_args__
+    is created if absent (idempotent, safe to run on every start);
+    duplicate credentials are folded first so the unique index can be built.
+    """
+    added = add_missing_columns((Transaction,))
+    if added:
+        logger.info(f"Added columns: {', '.join(added)}")
+
+    existing = {}
+    inspector = inspect(db.engine)
+    for model in (Transaction, UserCredential):
+        table = model.__table__
+        existing[table.name] = {index['name'] for index in inspector.get_indexes(table.name)}
+
+    created = []
+    for model in (Transaction, UserCredential):
+        table = model.__table__
+        for index in table.indexes:
+            if index.name in existing[table.name]:
+                continue
+            if index.unique and model is UserCredential:
+                removed = dedupe_user_credentials()
+                if removed:
+                    logger.warning(f"Removed {removed} duplicate user credentials before adding {index.name}")
+            index.create(db.engine)
+            created.append(index.name)
+
+    if created:
+        logger.info(f"Created indexes: {', '.join(created)}")
+    return created
@@ -2,6 +2,7 @@ from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
+from blocking import run_blocking
 
 db = SQLAlchemy()
 
@@ -17,10 +18,11 @@ class User(UserMixin, db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        # Hashing is ~100ms of CPU; keep it off the eventlet hub
+        self.password_hash = run_blocking(generate_password_hash, password)
     
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return run_blocking(check_password_hash, self.password_hash, password)
 
 class Transaction(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -30,10 +32,53 @@ class Transaction(db.Model):
     quantity = db.Column(db.Integer, nullable=False)
     price = db.Column(db.Float, nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.now)
+    # Position in the trade journal for orders executed in journal mode
+    journal_seq = db.Column(db.BigInteger, nullable=True)
+
+    __table_args__ = (
+        # Per-user history, newest first (portfolio, keyset pagination)
+        db.Index('ix_transaction_user_time', 'user_id', 'timestamp', 'id'),
+        # Per-user id ranges: ledger tails after a snapshot
+        db.Index('ix_transaction_user_id', 'user_id', 'id'),
+        db.Index('ix_transaction_journal_seq', 'journal_seq', unique=True),
+        # Positions: covers the user+symbol+type sums without reading the table
+        db.Index('ix_transaction_position', 'user_id', 'symbol', 'type', 'quantity', 'price'),
+    )
 
 class UserCredential(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     credential_name = db.Column(db.String(100), nullable=False)
     credential_value = db.Column(db.String(500), nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
\ No newline at end of file
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('uq_user_credential_name', 'user_id', 'credential_name', unique=True),
+    )
+
+class Instrument(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    symbol = db.Column(db.String(50), unique=True, nullable=False)
+    # Streaming token, e.g. "22_NSE"
+    token = db.Column(db.String(50), unique=True, nullable=False)
+    exchange = db.Column(db.String(10), nullable=False, default='NSE')
+    segment = db.Column(db.String(10), nullable=False, default='EQT')
+    lot_size = db.Column(db.Integer, nullable=False, default=1)
+    is_active = db.Column(db.Boolean, default=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class LedgerSnapshot(db.Model):
+    """A user's cash and per-symbol totals as of one transaction"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    # Last Transaction.id folded in (0 before the user's first trade)
+    as_of_txn_id = db.Column(db.Integer, nullable=False, default=0)
+    as_of_time = db.Column(db.DateTime, nullable=True)
+    cash = db.Column(db.Float, nullable=False)
+    # {symbol: [buy_qty, sell_qty, buy_value]}, enough to derive quantity and average cost
+    positions = db.Column(db.JSON, nullable=False, default=dict)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+
+    __table_args__ = (
+        db.Index('ix_ledger_snapshot_user_txn', 'user_id', 'as_of_txn_id'),
+    )
@@ -0,0 +1,175 @@
+import queue
+import logging
+import threading
+from contextlib import contextmanager
+from concurrent.futures import Future
+from models import db
+from trade_journal import trade_journal, UserBook, JournalBacklogged, fill_orders, apply_fills, reject_fills
+from config import ORDER_ACTORS
+
+logger = logging.getLogger(__name__)
+
+# Orders an actor takes off its queue before one journal write
+MAX_DRAIN = 256
+
+
+class _Pause:
+    """Control message: park the actor while a user's balance is edited elsewhere"""
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.parked = Future()
+        self.resume = threading.Event()
+
+
+class OrderActor:
+    """One shard of users: owns their books and handles their orders one at a time.
+
+    Only the actor's own thread touches its books, so matching needs no
+    locks. Orders waiting in the queue are matched together and journaled
+    with a single write; callers get their results once the write is done.
+    """
+
+    def __init__(self, index, journal):
+        self.index = index
+        self.journal = journal
+        self.queue = queue.Queue()
+        self.books = {}
+        self.processed = 0
+
+    def submit(self, user_id, orders):
+        future = Future()
+        self.queue.put((user_id, orders, future))
+        return future
+
+    def run(self, app):
+        while True:
+            items = [self.queue.get()]
+            while len(items) < MAX_DRAIN:
+                try:
+                    items.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            with app.app_context():
+                self._process(items)
+                db.session.remove()
+
+    def _process(self, items):
+        batches, replies, undo = [], [], []
+        for item in items:
+            if isinstance(item, _Pause):
+                self._commit(batches, replies, undo)
+                batches, replies, undo = [], [], []
+                self._pause(item)
+                continue
+            user_id, orders, future = item
+            try:
+                book = self._book(user_id)
+                results, fills, balance, positions = fill_orders(book, orders)
+            except Exception as e:
+                future.set_exception(e)
+                continue
+            if fills:
+                # Applied now so later orders in this drain see them; undone if the journal write fails
+                undo.append((book, book.balance, {symbol: book.positions.get(symbol, 0) for symbol in positions}))
+                apply_fills(book, balance, positions)
+                batches.append((user_id, fills))
+            replies.append((future, results))
+        self._commit(batches, replies, undo)
+
+    def _commit(self, batches, replies, undo):
+        """Journal the drained fills in one write, then answer the callers"""
+        if batches:
+            try:
+                self.journal.append_many(batches)
+            except Exception as e:
+                logger.error(f"Order actor {self.index} could not journal {len(batches)} batches: {e}")
+                for book, balance, positions in reversed(undo):
+                    apply_fills(book, balance, positions)
+                for future, results in replies:
+                    if isinstance(e, JournalBacklogged):
+                        future.set_result(reject_fills(results))
+                    else:
+                        future.set_exception(e)
+                return
+        for future, results in replies:
+            future.set_result(results)
+        self.processed += len(replies)
+
+    def _book(self, user_id):
+        book = self.books.get(user_id)
+        if book is None:
+            book = UserBook()
+            book.load(user_id)
+            self.books[user_id] = book
+        return book
+
+    def _pause(self, pause):
+        pause.parked.set_result(True)
+        pause.resume.wait()
+        # Reload from the database on the user's next order
+        self.books.pop(pause.user_id, None)
+
+
+class OrderActors:
+    """Routes each user's orders to a fixed actor (user_id mod shard count).
+
+    Users on different actors never share a book or a lock, and fills
+    reach the database through the trade journal's group commits. Results
+    have the same shape as trading.execute_orders.
+
+    This is not the faster mode. Under the eventlet worker the actor
+    threads are green threads, so shards interleave on one core rather
+    than run in parallel, and every order pays a queue hop and a Future
+    round trip: in the journal-writes benchmark actors fill well under
+    half the orders/s of EXECUTION_MODE=journal. exclusive() also parks
+    a whole shard, not just one user, while an admin edits a balance.
+    Prefer 'journal' unless strict per-user ordering through one queue is
+    what you need.
+    """
+
+    def __init__(self, journal, count=ORDER_ACTORS):
+        self.journal = journal
+        self.actors = [OrderActor(i, journal) for i in range(max(count, 1))]
+        self.started = False
+
+    def _actor(self, user_id):
+        return self.actors[user_id % len(self.actors)]
+
+    def start(self, app):
+        """Start one thread per actor in this worker (idempotent)"""
+        if self.started:
+            return
+        self.started = True
+        for actor in self.actors:
+            threading.Thread(target=actor.run, args=(app,), daemon=True).start()
+
+    def execute_orders(self, user_id, orders):
+        return self._actor(user_id).submit(user_id, orders).result()
+
+    def execute_order(self, user_id, side, symbol, quantity, price):
+        return self.execute_orders(user_id, [{
+            'side': side,
+            'symbol': symbol,
+            'quantity': quantity,
+            'price': price
+        }])[0]
+
+    @contextmanager
+    def exclusive(self, user_id):
+        """Park the user's actor and commit pending fills while their balance is edited"""
+        pause = _Pause(user_id)
+        self._actor(user_id).queue.put(pause)
+        pause.parked.result()
+        try:
+            self.journal.flush_all()
+            yield
+        finally:
+            pause.resume.set()
+
+    def get_status(self):
+        return [{'actor': actor.index, 'users': len(actor.books), 'queued': actor.queue.qsize(),
+                 'processed': actor.processed} for actor in self.actors]
+
+
+order_actors = OrderActors(trade_journal)
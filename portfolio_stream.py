@@ -0,0 +1,154 @@
+import threading
+from live_price_stream import live_prices
+from trading import get_holdings
+
+# Seconds between conflated P&L pushes
+PNL_PUSH_INTERVAL = 1.0
+
+
+def user_room(user_id):
+    """Private Socket.IO room for a user"""
+    return f"user_{user_id}"
+
+
+class PortfolioPnLTracker:
+    """Live P&L for connected users, recomputed only for symbols that ticked.
+
+    Holdings are kept in memory per connected user with a reverse index
+    symbol -> holders, so a tick touches only the users holding that symbol.
+    Changed positions are collected and pushed once per interval to each
+    user's private room.
+    """
+
+    def __init__(self, socketio, interval=PNL_PUSH_INTERVAL):
+        self.socketio = socketio
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.sessions = {}    # user_id -> set of socket ids
+        self.positions = {}   # user_id -> {symbol: {'quantity', 'avg_price', 'current_value'}}
+        self.totals = {}      # user_id -> {'invested', 'current_value'}
+        self.holders = {}     # symbol -> set of user_ids
+        self.dirty = {}       # user_id -> set of symbols changed since last push
+        self.started = False
+
+    def start(self):
+        """Start the conflated push loop"""
+        if not self.started:
+            self.started = True
+            self.socketio.start_background_task(self._push_loop)
+
+    def connect(self, user_id, sid):
+        """Track a user's socket; loads holdings on the first connection"""
+        with self.lock:
+            first = user_id not in self.sessions
+            self.sessions.setdefault(user_id, set()).add(sid)
+        if first:
+            self.refresh_user(user_id)
+
+    def disconnect(self, user_id, sid):
+        """Forget a user's holdings once their last socket is gone"""
+        with self.lock:
+            sids = self.sessions.get(user_id)
+            if sids is None:
+                return
+            sids.discard(sid)
+            if not sids:
+                del self.sessions[user_id]
+                self._drop_positions(user_id)
+                self.totals.pop(user_id, None)
+                self.dirty.pop(user_id, None)
+
+    def refresh_user(self, user_id):
+        """Reload a connected user's holdings from the DB (call after a fill)"""
+        with self.lock:
+            if user_id not in self.sessions:
+                return
+        holdings = get_holdings(user_id)
+
+        with self.lock:
+            if user_id not in self.sessions:
+                return
+            self._drop_positions(user_id)
+            positions = {}
+            invested = 0
+            current_value = 0
+            for symbol, data in holdings.items():
+                price = live_prices.get(symbol, 0.0) or data['avg_price']
+                value = data['quantity'] * price
+                positions[symbol] = {
+                    'quantity': data['quantity'],
+                    'avg_price': data['avg_price'],
+                    'current_value': value
+                }
+                self.holders.setdefault(symbol, set()).add(user_id)
+                invested += data['quantity'] * data['avg_price']
+                current_value += value
+            self.positions[user_id] = positions
+            self.totals[user_id] = {'invested': invested, 'current_value': current_value}
+            self.dirty[user_id] = set(positions)
+
+    def on_price(self, symbol, price):
+        """Price listener: mark the holders of this symbol as changed"""
+        holders = self.holders.get(symbol)
+        if not holders:
+            return
+        with self.lock:
+            for user_id in self.holders.get(symbol, ()):
+                position = self.positions[user_id][symbol]
+                value = position['quantity'] * price
+                self.totals[user_id]['current_value'] += value - position['current_value']
+                position['current_value'] = value
+                self.dirty.setdefault(user_id, set()).add(symbol)
+
+    def _drop_positions(self, user_id):
+        for symbol in self.positions.pop(user_id, {}):
+            holders = self.holders.get(symbol)
+            if holders:
+                holders.discard(user_id)
+                if not holders:
+                    del self.holders[symbol]
+
+    def _collect_updates(self):
+        """Swap out the dirty set and build one payload per changed user"""
+        with self.lock:
+            dirty, self.dirty = self.dirty, {}
+            updates = []
+            for user_id, symbols in dirty.items():
+                positions = self.positions.get(user_id)
+                if positions is None:
+                    continue
+                changed = {}
+                for symbol in symbols:
+                    position = positions.get(symbol)
+                    if position is None:
+                        continue
+                    invested = position['quantity'] * position['avg_price']
+                    pnl = position['current_value'] - invested
+                    changed[symbol] = {
+                        'quantity': position['quantity'],
+                        'current_price': position['current_value'] / position['quantity'],
+                        'current_value': position['current_value'],
+                        'pnl': pnl,
+                        'pnl_percent': (pnl / invested * 100) if invested > 0 else 0
+                    }
+                totals = self.totals[user_id]
+                total_pnl = totals['current_value'] - totals['invested']
+                updates.append((user_id, {
+                    'positions': changed,
+                    'summary': {
+                        'total_invested': totals['invested'],
+                        'current_value': totals['current_value'],
+                        'total_pnl': total_pnl,
+                        'total_pnl_percent': (total_pnl / totals['invested'] * 100) if totals['invested'] > 0 else 0
+                    }
+                }))
+        return updates
+
+    def _push_loop(self):
+        while True:
+            self.socketio.sleep(self.interval)
+            try:
+                for user_id, payload in self._collect_updates():
+                    self.socketio.emit('portfolio_update', payload, to=user_room(user_id))
+            except Exception as e:
+                print(f"Portfolio push error: {e}")
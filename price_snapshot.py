@@ -0,0 +1,142 @@
+import os
+import json
+import time
+import atexit
+import struct
+import logging
+from array import array
+import live_price_stream
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FILE = os.getenv('PRICE_SNAPSHOT_FILE', 'price_board.snapshot')
+SNAPSHOT_INTERVAL_SECONDS = 5
+# Prices older than this are flagged stale in the UI and status endpoints
+STALE_AFTER_SECONDS = 5 * 60
+
+SNAPSHOT_MAGIC = b'PBS1'
+
+
+def save_snapshot(path=SNAPSHOT_FILE, board=None, meta=None):
+    """Write the price board (or a {symbol: price} subset) as a symbol list plus packed price/timestamp arrays.
+
+    meta is stored in the header and read back with load_snapshot_meta.
+    """
+    board = dict(live_price_stream.live_prices if board is None else board)
+    updated_at = live_price_stream.price_updated_at
+    symbols = sorted(board)
+    header = json.dumps(dict(meta or {}, saved_at=time.time(), symbols=symbols)).encode('utf-8')
+    prices = array('d', (board[symbol] for symbol in symbols))
+    stamps = array('d', (updated_at.get(symbol, 0.0) for symbol in symbols))
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(SNAPSHOT_MAGIC)
+        f.write(struct.pack('<I', len(header)))
+        f.write(header)
+        f.write(prices.tobytes())
+        f.write(stamps.tobytes())
+    os.replace(tmp_path, path)
+    return len(symbols)
+
+
+def _read_header(data):
+    if data[:4] != SNAPSHOT_MAGIC:
+        raise ValueError("bad magic")
+    (header_size,) = struct.unpack_from('<I', data, 4)
+    offset = 8 + header_size
+    return json.loads(data[8:offset]), offset
+
+
+def load_snapshot_meta(path=SNAPSHOT_FILE):
+    """The header of a snapshot file (saved_at, symbols and any meta), or {} if missing/corrupt"""
+    try:
+        with open(path, 'rb') as f:
+            return _read_header(f.read())[0]
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError, struct.error) as e:
+        logger.warning(f"Ignoring unreadable price snapshot {path}: {e}")
+        return {}
+
+
+def load_snapshot(path=SNAPSHOT_FILE):
+    """{symbol: (price, updated_at)} from a snapshot file, or {} if missing/corrupt"""
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+        header, offset = _read_header(data)
+        count = len(header['symbols'])
+        prices, stamps = array('d'), array('d')
+        prices.frombytes(data[offset:offset + 8 * count])
+        stamps.frombytes(data[offset + 8 * count:offset + 16 * count])
+        if len(prices) != count or len(stamps) != count:
+            raise ValueError("truncated")
+        return {symbol: (prices[i], stamps[i]) for i, symbol in enumerate(header['symbols'])}
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError, KeyError, struct.error) as e:
+        logger.warning(f"Ignoring unreadable price snapshot {path}: {e}")
+        return {}
+
+
+def warm_start(path=SNAPSHOT_FILE):
+    """Load the last snapshot into the price board; returns the number of symbols restored"""
+    restored = live_price_stream.restore_prices(load_snapshot(path))
+    if restored:
+        logger.info(f"Warm-started price board with {restored} prices from {path}")
+    return restored
+
+
+def is_stale(symbol, max_age=STALE_AFTER_SECONDS):
+    """True if the symbol has no price or its last price is older than max_age"""
+    age = live_price_stream.price_age(symbol)
+    return age is None or age > max_age
+
+
+def stale_symbols(max_age=STALE_AFTER_SECONDS):
+    return [symbol for symbol in list(live_price_stream.live_prices) if is_stale(symbol, max_age)]
+
+
+class PriceSnapshotter:
+    """Periodically persists the price board, skipping intervals with no new ticks"""
+
+    def __init__(self, path=SNAPSHOT_FILE, interval=SNAPSHOT_INTERVAL_SECONDS):
+        self.path = path
+        self.interval = interval
+        self.saved_version = None
+        self.started = False
+
+    def save_if_changed(self):
+        version = live_price_stream.price_update_count
+        if version == self.saved_version or not live_price_stream.live_prices:
+            return False
+        save_snapshot(self.path)
+        self.saved_version = version
+        return True
+
+    def start(self, socketio):
+        """Start the snapshot loop in this worker (idempotent); also saves at exit"""
+        if self.started:
+            return
+        self.started = True
+
+        def run():
+            while True:
+                socketio.sleep(self.interval)
+                try:
+                    self.save_if_changed()
+                except OSError as e:
+                    logger.error(f"Price snapshot failed: {e}")
+
+        socketio.start_background_task(run)
+        atexit.register(self._save_at_exit)
+
+    def _save_at_exit(self):
+        try:
+            self.save_if_changed()
+        except OSError:
+            pass
+
+
+price_snapshotter = PriceSnapshotter()
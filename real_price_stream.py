@@ -1,138 +1,54 @@
 import time
 import threading
-import json
-from token_manager import TokenManager
+from token_provider import token_provider
+from market_simulator import get_simulator
 
-# Global price storage
-live_prices = {}
+# Shared with the live stream: simulated ticks go through publish_price
+from live_price_stream import live_prices
 
 class RealPriceStreamer:
     def __init__(self, socketio):
         self.socketio = socketio
-        self.token_manager = TokenManager()
         
     def start_real_stream(self, apikey, password, two_fa, two_fa_type):
-        """Start real TradJini price stream"""
-        try:
-            import requests
+        """Start real TradJini price stream (credentials come from the shared token provider)"""
+        def get_live_prices():
+            access_token = None
             
-            def get_live_prices():
-                access_token = None
-                
-                while True:
-                    try:
-                        # Check for cached token first
-                        if not access_token:
-                            access_token = self.token_manager.get_valid_token()
-                            
-                        # Get new token if no valid cached token
+            while True:
+                try:
+                    # Shared provider: cached, single-flight authentication
+                    if not access_token:
+                        print("Getting access token...")
+                        access_token = token_provider.get_token()
                         if not access_token:
-                            print("Getting new access token...")
-                            url = "https://api.tradejini.com/v2/api-gw/oauth/individual-token-v2"
-                            headers = {"Authorization": f"Bearer {apikey}"}
-                            data = {
-                                'password': password,
-                                'twoFa': two_fa,
-                                'twoFaTyp': two_fa_type
-                            }
-                            
-                            response = requests.post(url, data=data, headers=headers)
-                            if response.status_code == 200:
-                                resp_data = response.json()
-                                if 'access_token' in resp_data:
-                                    access_token = resp_data['access_token']
-                                    # Cache the token
-                                    self.token_manager.save_token(access_token)
-                                    print("New access token cached for 24 hours")
-                                else:
-                                    print(f"API Error: {resp_data}")
-                                    raise Exception("No access token in response")
-                            else:
-                                print(f"API Error: Status {response.status_code}, Response: {response.text}")
-                                raise Exception("API authentication failed")
-                        else:
-                            print("Using cached access token")
-                            
-                            # Get market data (simplified approach)
-                            # You would use WebSocket here for real streaming
-                            # For now, we'll use REST API calls
-                            
-                            stock_symbols = [
-                                "RELIANCE", "TCS", "HDFCBANK", "INFY", "HINDUNILVR",
-                                "ICICIBANK", "KOTAKBANK", "BHARTIARTL", "ITC", "SBIN"
-                            ]
-                            
-                            for symbol in stock_symbols:
-                                # Mock price with small fluctuation for demo
-                                import random
-                                base_prices = {
-                                    "RELIANCE": 2500, "TCS": 3200, "HDFCBANK": 1600, 
-                                    "INFY": 1400, "HINDUNILVR": 2400, "ICICIBANK": 900,
-                                    "KOTAKBANK": 1800, "BHARTIARTL": 800, "ITC": 450, "SBIN": 550
-                                }
-                                
-                                base_price = base_prices.get(symbol, 1000)
-                                fluctuation = random.uniform(-0.005, 0.005)
-                                new_price = round(base_price * (1 + fluctuation), 2)
-                                
-                                live_prices[symbol] = new_price
-                                
-                                self.socketio.emit('price_update', {
-                                    'symbol': symbol,
-                                    'price': new_price
-                                })
-                        
-                        time.sleep(3)  # Update every 3 seconds
+                            raise Exception("API authentication failed")
+                    else:
+                        print("Using cached access token")
                         
-                    except Exception as e:
-                        print(f"Error in real stream: {e}")
-                        # Clear invalid token
-                        self.token_manager.clear_token()
-                        access_token = None
-                        print("Falling back to mock prices...")
-                        self.start_mock_stream()
-                        return
-            
-            thread = threading.Thread(target=get_live_prices, daemon=True)
-            thread.start()
-            
-        except ImportError:
-            print("Requests not available, using mock stream")
-            self.start_mock_stream()
+                        # No REST polling yet: tick the shared synthetic market
+                        get_simulator().tick(self.socketio)
+                    
+                    time.sleep(3)  # Update every 3 seconds
+                    
+                except Exception as e:
+                    print(f"Error in real stream: {e}")
+                    access_token = None
+                    print("Falling back to mock prices...")
+                    self.start_mock_stream()
+                    return
+        
+        thread = threading.Thread(target=get_live_prices, daemon=True)
+        thread.start()
     
     def start_mock_stream(self):
-        """Fallback mock stream"""
-        import random
-        
-        base_prices = {
-            "RELIANCE": 2500, "TCS": 3200, "HDFCBANK": 1600, "INFY": 1400, 
-            "HINDUNILVR": 2400, "ICICIBANK": 900, "KOTAKBANK": 1800, 
-            "BHARTIARTL": 800, "ITC": 450, "SBIN": 550, "LT": 2200,
-            "ASIANPAINT": 3000, "AXISBANK": 750, "MARUTI": 9000, "SUNPHARMA": 1100,
-            "TITAN": 2800, "ULTRACEMCO": 7500, "NESTLEIND": 18000, "WIPRO": 400, 
-            "NTPC": 180, "TECHM": 1200, "HCLTECH": 1150, "POWERGRID": 220,
-            "BAJFINANCE": 6500, "M&M": 1400, "TATASTEEL": 120, "ADANIPORTS": 750,
-            "COALINDIA": 200, "BAJAJFINSV": 1600, "DRREDDY": 5200, "EICHERMOT": 3500,
-            "GRASIM": 1800, "HEROMOTOCO": 2800, "HINDALCO": 400, "INDUSINDBK": 1000,
-            "JSWSTEEL": 700, "ONGC": 150, "SHREECEM": 24000, "TATAMOTORS": 450,
-            "UPL": 550, "BRITANNIA": 4500, "CIPLA": 1000, "DIVISLAB": 3500,
-            "GODREJCP": 900, "HDFC": 2600, "HINDPETRO": 250, "IOC": 85,
-            "SBILIFE": 1300, "TATACONSUM": 800, "VEDL": 250
-        }
+        """Fallback mock stream driven by the synthetic market"""
+        simulator = get_simulator()
         
         def mock_generator():
             while True:
-                for symbol, base_price in base_prices.items():
-                    fluctuation = random.uniform(-0.008, 0.008)
-                    new_price = round(base_price * (1 + fluctuation), 2)
-                    live_prices[symbol] = new_price
-                    
-                    self.socketio.emit('price_update', {
-                        'symbol': symbol,
-                        'price': new_price
-                    })
-                
-                time.sleep(1)  # Update every second
+                simulator.tick(self.socketio)
+                time.sleep(simulator.tick_seconds)
         
         thread = threading.Thread(target=mock_generator, daemon=True)
         thread.start()
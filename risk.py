@@ -0,0 +1,154 @@
+import time
+import threading
+import numpy as np
+from sqlalchemy import select, func, case
+from models import db, User, Transaction
+from live_price_stream import live_prices
+
+# Reload at least this often, for user changes the watermark cannot see (e.g. is_admin flips)
+RELOAD_SECONDS = 60
+
+
+class RiskBook:
+    """Whole-book positions held as dense users x symbols arrays.
+
+    Positions are reloaded with one grouped query only when the trade log
+    or the users table has moved (possibly in another worker), or every
+    RELOAD_SECONDS; valuation against the live price board is a single
+    vectorized pass over the arrays.
+    """
+
+    def __init__(self, reload_seconds=RELOAD_SECONDS):
+        self.lock = threading.Lock()
+        self.reload_seconds = reload_seconds
+        self.watermark = None
+        self.loaded_at = 0.0
+        self.user_ids = np.zeros(0, dtype=np.int64)
+        self.usernames = []
+        self.cash = np.zeros(0)
+        self.symbols = []
+        self.quantity = np.zeros((0, 0))
+        self.cost = np.zeros((0, 0))
+
+    def invalidate(self):
+        """Force a reload on the next refresh (e.g. after a balance edit)"""
+        with self.lock:
+            self.watermark = None
+
+    def _watermark(self):
+        """Last trade plus user count, newest user and total cash: moves on any trade, signup or balance edit"""
+        last_txn_id = select(func.max(Transaction.id)).scalar_subquery()
+        return tuple(db.session.execute(
+            select(last_txn_id, func.count(User.id), func.max(User.id), func.sum(User.balance))
+        ).one())
+
+    def refresh(self):
+        """Reload positions if anything changed since the last load"""
+        watermark = self._watermark()
+        with self.lock:
+            if watermark == self.watermark and time.monotonic() - self.loaded_at < self.reload_seconds:
+                return
+            self._load()
+            self.watermark = watermark
+            self.loaded_at = time.monotonic()
+
+    def _load(self):
+        users = db.session.execute(
+            select(User.id, User.username, User.balance)
+            .where(User.is_admin.is_not(True))
+            .order_by(User.id)
+        ).all()
+        is_buy = Transaction.type == 'BUY'
+        rows = db.session.execute(
+            select(
+                Transaction.user_id,
+                Transaction.symbol,
+                func.sum(case((is_buy, Transaction.quantity), else_=-Transaction.quantity)),
+                func.sum(case((is_buy, Transaction.quantity), else_=0)),
+                func.sum(case((is_buy, Transaction.quantity * Transaction.price), else_=0))
+            ).group_by(Transaction.user_id, Transaction.symbol)
+        ).all()
+
+        user_index = {user.id: i for i, user in enumerate(users)}
+        symbols = sorted({row[1] for row in rows})
+        symbol_index = {symbol: j for j, symbol in enumerate(symbols)}
+
+        quantity = np.zeros((len(users), len(symbols)))
+        buy_qty = np.zeros_like(quantity)
+        buy_value = np.zeros_like(quantity)
+        for user_id, symbol, net_qty, bought, bought_value in rows:
+            i = user_index.get(user_id)
+            if i is None:
+                continue
+            j = symbol_index[symbol]
+            quantity[i, j] = net_qty
+            buy_qty[i, j] = bought
+            buy_value[i, j] = bought_value
+
+        # Same cost basis as /portfolio: net quantity at the average buy price
+        quantity = np.maximum(quantity, 0)
+        avg_price = np.divide(buy_value, buy_qty, out=np.zeros_like(buy_value), where=buy_qty > 0)
+
+        self.user_ids = np.array([user.id for user in users], dtype=np.int64)
+        self.usernames = [user.username for user in users]
+        self.cash = np.array([user.balance or 0.0 for user in users])
+        self.symbols = symbols
+        self.quantity = quantity
+        self.cost = quantity * avg_price
+
+    def price_vector(self):
+        """Live prices aligned with self.symbols, falling back to book average cost"""
+        held = self.quantity.sum(axis=0)
+        avg_cost = np.divide(self.cost.sum(axis=0), held, out=np.zeros_like(held), where=held > 0)
+        live = np.array([live_prices.get(symbol, 0.0) for symbol in self.symbols])
+        return np.where(live > 0, live, avg_cost)
+
+    def summary(self, top_n=10):
+        """Value the whole book and return exposure, P&L and concentration"""
+        self.refresh()
+        with self.lock:
+            prices = self.price_vector()
+            value = self.quantity * prices
+            holdings = value.sum(axis=1)
+            invested = self.cost.sum(axis=1)
+            pnl = holdings - invested
+            equity = self.cash + holdings
+
+            exposure = value.sum(axis=0)
+            total_holdings = exposure.sum()
+            weights = exposure / total_holdings if total_holdings > 0 else np.zeros_like(exposure)
+            largest = value.max(axis=1) if value.size else np.zeros(len(holdings))
+            user_concentration = np.divide(largest, holdings, out=np.zeros_like(holdings), where=holdings > 0)
+
+            order = np.argsort(exposure)[::-1]
+            top = np.argsort(pnl)[::-1][:top_n]
+
+            return {
+                'users': len(self.user_ids),
+                'symbols': len(self.symbols),
+                'total_cash': float(self.cash.sum()),
+                'total_holdings': float(total_holdings),
+                'total_invested': float(invested.sum()),
+                'total_pnl': float(pnl.sum()),
+                'cash_ratio': float(self.cash.sum() / equity.sum()) if equity.sum() > 0 else 0.0,
+                # Herfindahl index of symbol exposure: 1/N when even, 1 when all in one name
+                'book_hhi': float((weights ** 2).sum()),
+                'exposure': [{
+                    'symbol': self.symbols[j],
+                    'quantity': int(self.quantity[:, j].sum()),
+                    'price': float(prices[j]),
+                    'value': float(exposure[j]),
+                    'weight': float(weights[j] * 100),
+                    'holders': int((self.quantity[:, j] > 0).sum())
+                } for j in order],
+                'top_users': [{
+                    'user_id': int(self.user_ids[i]),
+                    'username': self.usernames[i],
+                    'cash': float(self.cash[i]),
+                    'holdings': float(holdings[i]),
+                    'equity': float(equity[i]),
+                    'pnl': float(pnl[i]),
+                    'pnl_percent': float(pnl[i] / invested[i] * 100) if invested[i] > 0 else 0.0,
+                    'concentration': float(user_concentration[i] * 100)
+                } for i in top]
+            }
@@ -0,0 +1,323 @@
+"""Streaming, disk-cached loader for the TradJini securities master.
+
+The master is downloaded once per day (conditionally, with ETag /
+Last-Modified and a SHA-256 of the body) and parsed incrementally into a
+compact binary index of symbol -> token, exchange, segment and lot size.
+Later loads read only the index file.
+"""
+import os
+import csv
+import json
+import time
+import struct
+import bisect
+import hashlib
+import logging
+from array import array
+from datetime import date
+import tradejini_http
+from config import TRADEJINI_CONFIG
+
+logger = logging.getLogger(__name__)
+
+SYMBOL_MASTER_URL = "https://api.tradejini.com/api/mkt-data/scrips/symbol-store/Securities"
+CACHE_DIR = os.getenv('SYMBOL_MASTER_CACHE_DIR', 'symbol_master_cache')
+MASTER_FILE = 'securities.raw'
+META_FILE = 'securities.meta.json'
+INDEX_FILE = 'securities.idx'
+
+INDEX_MAGIC = b'SMIX'
+INDEX_VERSION = 1
+CHUNK_SIZE = 64 * 1024
+
+
+class InstrumentIndex:
+    """Instruments sorted by (symbol, exchange) in column arrays.
+
+    Symbols and tokens are newline-joined string blobs; exchange and
+    segment are one-byte codes into small lookup tables; lot sizes are a
+    uint32 array. Lookups bisect the sorted symbol column.
+    """
+
+    def __init__(self, symbols, tokens, exchange_codes, segment_codes, lots, exchanges, segments, checksum=''):
+        self.symbols = symbols
+        self.tokens = tokens
+        self.exchange_codes = exchange_codes
+        self.segment_codes = segment_codes
+        self.lots = lots
+        self.exchanges = exchanges
+        self.segments = segments
+        self.checksum = checksum
+
+    @classmethod
+    def build(cls, records, checksum=''):
+        """Build from an iterable of (symbol, token, exchange, segment, lot) tuples"""
+        rows = sorted(set(records))
+        exchanges = sorted({row[2] for row in rows})
+        segments = sorted({row[3] for row in rows})
+        exchange_lookup = {name: i for i, name in enumerate(exchanges)}
+        segment_lookup = {name: i for i, name in enumerate(segments)}
+        return cls(
+            symbols=[row[0] for row in rows],
+            tokens=[row[1] for row in rows],
+            exchange_codes=array('B', (exchange_lookup[row[2]] for row in rows)),
+            segment_codes=array('B', (segment_lookup[row[3]] for row in rows)),
+            lots=array('I', (row[4] for row in rows)),
+            exchanges=exchanges,
+            segments=segments,
+            checksum=checksum
+        )
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def record(self, i):
+        return {
+            'symbol': self.symbols[i],
+            'token': self.tokens[i],
+            'exchange': self.exchanges[self.exchange_codes[i]],
+            'segment': self.segments[self.segment_codes[i]],
+            'lot_size': self.lots[i],
+            'stream_symbol': f"{self.tokens[i]}_{self.exchanges[self.exchange_codes[i]]}"
+        }
+
+    def lookup(self, symbol, exchange=None, segment=None):
+        """First instrument matching symbol (and exchange/segment if given), or None"""
+        i = bisect.bisect_left(self.symbols, symbol)
+        while i < len(self.symbols) and self.symbols[i] == symbol:
+            record = self.record(i)
+            if (exchange is None or record['exchange'] == exchange) and (segment is None or record['segment'] == segment):
+                return record
+            i += 1
+        return None
+
+    def save(self, path):
+        header = json.dumps({
+            'version': INDEX_VERSION,
+            'count': len(self.symbols),
+            'exchanges': self.exchanges,
+            'segments': self.segments,
+            'checksum': self.checksum
+        }).encode('utf-8')
+        blobs = [
+            header,
+            self.exchange_codes.tobytes(),
+            self.segment_codes.tobytes(),
+            self.lots.tobytes(),
+            '\n'.join(self.symbols).encode('utf-8'),
+            '\n'.join(self.tokens).encode('utf-8'),
+        ]
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(INDEX_MAGIC)
+            f.write(struct.pack('<6I', *(len(blob) for blob in blobs)))
+            for blob in blobs:
+                f.write(blob)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        if data[:4] != INDEX_MAGIC:
+            raise ValueError(f"{path} is not a symbol master index")
+        sizes = struct.unpack_from('<6I', data, 4)
+        offset = 4 + struct.calcsize('<6I')
+        parts = []
+        for size in sizes:
+            parts.append(data[offset:offset + size])
+            offset += size
+
+        header = json.loads(parts[0])
+        if header['version'] != INDEX_VERSION:
+            raise ValueError(f"Unsupported index version {header['version']}")
+        exchange_codes, segment_codes, lots = array('B'), array('B'), array('I')
+        exchange_codes.frombytes(parts[1])
+        segment_codes.frombytes(parts[2])
+        lots.frombytes(parts[3])
+        count = header['count']
+        return cls(
+            symbols=parts[4].decode('utf-8').split('\n') if count else [],
+            tokens=parts[5].decode('utf-8').split('\n') if count else [],
+            exchange_codes=exchange_codes,
+            segment_codes=segment_codes,
+            lots=lots,
+            exchanges=header['exchanges'],
+            segments=header['segments'],
+            checksum=header['checksum']
+        )
+
+
+def iter_json_array(stream):
+    """Yield the elements of a top-level JSON array without loading it whole"""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    started = False
+    while True:
+        chunk = stream.read(CHUNK_SIZE)
+        buffer += chunk
+        pos = 0
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if not started:
+                if pos >= len(buffer):
+                    break
+                if buffer[pos] != '[':
+                    raise ValueError("Expected a JSON array")
+                started = True
+                pos += 1
+                continue
+            if pos < len(buffer) and buffer[pos] == ']':
+                return
+            try:
+                item, pos = decoder.raw_decode(buffer, pos)
+            except ValueError:
+                # Element is split across chunks; read more
+                break
+            yield item
+        buffer = buffer[pos:]
+        if not chunk:
+            if buffer.strip():
+                raise ValueError("Truncated JSON array")
+            return
+
+
+def _field(row, *names):
+    for name in names:
+        value = row.get(name)
+        if value not in (None, ''):
+            return str(value).strip()
+    return ''
+
+
+def normalize_record(row):
+    """Map a master row (JSON object or CSV dict) to an index tuple, or None"""
+    row = {str(key).strip().lower(): value for key, value in row.items() if key is not None}
+    # IDs look like INSTRUMENT_SYMBOL_SERIES_EXCHANGE, e.g. EQT_ACC_EQ_NSE
+    id_parts = _field(row, 'id').split('_')
+    token = _field(row, 'exctoken', 'token', 'exchange_token')
+    symbol = _field(row, 'symbol', 'sym', 'tradingsymbol') or (id_parts[1] if len(id_parts) >= 4 else '')
+    exchange = _field(row, 'exchange', 'exch', 'exchseg') or (id_parts[-1] if len(id_parts) >= 4 else '')
+    segment = _field(row, 'segment', 'instrument', 'insttype') or (id_parts[0] if len(id_parts) >= 4 else 'EQT')
+    if not token or not symbol or not exchange:
+        return None
+    try:
+        lot = int(float(_field(row, 'lotsize', 'lot_size', 'ls') or 1))
+    except ValueError:
+        lot = 1
+    return (symbol.upper(), token, exchange.upper(), segment.upper(), max(lot, 1))
+
+
+def iter_master_records(path):
+    """Stream-parse a downloaded master file (JSON array or CSV)"""
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        head = f.read(1)
+        while head and head.isspace():
+            head = f.read(1)
+        f.seek(0)
+        if head == '[':
+            rows = iter_json_array(f)
+        elif head == '{':
+            # Wrapped payload ({"data": [...]}): not streamable, parse whole
+            payload = json.load(f)
+            rows = next((value for value in payload.values() if isinstance(value, list)), [])
+        else:
+            rows = csv.DictReader(f)
+        for row in rows:
+            if isinstance(row, dict):
+                record = normalize_record(row)
+                if record:
+                    yield record
+
+
+def _read_meta():
+    try:
+        with open(os.path.join(CACHE_DIR, META_FILE), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_meta(meta):
+    with open(os.path.join(CACHE_DIR, META_FILE), 'w') as f:
+        json.dump(meta, f)
+
+
+def download_master(access_token, meta):
+    """Stream the master to disk; returns (changed, meta).
+
+    Sends the previous ETag / Last-Modified so an unchanged master costs
+    a 304, and compares the body checksum for servers that ignore them.
+    """
+    headers = {
+        "Authorization": f"{TRADEJINI_CONFIG['apikey']}:{access_token}",
+        "Accept": "application/json"
+    }
+    if meta.get('etag'):
+        headers['If-None-Match'] = meta['etag']
+    if meta.get('last_modified'):
+        headers['If-Modified-Since'] = meta['last_modified']
+
+    response = tradejini_http.get(SYMBOL_MASTER_URL, endpoint='symbol_master', headers=headers, stream=True)
+    try:
+        if response.status_code == 304:
+            return False, meta
+        if response.status_code != 200:
+            raise IOError(f"Symbol master download failed: HTTP {response.status_code}")
+
+        digest = hashlib.sha256()
+        tmp_path = os.path.join(CACHE_DIR, f"{MASTER_FILE}.{os.getpid()}.tmp")
+        with open(tmp_path, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                digest.update(chunk)
+                f.write(chunk)
+    finally:
+        response.close()
+
+    checksum = digest.hexdigest()
+    new_meta = dict(meta, etag=response.headers.get('ETag'), last_modified=response.headers.get('Last-Modified'))
+    if checksum == meta.get('checksum'):
+        os.remove(tmp_path)
+        return False, new_meta
+    os.replace(tmp_path, os.path.join(CACHE_DIR, MASTER_FILE))
+    new_meta['checksum'] = checksum
+    return True, new_meta
+
+
+def load_index(access_token=None, refresh=False):
+    """Instrument index, refreshed from TradJini at most once per day.
+
+    Without an access token (or if the download fails) the cached index
+    is returned as-is; None if nothing has ever been cached.
+    """
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    index_path = os.path.join(CACHE_DIR, INDEX_FILE)
+    meta = _read_meta()
+    today = date.today().isoformat()
+
+    index = None
+    if os.path.exists(index_path):
+        try:
+            index = InstrumentIndex.load(index_path)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Discarding unreadable symbol index: {e}")
+
+    if index is not None and not refresh and meta.get('date') == today:
+        return index
+    if not access_token:
+        return index
+
+    try:
+        started = time.perf_counter()
+        changed, meta = download_master(access_token, meta)
+        if changed or index is None:
+            master_path = os.path.join(CACHE_DIR, MASTER_FILE)
+            index = InstrumentIndex.build(iter_master_records(master_path), checksum=meta.get('checksum', ''))
+            index.save(index_path)
+            logger.info(f"Rebuilt symbol index: {len(index)} instruments in {time.perf_counter() - started:.1f}s")
+        meta['date'] = today
+        _write_meta(meta)
+    except Exception as e:
+        logger.error(f"Symbol master refresh failed, using cached index: {e}")
+    return index
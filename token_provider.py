@@ -0,0 +1,178 @@
+import os
+import json
+import time
+import logging
+import threading
+from blocking import run_blocking
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process coordination only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+TOKEN_FILE = 'tradejini_token_cache.json'
+TOKEN_VALIDITY_HOURS = 8
+# Refresh in the background once a token is this close to expiry
+REFRESH_MARGIN_SECONDS = 15 * 60
+
+
+class TokenProvider:
+    """Single source of TradJini access tokens for the whole deployment.
+
+    Tokens are served from memory, then from a shared JSON file, and only
+    then fetched from the auth endpoint. Refreshes are single-flight: in a
+    process, concurrent callers wait on one lock and reuse its result;
+    across Gunicorn workers, an exclusive file lock makes the first worker
+    authenticate while the others pick the new token up from the file.
+    A token close to expiry is refreshed in the background.
+    """
+
+    def __init__(self, fetch_token, token_file=TOKEN_FILE,
+                 validity=TOKEN_VALIDITY_HOURS * 3600, refresh_margin=REFRESH_MARGIN_SECONDS):
+        self.fetch_token = fetch_token
+        self.token_file = token_file
+        self.lock_file = token_file + '.lock'
+        self.validity = validity
+        self.refresh_margin = refresh_margin
+        self.refresh_lock = threading.Lock()
+        self.refreshing = False
+        self.refreshing_lock = threading.Lock()
+        self.token = None
+        self.expires_at = 0.0
+
+    def get_token(self, force=False):
+        """Current access token, refreshing it if needed; None if auth fails"""
+        now = time.time()
+        if not force and self.token and now < self.expires_at:
+            if now >= self.expires_at - self.refresh_margin:
+                self._refresh_in_background()
+            return self.token
+
+        stale_token = self.token
+        with self.refresh_lock:
+            # Another thread may have refreshed while we waited
+            if not force and self.token and self.token != stale_token and time.time() < self.expires_at:
+                return self.token
+            return self._refresh(force=force)
+
+    def set_token(self, token, validity=None):
+        """Publish a token obtained elsewhere to every worker"""
+        with self.refresh_lock, self._file_lock():
+            self._store(token, time.time() + (validity or self.validity))
+
+    def invalidate(self, token=None):
+        """Drop a token the server rejected (or the current one)"""
+        with self.refresh_lock, self._file_lock():
+            if token is None or token == self.token:
+                self.token = None
+                self.expires_at = 0.0
+            cached = self._read_file()
+            if cached and (token is None or cached['access_token'] == token):
+                try:
+                    os.remove(self.token_file)
+                except OSError:
+                    pass
+
+    def _refresh(self, force=False):
+        """Refresh under the cross-process lock; caller holds refresh_lock.
+
+        force always authenticates; otherwise a token another worker
+        refreshed recently is reused from the file.
+        """
+        with self._file_lock():
+            cached = self._read_file()
+            if not force and cached and time.time() < cached['expires_at'] - self.refresh_margin:
+                self.token = cached['access_token']
+                self.expires_at = cached['expires_at']
+                return self.token
+
+            logger.info("Fetching new TradJini access token")
+            token = self.fetch_token()
+            if token:
+                self._store(token, time.time() + self.validity)
+                return token
+
+            # Keep serving a still-valid token if the early refresh failed
+            if self.token and time.time() < self.expires_at:
+                return self.token
+            return None
+
+    def _refresh_in_background(self):
+        """Start one early refresh per process; calls while it runs are no-ops"""
+        with self.refreshing_lock:
+            if self.refreshing:
+                return
+            self.refreshing = True
+
+        def run():
+            try:
+                with self.refresh_lock:
+                    # Not forced: if another worker already refreshed, reuse its token
+                    self._refresh()
+            except Exception as e:
+                logger.error(f"Background token refresh failed: {e}")
+            finally:
+                self.refreshing = False
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def _store(self, token, expires_at):
+        self.token = token
+        self.expires_at = expires_at
+        tmp_file = f"{self.token_file}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_file, 'w') as f:
+                json.dump({'access_token': token, 'timestamp': time.time(), 'expires_at': expires_at}, f)
+            os.replace(tmp_file, self.token_file)
+        except OSError as e:
+            logger.error(f"Error saving token: {e}")
+
+    def _read_file(self):
+        try:
+            with open(self.token_file, 'r') as f:
+                data = json.load(f)
+            if 'expires_at' not in data:
+                # Older cache files only carry the fetch timestamp
+                data['expires_at'] = data['timestamp'] + self.validity
+            if data.get('access_token'):
+                return data
+        except (OSError, ValueError, KeyError):
+            pass
+        return None
+
+    def _file_lock(self):
+        return _FileLock(self.lock_file)
+
+
+class _FileLock:
+    """Exclusive advisory lock on a file, shared by all worker processes"""
+
+    def __init__(self, path):
+        self.path = path
+        self.handle = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            self.handle = open(self.path, 'a')
+            # Another worker may hold this for a whole auth round-trip
+            run_blocking(fcntl.flock, self.handle.fileno(), fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self.handle is not None:
+            fcntl.flock(self.handle, fcntl.LOCK_UN)
+            self.handle.close()
+            self.handle = None
+
+
+def _fetch_from_tradejini():
+    from tradejini_client import TradejiniClient
+    client = TradejiniClient(auto_auth=False)
+    if client.authenticate():
+        return client.access_token
+    return None
+
+
+token_provider = TokenProvider(_fetch_from_tradejini)
@@ -0,0 +1,437 @@
+import os
+import json
+import zlib
+import time
+import atexit
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from sqlalchemy import insert, update, select, func
+from models import db, User, Transaction
+from trading import get_holdings, _new_result, _validate
+from blocking import run_blocking
+from config import TRADE_JOURNAL_FILE, JOURNAL_FLUSH_MS, JOURNAL_MAX_BATCH, JOURNAL_MAX_PENDING, JOURNAL_FSYNC
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process use is not enforced
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Back off this many flush intervals after a failed group commit
+FLUSH_RETRY_INTERVALS = 20
+# How long an append waits for a backlogged journal to drain before giving up
+BACKPRESSURE_WAIT_SECONDS = 2.0
+BACKLOGGED_REASON = 'Order journal is backlogged, try again shortly'
+
+
+class JournalBacklogged(Exception):
+    """append() refused: too many fills are still waiting for the database"""
+
+
+def encode_entry(entry):
+    """One journal line: crc32 of the JSON payload, then the payload"""
+    payload = json.dumps(entry, separators=(',', ':')).encode('utf-8')
+    return b'%08x %s\n' % (zlib.crc32(payload), payload)
+
+
+def read_journal(path):
+    """Entries from a journal file, stopping at the first torn or corrupt line"""
+    entries = []
+    try:
+        f = open(path, 'rb')
+    except FileNotFoundError:
+        return entries
+    with f:
+        for line in f:
+            try:
+                if not line.endswith(b'\n'):
+                    raise ValueError('torn write')
+                crc, payload = line[:-1].split(b' ', 1)
+                if int(crc, 16) != zlib.crc32(payload):
+                    raise ValueError('checksum mismatch')
+                entries.append(json.loads(payload))
+            except ValueError as e:
+                logger.warning(f"Ignoring journal {path} after entry {len(entries)}: {e}")
+                break
+    return entries
+
+
+class TradeJournal:
+    """Local write-ahead log of filled orders, group-committed to the database.
+
+    append() writes fills to the journal file, fsyncs it and returns
+    without touching the database; concurrent appends share one fsync.
+    With fsync='flush' the fsync is left to the flusher, trading power-loss
+    durability for latency. A flusher inserts everything pending in one DB
+    transaction every few milliseconds, then truncates the file. Each
+    Transaction row carries its journal_seq, so after a crash recover()
+    and a retried flush skip exactly the entries the database already
+    committed. The file is flock'ed: only one process may own the journal.
+
+    If group commits keep failing, appends beyond max_pending wait up to
+    BACKPRESSURE_WAIT_SECONDS for a flush and then raise JournalBacklogged,
+    so memory and the file stop growing while the database is down.
+    """
+
+    def __init__(self, path=TRADE_JOURNAL_FILE, flush_interval=JOURNAL_FLUSH_MS / 1000, max_batch=JOURNAL_MAX_BATCH,
+                 max_pending=JOURNAL_MAX_PENDING, fsync=JOURNAL_FSYNC):
+        self.path = path
+        self.fsync_on_append = fsync == 'append'
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        self.fd = None
+        self.app = None
+        self.lock = threading.Lock()        # sequence order == file order
+        self.drained = threading.Condition(self.lock)
+        self.flush_lock = threading.Lock()  # one group commit at a time
+        self.sync_lock = threading.Lock()   # one fsync at a time; waiters share it
+        self.wakeup = threading.Event()
+        self.pending = []
+        self.next_seq = 1
+        self.flushed_seq = 0
+        self.synced_seq = 0
+        # A failed group commit may still have committed; check before retrying
+        self.commit_uncertain = False
+        self.flush_listeners = []
+        self.started = False
+        self.stats = {'appended': 0, 'flushes': 0, 'flushed': 0, 'recovered': 0, 'backlogged': 0, 'fsyncs': 0}
+
+    def add_flush_listener(self, listener):
+        """Call listener(user_ids) inside an app context after each group commit"""
+        self.flush_listeners.append(listener)
+
+    def open(self):
+        fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        if fcntl is not None:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                # A recycled worker may still be flushing on its way out
+                logger.warning(f"Waiting for another process to release {self.path}")
+                run_blocking(fcntl.flock, fd, fcntl.LOCK_EX)
+        self.fd = fd
+
+    def recover(self, app):
+        """Open the journal and commit the entries the database is missing; returns how many"""
+        self.app = app
+        if self.fd is None:
+            self.open()
+        entries = read_journal(self.path)
+        with app.app_context():
+            committed = db.session.execute(select(func.max(Transaction.journal_seq))).scalar() or 0
+            missing = [entry for entry in entries if entry['seq'] > committed]
+            if missing:
+                self._commit(missing)
+                logger.warning(f"Recovered {len(missing)} journaled orders not yet in the database")
+        last_seq = max([committed] + [entry['seq'] for entry in entries])
+        with self.lock:
+            self.next_seq = self.flushed_seq = self.synced_seq = last_seq
+            self.next_seq += 1
+            os.ftruncate(self.fd, 0)
+        self.stats['recovered'] += len(missing)
+        return len(missing)
+
+    def start(self, app):
+        """Recover, then run the group-commit loop in this worker (idempotent)"""
+        if self.started:
+            return
+        self.started = True
+        self.recover(app)
+
+        def run():
+            while True:
+                self.wakeup.wait(self.flush_interval)
+                self.wakeup.clear()
+                try:
+                    self.flush()
+                except Exception as e:
+                    logger.error(f"Journal group commit failed, retrying: {e}")
+                    time.sleep(self.flush_interval * FLUSH_RETRY_INTERVALS)
+
+        threading.Thread(target=run, daemon=True).start()
+        atexit.register(self._flush_at_exit)
+
+    def append(self, user_id, fills):
+        """Durably record fills [(side, symbol, quantity, price)] for one user.
+
+        Returns once the entries are fsync'ed to the journal file (or, with
+        fsync='flush', written to it: safe against a process crash only).
+        """
+        return self.append_many([(user_id, fills)])
+
+    def append_many(self, batches):
+        """append() for several [(user_id, fills)] batches in one write"""
+        timestamp = datetime.now().isoformat()
+        with self.lock:
+            if len(self.pending) >= self.max_pending:
+                self.wakeup.set()
+                if not self.drained.wait_for(lambda: len(self.pending) < self.max_pending, BACKPRESSURE_WAIT_SECONDS):
+                    self.stats['backlogged'] += 1
+                    raise JournalBacklogged(f"{len(self.pending)} journaled fills are waiting for the database")
+            entries = []
+            for user_id, fills in batches:
+                for side, symbol, quantity, price in fills:
+                    entries.append({
+                        'seq': self.next_seq,
+                        'user_id': user_id,
+                        'side': side,
+                        'symbol': symbol,
+                        'quantity': quantity,
+                        'price': price,
+                        'timestamp': timestamp
+                    })
+                    self.next_seq += 1
+            data = b''.join(encode_entry(entry) for entry in entries)
+            while data:
+                written = os.write(self.fd, data)
+                data = data[written:]
+            self.pending.extend(entries)
+            self.stats['appended'] += len(entries)
+            if len(self.pending) >= self.max_batch:
+                self.wakeup.set()
+        if self.fsync_on_append and entries:
+            self.sync(entries[-1]['seq'])
+        return entries
+
+    def sync(self, seq):
+        """Return once every entry up to seq is fsync'ed (group fsync)"""
+        with self.sync_lock:
+            if self.synced_seq >= seq:
+                # Another caller's fsync already covered these entries
+                return
+            with self.lock:
+                written_seq = self.next_seq - 1
+            run_blocking(os.fsync, self.fd)
+            self.synced_seq = written_seq
+            self.stats['fsyncs'] += 1
+
+    def flush(self):
+        """fsync the journal and commit pending entries in one DB transaction; returns the count"""
+        with self.flush_lock:
+            with self.lock:
+                batch = self.pending[:self.max_batch]
+                del self.pending[:len(batch)]
+            if not batch:
+                return 0
+            try:
+                self.sync(batch[-1]['seq'])
+                with self.app.app_context():
+                    todo = batch
+                    if self.commit_uncertain:
+                        # The last failure may have been raised after the commit went through
+                        committed = db.session.execute(select(func.max(Transaction.journal_seq))).scalar() or 0
+                        todo = [entry for entry in batch if entry['seq'] > committed]
+                        self.commit_uncertain = False
+                    if todo:
+                        self._commit(todo)
+                    user_ids = {entry['user_id'] for entry in batch}
+                    for listener in self.flush_listeners:
+                        try:
+                            listener(user_ids)
+                        except Exception as e:
+                            logger.error(f"Journal flush listener error: {e}")
+            except Exception:
+                # Re-queued until the database says whether these entries landed
+                self.commit_uncertain = True
+                with self.lock:
+                    self.pending[:0] = batch
+                raise
+            with self.lock:
+                self.flushed_seq = batch[-1]['seq']
+                self.drained.notify_all()
+                if not self.pending:
+                    # Everything in the file is in the database
+                    os.ftruncate(self.fd, 0)
+                elif len(self.pending) >= self.max_batch:
+                    self.wakeup.set()
+            self.stats['flushes'] += 1
+            self.stats['flushed'] += len(batch)
+            return len(batch)
+
+    def flush_all(self):
+        while self.flush():
+            pass
+
+    def _commit(self, entries):
+        rows = []
+        deltas = {}
+        for entry in entries:
+            total = entry['price'] * entry['quantity']
+            deltas[entry['user_id']] = deltas.get(entry['user_id'], 0.0) + (-total if entry['side'] == 'BUY' else total)
+            rows.append({
+                'user_id': entry['user_id'],
+                'symbol': entry['symbol'],
+                'type': entry['side'],
+                'quantity': entry['quantity'],
+                'price': entry['price'],
+                'timestamp': datetime.fromisoformat(entry['timestamp']),
+                'journal_seq': entry['seq']
+            })
+        try:
+            db.session.execute(insert(Transaction), rows)
+            for user_id, delta in deltas.items():
+                db.session.execute(
+                    update(User)
+                    .where(User.id == user_id)
+                    .values(balance=User.balance + delta)
+                    .execution_options(synchronize_session=False)
+                )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+    def _flush_at_exit(self):
+        try:
+            self.flush_all()
+        except Exception as e:
+            logger.error(f"Journal flush at exit failed; entries stay in {self.path}: {e}")
+
+    def get_status(self):
+        with self.lock:
+            pending = len(self.pending)
+        return dict(self.stats, pending=pending, flushed_seq=self.flushed_seq)
+
+
+class UserBook:
+    """A user's cash and open positions as the execution engine sees them"""
+
+    __slots__ = ('lock', 'loaded', 'balance', 'positions')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.loaded = False
+        self.balance = 0.0
+        self.positions = {}
+
+    def load(self, user_id):
+        """Read balance and positions from the database (nothing may be pending for this user)"""
+        self.balance = db.session.execute(select(User.balance).where(User.id == user_id)).scalar() or 0.0
+        self.positions = {symbol: data['quantity'] for symbol, data in get_holdings(user_id).items()}
+        self.loaded = True
+
+
+def fill_orders(book, orders):
+    """Match orders against a book without mutating it.
+
+    Returns (results, fills, new balance, changed positions).
+
+    Same rules and rejection reasons as trading.execute_orders, applied in
+    sequence so a SELL can use shares bought earlier in the batch.
+    """
+    results = [_new_result(order) for order in orders]
+    balance = book.balance
+    positions = {}
+    fills = []
+    for result in results:
+        result['reason'] = _validate(result)
+        if result['reason']:
+            continue
+        side, symbol, quantity, price = result['side'], result['symbol'], result['quantity'], result['price']
+        held = positions.get(symbol, book.positions.get(symbol, 0))
+        total = price * quantity
+        if side == 'BUY':
+            if balance < total:
+                result['reason'] = 'Insufficient balance'
+                continue
+            balance -= total
+            positions[symbol] = held + quantity
+        else:
+            if held < quantity:
+                result['reason'] = 'Insufficient shares'
+                continue
+            balance += total
+            positions[symbol] = held - quantity
+        result['status'] = 'FILLED'
+        result['balance'] = balance
+        fills.append((side, symbol, quantity, price))
+    return results, fills, balance, positions
+
+
+def reject_fills(results, reason=BACKLOGGED_REASON):
+    """Turn the FILLED results of fill_orders back into rejections (the fills were never journaled)"""
+    for result in results:
+        if result['status'] == 'FILLED':
+            result['status'] = 'REJECTED'
+            result['balance'] = None
+            result['reason'] = reason
+    return results
+
+
+def apply_fills(book, balance, positions):
+    """Commit the outcome of fill_orders to the book"""
+    book.balance = balance
+    for symbol, quantity in positions.items():
+        if quantity:
+            book.positions[symbol] = quantity
+        else:
+            book.positions.pop(symbol, None)
+
+
+class JournaledExecutor:
+    """Execute orders against in-memory books and acknowledge from the journal.
+
+    Each user's book is guarded by its own lock, so orders from different
+    users never contend; the database sees the fills a few milliseconds
+    later in a group commit. Results have the same shape as
+    trading.execute_orders.
+    """
+
+    def __init__(self, journal):
+        self.journal = journal
+        self.books = {}
+        self.books_lock = threading.Lock()
+
+    def _book(self, user_id):
+        book = self.books.get(user_id)
+        if book is None:
+            with self.books_lock:
+                book = self.books.setdefault(user_id, UserBook())
+        return book
+
+    def execute_orders(self, user_id, orders):
+        book = self._book(user_id)
+        with book.lock:
+            if not book.loaded:
+                book.load(user_id)
+            results, fills, balance, positions = fill_orders(book, orders)
+            if fills:
+                # Journal first: a fill is only acknowledged once it is durable
+                try:
+                    self.journal.append(user_id, fills)
+                except JournalBacklogged as e:
+                    logger.warning(f"Rejected {len(fills)} fills for user {user_id}: {e}")
+                    return reject_fills(results)
+                apply_fills(book, balance, positions)
+        return results
+
+    def execute_order(self, user_id, side, symbol, quantity, price):
+        return self.execute_orders(user_id, [{
+            'side': side,
+            'symbol': symbol,
+            'quantity': quantity,
+            'price': price
+        }])[0]
+
+    @contextmanager
+    def exclusive(self, user_id):
+        """Hold a user's book while their balance is changed outside the engine.
+
+        Pending fills are committed first; the book reloads from the
+        database on the user's next order.
+        """
+        book = self._book(user_id)
+        with book.lock:
+            self.journal.flush_all()
+            try:
+                yield
+            finally:
+                book.loaded = False
+
+
+trade_journal = TradeJournal()
+journal_executor = JournaledExecutor(trade_journal)
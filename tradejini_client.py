@@ -1,56 +1,80 @@
 import requests
 import json
-from config import TRADEJINI_CONFIG, STOCK_TOKENS
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import live_price_stream
+import tradejini_http
+from circuit_breaker import CircuitBreaker
+from token_provider import token_provider
+from config import TRADEJINI_CONFIG, QUOTE_FETCH_WORKERS, QUOTE_CACHE_TTL
+from instruments import instrument_registry
+from price_snapshot import is_stale
+
+# Shared by every client in the process so failures are counted once
+auth_breaker = CircuitBreaker('tradejini-auth', failure_threshold=2, reset_timeout=60)
+quote_breaker = CircuitBreaker('tradejini-quote', failure_threshold=3, reset_timeout=30, negative_ttl=60)
+
+# Candidate quote endpoints as (path, token_in_path); the first that
+# answers is memoized in _quote_endpoint
+QUOTE_ENDPOINTS = [
+    ("/api-gw/mkt-data/quote", False),
+    ("/api-gw/mkt-data/quote", True),
+    ("/api/mkt-data/quote", False),
+    ("/api/mkt-data/quote", True),
+    ("/quote", False),
+    ("/quote", True),
+]
+_quote_endpoint = None
+
+# Batched quotes: bounded fan-out, in-flight dedupe and a short-TTL cache.
+# The pool is created on first use so workers that never fetch quotes pay nothing.
+_quote_pool = None
+_quote_lock = threading.Lock()
+_quote_cache = {}
+_quote_inflight = {}
+
+def _get_quote_pool():
+    global _quote_pool
+    if _quote_pool is None:
+        with _quote_lock:
+            if _quote_pool is None:
+                _quote_pool = ThreadPoolExecutor(max_workers=QUOTE_FETCH_WORKERS, thread_name_prefix='tradejini-quote')
+    return _quote_pool
+
+def _remember_quote_endpoint(endpoint):
+    global _quote_endpoint
+    _quote_endpoint = endpoint
 
 class TradejiniClient:
     def __init__(self, auto_auth=True):
         self.base_url = "https://api.tradejini.com/v2"
         self.access_token = None
+        self._stock_list = None
+        self._stock_list_version = None
+        self._fallback_stocks = None
+        self._fallback_version = None
         if auto_auth:
-            # First try to get stored access token
-            if not self.get_stored_token():
-                # If no stored token, authenticate
-                self.authenticate()
-    
-    def get_stored_token(self):
-        """Get stored access token from database"""
-        try:
-            from models import User, UserCredential
-            admin_user = User.query.filter_by(is_admin=True).first()
-            if admin_user:
-                credential = UserCredential.query.filter_by(
-                    user_id=admin_user.id,
-                    credential_name='ACCESS_TOKEN'
-                ).first()
-                if credential:
-                    self.access_token = credential.credential_value
-                    return True
-        except:
-            pass
-        return False
+            self.ensure_token()
     
     def authenticate(self):
         """Authenticate with TradJini API"""
+        if not auth_breaker.allow():
+            logging.getLogger(__name__).warning("TradJini auth circuit open, skipping authentication")
+            return False
         try:
             # Get current TOTP from database or environment
             current_totp = TRADEJINI_CONFIG.get('two_fa', '')
             try:
-                from models import User, UserCredential
-                admin_user = User.query.filter_by(is_admin=True).first()
-                if admin_user:
-                    credential = UserCredential.query.filter_by(
-                        user_id=admin_user.id,
-                        credential_name='GLOBAL_TOTP'
-                    ).first()
-                    if credential:
-                        current_totp = credential.credential_value
+                from credentials import admin_credentials
+                current_totp = admin_credentials.get('GLOBAL_TOTP') or current_totp
             except:
                 pass
             
             # TradJini Individual Token API (Correct Format from Documentation)
             url = "https://api.tradejini.com/v2/api-gw/oauth/individual-token-v2"
             
-            import logging
             logging.basicConfig(level=logging.INFO)
             logger = logging.getLogger(__name__)
             
@@ -74,7 +98,7 @@ class TradejiniClient:
             logger.info(f"Headers: {headers}")
             logger.info(f"Data: {data}")
             
-            response = requests.post(url, headers=headers, data=data, timeout=30)
+            response = tradejini_http.post(url, endpoint='auth', headers=headers, data=data)
             logger.info(f"Auth response status: {response.status_code}")
             logger.info(f"Auth response: {response.text}")
             
@@ -85,139 +109,189 @@ class TradejiniClient:
                     if data.get('status') == 'success' or data.get('access_token'):
                         self.access_token = data.get('access_token') or data.get('token')
                         logger.info(f"Authentication successful! Token: {self.access_token[:10]}****")
+                        auth_breaker.record_success()
                         return True
                 except:
                     logger.error("Failed to parse JSON response")
             
             logger.error(f"Authentication failed: {response.text}")
+            auth_breaker.record_failure()
             return False
         except Exception as e:
-            import logging
             logging.getLogger(__name__).error(f"Authentication error: {e}")
+            auth_breaker.record_failure()
             return False
     
+    def ensure_token(self):
+        """Current access token from the shared provider (authenticates only if needed)"""
+        self.access_token = token_provider.get_token()
+        return self.access_token
+    
     def get_stock_list(self):
-        """Get live stock prices from TradJini API"""
-        import logging
-        logger = logging.getLogger(__name__)
-        
-        # Always try to get stored token first
-        if not self.access_token:
-            self.get_stored_token()
-        
-        if not self.access_token:
-            logger.warning("No access token available, using fallback data")
-            return self.get_fallback_stocks()
+        """Stock list backed by the live price board.
         
-        logger.info(f"Using access token: {self.access_token[:10]}****")
+        Rebuilt only when a new price has been published or the instrument
+        universe changed since the last call (and every few seconds so stale
+        flags age); no network or DB I/O happens here.
+        """
+        version = (live_price_stream.price_update_count, instrument_registry.version, int(time.time() // 10))
+        if self._stock_list is not None and self._stock_list_version == version:
+            return self._stock_list
         
-        # TradJini quote API returns 404 - use streaming data + fallback
-        logger.info("Quote API not available, using streaming + fallback system")
+        if self._fallback_stocks is None or self._fallback_version != instrument_registry.version:
+            self._fallback_stocks = self.get_fallback_stocks()
+            self._fallback_version = instrument_registry.version
         
-        # Get live prices from streaming if available
-        from live_price_stream import live_prices
+        live_prices = live_price_stream.live_prices
         stocks = []
-        
-        for symbol, token in STOCK_TOKENS.items():
-            # Check if we have live streaming price
-            live_price = live_prices.get(symbol, 0)
+        for fallback_stock in self._fallback_stocks:
+            live_price = live_prices.get(fallback_stock['symbol'], 0)
             if live_price > 0:
-                stocks.append({
-                    'symbol': symbol,
-                    'symbol_id': token,
-                    'price': live_price,
-                    'name': symbol.replace('_', ' ').title(),
-                    'change': 0  # Will be calculated by streaming
-                })
-                logger.info(f"Using streaming price for {symbol}: {live_price}")
-        
-        # Fill remaining stocks with fallback data
-        fallback_stocks = self.get_fallback_stocks()
-        existing_symbols = {stock['symbol'] for stock in stocks}
-        for fallback_stock in fallback_stocks:
-            if fallback_stock['symbol'] not in existing_symbols:
-                stocks.append(fallback_stock)
+                stocks.append(dict(fallback_stock, price=live_price, change=0, stale=is_stale(fallback_stock['symbol'])))
+            else:
+                stocks.append(dict(fallback_stock, stale=True))
         
-        logger.info(f"Returning {len(stocks)} stocks ({len([s for s in stocks if s['price'] > 1000])} with streaming data)")
+        self._stock_list = stocks
+        self._stock_list_version = version
         return stocks
     
     def get_live_price(self, token):
         """Get live price for a specific token"""
-        if not self.access_token:
-            return None
-            
+        return self.get_live_prices([token])[token]
+    
+    def get_live_prices(self, tokens):
+        """Quotes for many tokens at once as {token: data or None}.
+        
+        Fresh quotes come from a short-TTL cache; the rest are fetched in
+        parallel on a bounded pool, and a token already being fetched by
+        another caller is awaited rather than requested twice.
+        """
+        now = time.monotonic()
+        results = {}
+        waiting = {}
+        pool = _get_quote_pool()
+        with _quote_lock:
+            for token in dict.fromkeys(tokens):
+                cached = _quote_cache.get(token)
+                if cached and now < cached[1]:
+                    results[token] = cached[0]
+                    continue
+                future = _quote_inflight.get(token)
+                if future is None:
+                    future = pool.submit(self._fetch_and_cache_quote, token)
+                    _quote_inflight[token] = future
+                waiting[token] = future
+        
+        for token, future in waiting.items():
+            try:
+                results[token] = future.result()
+            except Exception as e:
+                logging.getLogger(__name__).error(f"Quote fetch failed for {token}: {e}")
+                results[token] = None
+        return results
+    
+    def _fetch_and_cache_quote(self, token):
         try:
-            import logging
-            logger = logging.getLogger(__name__)
+            data = self._fetch_quote(token)
+            if data is not None:
+                with _quote_lock:
+                    _quote_cache[token] = (data, time.monotonic() + QUOTE_CACHE_TTL)
+            return data
+        finally:
+            with _quote_lock:
+                _quote_inflight.pop(token, None)
+    
+    def _fetch_quote(self, token):
+        """Fetch one quote from the REST API (no caching)"""
+        logger = logging.getLogger(__name__)
+        
+        # Fail fast while TradJini is down or this token is known to have no quote
+        if quote_breaker.recently_failed(token) or not quote_breaker.allow():
+            return None
+        if not self.ensure_token():
+            quote_breaker.record_failure()
+            return None
+        
+        # TradJini quote API requires Bearer token format
+        headers = {
+            "Authorization": f"Bearer {TRADEJINI_CONFIG['apikey']}:{self.access_token}"
+        }
+        
+        # Only the memoized endpoint is tried once one has worked
+        candidates = [_quote_endpoint] if _quote_endpoint else QUOTE_ENDPOINTS
+        # True once an endpoint errored (5xx or an unparseable body) rather than just lacking this token
+        endpoint_failed = False
+        for path, token_in_path in candidates:
+            url = f"{self.base_url}{path}"
+            try:
+                if token_in_path:
+                    response = tradejini_http.get(f"{url}/{token}", endpoint='quote', headers=headers)
+                else:
+                    response = tradejini_http.get(url, endpoint='quote', headers=headers, params={"token": token})
+            except requests.RequestException as e:
+                # Network-level failure: every endpoint shares the host, stop here
+                logger.error(f"Quote request failed for {url}: {e}")
+                quote_breaker.record_failure()
+                return None
             
-            # Try different TradJini quote API endpoints based on documentation
-            endpoints = [
-                f"{self.base_url}/api-gw/mkt-data/quote",
-                f"{self.base_url}/api/mkt-data/quote",
-                f"{self.base_url}/quote"
-            ]
+            if response.status_code == 401:
+                # Expired or revoked token: make every worker fetch a new one
+                token_provider.invalidate(self.access_token)
+                quote_breaker.record_failure()
+                return None
             
-            # TradJini quote API requires Bearer token format
-            headers = {
-                "Authorization": f"Bearer {TRADEJINI_CONFIG['apikey']}:{self.access_token}"
-            }
+            if response.status_code >= 500:
+                endpoint_failed = True
+                continue
             
-            for url in endpoints:
+            if response.status_code == 200:
                 try:
-                    logger.info(f"Trying quote API: {url} for token: {token}")
-                    
-                    # Try with token as query parameter
-                    response = requests.get(url, headers=headers, params={"token": token}, timeout=10)
-                    logger.info(f"Response status: {response.status_code}")
-                    logger.info(f"Response: {response.text[:200]}...")
-                    
-                    if response.status_code == 200:
-                        data = response.json()
-                        if data and ('ltp' in data or 'price' in data):
-                            return data
-                    
-                    # Try with token in URL path
-                    response = requests.get(f"{url}/{token}", headers=headers, timeout=10)
-                    logger.info(f"Path response status: {response.status_code}")
-                    
-                    if response.status_code == 200:
-                        data = response.json()
-                        if data and ('ltp' in data or 'price' in data):
-                            return data
-                            
-                except Exception as e:
-                    logger.error(f"Error with {url}: {e}")
+                    data = response.json()
+                except ValueError:
+                    endpoint_failed = True
                     continue
-            
-            logger.warning(f"All quote APIs failed for token: {token}")
-            return None
-            
-        except Exception as e:
-            import logging
-            logging.getLogger(__name__).error(f"get_live_price error: {e}")
+                if data and ('ltp' in data or 'price' in data):
+                    _remember_quote_endpoint((path, token_in_path))
+                    quote_breaker.record_success()
+                    return data
+        
+        logger.warning(f"All quote APIs failed for token: {token}")
+        quote_breaker.remember_failure(token)
+        if not endpoint_failed:
+            # The API answered but has no quote for this token: not an outage
+            quote_breaker.record_success()
             return None
+        if _quote_endpoint in candidates:
+            # The memoized endpoint stopped answering; rediscover next time
+            _remember_quote_endpoint(None)
+        quote_breaker.record_failure()
+        return None
     
     def get_fallback_stocks(self):
-        """Fallback stock data when API fails"""
-        import random
+        """Fallback stock data when API fails, priced by the synthetic market"""
+        from market_simulator import get_simulator
+        simulator = get_simulator()
         stocks = []
-        base_prices = {
-            "RELIANCE": 2500, "TCS": 3200, "HDFCBANK": 1600, "INFY": 1400, "HINDUNILVR": 2400,
-            "ICICIBANK": 900, "KOTAKBANK": 1800, "BHARTIARTL": 800, "ITC": 450, "SBIN": 550,
-            "LT": 2200, "ASIANPAINT": 3000, "AXISBANK": 750, "MARUTI": 9000, "SUNPHARMA": 1100,
-            "TITAN": 2800, "ULTRACEMCO": 7500, "NESTLEIND": 18000, "WIPRO": 400, "NTPC": 180
-        }
-        
-        for symbol, token in STOCK_TOKENS.items():
-            base_price = base_prices.get(symbol, 1000)
-            fluctuation = random.uniform(-0.05, 0.05)
-            price = round(base_price * (1 + fluctuation), 2)
-            
+        for symbol, token in instrument_registry.items():
+            price, change = simulator.quote(symbol) or (0.0, 0.0)
             stocks.append({
                 'symbol': symbol,
                 'symbol_id': token,
                 'price': price,
                 'name': symbol.replace('_', ' ').title(),
-                'change': round(fluctuation * 100, 2)
+                'change': change
             })
-        return stocks
\ No newline at end of file
+        return stocks
+
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """Process-wide client; the access token is loaded lazily on first REST use"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = TradejiniClient(auto_auth=False)
+    return _client
@@ -0,0 +1,91 @@
+import time
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from config import QUOTE_FETCH_WORKERS
+
+logger = logging.getLogger(__name__)
+
+# (connect, read) timeouts per logical endpoint
+TIMEOUTS = {
+    'auth': (3.05, 30),
+    'quote': (3.05, 10),
+    'symbol_master': (3.05, 120),
+    'default': (3.05, 15),
+}
+
+# Idempotent requests are retried on connection errors and gateway
+# failures with exponential backoff; auth POSTs are never retried here
+RETRY = Retry(
+    total=2,
+    backoff_factor=0.3,
+    status_forcelist=(502, 503, 504),
+    allowed_methods=frozenset(['GET', 'HEAD']),
+    raise_on_status=False
+)
+
+_session = None
+_session_lock = threading.Lock()
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def get_session():
+    """Process-wide pooled session with keep-alive to api.tradejini.com"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                # Enough keep-alive connections for a full batch of parallel quote fetches
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(20, QUOTE_FETCH_WORKERS), max_retries=RETRY)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session = session
+    return _session
+
+
+def request(method, url, endpoint='default', **kwargs):
+    """Send a request through the pooled session and record its timing"""
+    kwargs.setdefault('timeout', TIMEOUTS.get(endpoint, TIMEOUTS['default']))
+    started = time.perf_counter()
+    error = False
+    try:
+        response = get_session().request(method, url, **kwargs)
+        error = response.status_code >= 400
+        return response
+    except requests.RequestException:
+        error = True
+        raise
+    finally:
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        _record(endpoint, elapsed_ms, error)
+        logger.debug(f"{method} {endpoint} {url} took {elapsed_ms:.1f} ms")
+
+
+def get(url, endpoint='default', **kwargs):
+    return request('GET', url, endpoint=endpoint, **kwargs)
+
+
+def post(url, endpoint='default', **kwargs):
+    return request('POST', url, endpoint=endpoint, **kwargs)
+
+
+def _record(endpoint, elapsed_ms, error):
+    with _stats_lock:
+        stats = _stats.setdefault(endpoint, {'count': 0, 'errors': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+        stats['count'] += 1
+        stats['errors'] += int(error)
+        stats['total_ms'] += elapsed_ms
+        stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+
+
+def get_stats():
+    """Per-endpoint request counts, error counts and latency"""
+    with _stats_lock:
+        return {
+            endpoint: dict(stats, avg_ms=stats['total_ms'] / stats['count'] if stats['count'] else 0.0)
+            for endpoint, stats in _stats.items()
+        }
@@ -0,0 +1,200 @@
+import time
+import random
+import logging
+from sqlalchemy import update, select, func, case
+from sqlalchemy.exc import OperationalError
+from models import db, User, Transaction
+
+logger = logging.getLogger(__name__)
+
+# Conflicts surface as OperationalError ("database is locked" on SQLite,
+# serialization failures / deadlocks on Postgres) and are retried
+MAX_RETRIES = 5
+RETRY_BACKOFF = 0.02
+
+
+def get_position(user_id, symbol):
+    """Net quantity of a symbol held by a user"""
+    signed_qty = case((Transaction.type == 'BUY', Transaction.quantity), else_=-Transaction.quantity)
+    return db.session.execute(
+        select(func.coalesce(func.sum(signed_qty), 0)).where(
+            Transaction.user_id == user_id,
+            Transaction.symbol == symbol
+        )
+    ).scalar()
+
+
+def _holdings_query():
+    return select(
+        Transaction.user_id,
+        Transaction.symbol,
+        Transaction.type,
+        func.sum(Transaction.quantity),
+        func.sum(Transaction.quantity * Transaction.price)
+    ).group_by(Transaction.user_id, Transaction.symbol, Transaction.type)
+
+
+def _build_holdings(rows):
+    """Fold grouped (user_id, symbol, type, qty, value) rows into open positions per user"""
+    totals = {}
+    for user_id, symbol, side, qty, value in rows:
+        data = totals.setdefault(user_id, {}).setdefault(symbol, {'buy_qty': 0, 'sell_qty': 0, 'buy_value': 0})
+        if side == 'BUY':
+            data['buy_qty'] += qty
+            data['buy_value'] += value
+        else:
+            data['sell_qty'] += qty
+
+    holdings = {}
+    for user_id, symbols in totals.items():
+        positions = holdings.setdefault(user_id, {})
+        for symbol, data in symbols.items():
+            net_qty = data['buy_qty'] - data['sell_qty']
+            if net_qty > 0:
+                avg_buy_price = data['buy_value'] / data['buy_qty'] if data['buy_qty'] > 0 else 0
+                positions[symbol] = {'quantity': net_qty, 'avg_price': avg_buy_price}
+    return holdings
+
+
+def get_holdings(user_id):
+    """Open positions of a user as {symbol: {'quantity', 'avg_price'}}"""
+    rows = db.session.execute(_holdings_query().where(Transaction.user_id == user_id)).all()
+    return _build_holdings(rows).get(user_id, {})
+
+
+def get_all_holdings():
+    """Open positions of every user as {user_id: {symbol: {'quantity', 'avg_price'}}}"""
+    return _build_holdings(db.session.execute(_holdings_query()).all())
+
+
+def _apply_buy(user_id, symbol, quantity, price):
+    """Debit cash and record a BUY in the current DB transaction.
+
+    Returns a rejection reason, or None when the order was applied.
+    """
+    total_cost = price * quantity
+    # Single conditional UPDATE: the balance check and the debit cannot be
+    # interleaved with another order from the same user
+    result = db.session.execute(
+        update(User)
+        .where(User.id == user_id, User.balance >= total_cost)
+        .values(balance=User.balance - total_cost)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        return 'Insufficient balance'
+
+    db.session.add(Transaction(
+        user_id=user_id,
+        symbol=symbol,
+        type='BUY',
+        quantity=quantity,
+        price=price
+    ))
+    return None
+
+
+def _apply_sell(user_id, symbol, quantity, price):
+    """Credit cash and record a SELL in the current DB transaction.
+
+    Returns a rejection reason, or None when the order was applied.
+    """
+    # Touch the user row first to take its row lock (Postgres) or the
+    # database write lock (SQLite), so the position check below sees every
+    # committed sell and no concurrent sell can slip in before we commit
+    db.session.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(balance=User.balance)
+        .execution_options(synchronize_session=False)
+    )
+    if get_position(user_id, symbol) < quantity:
+        return 'Insufficient shares'
+
+    total_value = price * quantity
+    db.session.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(balance=User.balance + total_value)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.add(Transaction(
+        user_id=user_id,
+        symbol=symbol,
+        type='SELL',
+        quantity=quantity,
+        price=price
+    ))
+    return None
+
+
+def _new_result(order):
+    side = str(order.get('side') or '').upper()
+    quantity = order.get('quantity') or 0
+    price = order.get('price') or 0
+    return {
+        'status': 'REJECTED',
+        'side': side,
+        'symbol': order.get('symbol'),
+        'quantity': quantity,
+        'price': price,
+        'total': price * quantity,
+        'balance': None,
+        'reason': None
+    }
+
+
+def _validate(result):
+    if result['side'] not in ('BUY', 'SELL'):
+        return 'Invalid side'
+    if not result['symbol'] or result['quantity'] <= 0 or result['price'] <= 0:
+        return 'Invalid order'
+    return None
+
+
+def execute_orders(user_id, orders):
+    """Execute a list of orders for one user in a single DB transaction.
+
+    Each order is a dict with side, symbol, quantity and price. Orders are
+    applied in sequence, so a SELL can use shares bought earlier in the
+    same batch. Rejected orders write nothing and do not affect the rest.
+    The whole batch is retried on lock conflicts. Returns one result dict
+    per order.
+    """
+    for attempt in range(MAX_RETRIES):
+        results = [_new_result(order) for order in orders]
+        try:
+            for result in results:
+                result['reason'] = _validate(result)
+                if result['reason']:
+                    continue
+
+                apply = _apply_buy if result['side'] == 'BUY' else _apply_sell
+                result['reason'] = apply(user_id, result['symbol'], result['quantity'], result['price'])
+                if result['reason']:
+                    continue
+
+                db.session.flush()
+                result['balance'] = db.session.execute(
+                    select(User.balance).where(User.id == user_id)
+                ).scalar()
+                result['status'] = 'FILLED'
+
+            db.session.commit()
+            return results
+        except OperationalError as e:
+            db.session.rollback()
+            if attempt == MAX_RETRIES - 1:
+                logger.error(f"Orders failed after {MAX_RETRIES} attempts: {e}")
+                raise
+            time.sleep(RETRY_BACKOFF * (2 ** attempt) * random.uniform(0.5, 1.5))
+
+
+def execute_order(user_id, side, symbol, quantity, price):
+    """Execute a single BUY or SELL atomically"""
+    return execute_orders(user_id, [{
+        'side': side,
+        'symbol': symbol,
+        'quantity': quantity,
+        'price': price
+    }])[0]